@@ -0,0 +1,63 @@
+import asyncio
+import functools
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncRunner():
+
+    def __init__(self, max_workers=None, max_pending=None):
+        """Run blocking simulation calls from asyncio without stalling the loop.
+
+        Calls go to a thread pool; the numpy kernels release the GIL, so they
+        run alongside the event loop. At most `max_pending` calls are queued
+        or running at once; further callers wait for a slot (backpressure).
+
+        Input:
+            max_workers (int): Threads of the pool (default = CPU count).
+            max_pending (int): Calls admitted at once (default = 4 per thread).
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.max_workers
+        self._executor = None
+        # A semaphore binds to one event loop, so each loop gets its own
+        self._slots = weakref.WeakKeyDictionary()
+
+    async def run(self, function, *args, **kwargs):
+        """Call a blocking function in the pool and wait for its result.
+
+        Input:
+            function (callable): E.g. game.play or analyzer.combo_count.
+            *args, **kwargs: Passed on to the function.
+
+        Returns:
+            The function's return value.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_pending)
+        async with slots:
+            return await loop.run_in_executor(self._executor,
+                                              functools.partial(function, *args, **kwargs))
+
+    def shutdown(self):
+        """Stop the pool once its pending calls are done."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._slots.clear()
+
+
+_runner = None
+
+
+def get_runner():
+    """Return the runner shared by `play_async` and `run_async`, created on first use."""
+    global _runner
+    if _runner is None:
+        _runner = AsyncRunner()
+    return _runner
@@ -1,91 +1,469 @@
 from .game import Game
+from .events import Event, _Context
+from .runs import RunTracker
+from .progress import _Reporter
+from . import kernels, output as formats, parallel, planner
+import math
 import numpy as np
 import pandas as pd
 
+# Rows per chunk when counting with progress or cancellation
+_CHUNK_ROWS = 1 << 20
+
+
+def _count_frame(rows, counts, faces):
+    """Private function building a Counts frame indexed by rows of faces.
+
+    Rows are integer codes into faces; the MultiIndex is built from them
+    directly, most frequent rows first.
+    """
+    order = np.lexsort((np.arange(len(counts)), -counts))
+    rows, counts = rows[order], counts[order]
+    n_dice = rows.shape[1]
+    index = pd.MultiIndex(levels=[pd.Index(faces)] * n_dice,
+                          codes=[rows[:, i] for i in range(n_dice)],
+                          names=[f'{i}' for i in range(n_dice)])
+    return pd.DataFrame({'Counts': np.asarray(counts, dtype=np.int64)}, index=index)
+
+
+def _gamma_q(a, x):
+    """Private function: regularized upper incomplete gamma function Q(a, x).
+
+    Uses the series of P(a, x) below x = a + 1 and the continued fraction
+    of Q(a, x) above it (Lentz's method), both to double precision.
+    """
+    if x <= 0:
+        return 1.0
+    scale = math.exp(a * math.log(x) - x - math.lgamma(a))
+    if x < a + 1:
+        term = total = 1.0 / a
+        n = 0
+        while abs(term) > abs(total) * 1e-16:
+            n += 1
+            term *= x / (a + n)
+            total += term
+        return max(0.0, 1.0 - total * scale)
+    tiny = 1e-300
+    b = x + 1 - a
+    c, d = 1 / tiny, 1 / b
+    fraction = d
+    n = 0
+    while True:
+        n += 1
+        step = -n * (n - a)
+        b += 2
+        d = step * d + b
+        d = 1 / (d if abs(d) > tiny else tiny)
+        c = b + step / c
+        c = c if abs(c) > tiny else tiny
+        fraction *= c * d
+        if abs(c * d - 1) < 1e-16:
+            return scale * fraction
+
+
+def _chi2_sf(chi2, dof):
+    """Private function giving chi-square tail probabilities without scipy.
+
+    Zero degrees of freedom give NaN, as in scipy.
+    """
+    return np.array([_gamma_q(k / 2, x / 2) if k > 0 else np.nan
+                     for x, k in zip(chi2, dof)], dtype=float)
+
+
 class Analyzer():
-    
+
     def __init__(self, game):
         """Initialize the Analyzer class with a Game object.
-        
+
         Inputs:
             game: A Game object to analyze.
-            
+
         Raises:
             ValueError: If input is not a Game object.
         """
         if not isinstance(game, Game):
             raise ValueError('Input must be a Game object.')
         self.game = game
-        self.results = None
-        
+        self._codes = None
+        self._context = None
+
+    @property
+    def results(self):
+        """The game's results frame (as show_results), once they were analyzed.
+
+        Returns:
+            pd.DataFrame: Faces per roll and die, or None before any count.
+        """
+        if self._codes is None:
+            return None
+        return self.game.show_results()
+
     def _check_results(self):
-        """Private method to check if results are available."""
-        if self.game.results is None:
+        """Private method to check if results are available.
+
+        Returns:
+            numpy.ndarray: The game's coded results (rolls x dice).
+        """
+        codes = self.game.codes
+        if codes is None:
             raise ValueError("No game results available. Play the game first.")
-        self.results = self.game.show_results()
-    
-    
-    def jackpot(self):
+        self._codes = codes
+        return codes
+
+    def _count(self, kind, workers, threads=None, memory_limit=None, order=None, rank=None,
+               progress=None, cancel=None):
+        """Private method counting a statistic, in parallel or in chunks if asked.
+
+        With workers, the game's results are moved to shared memory and each
+        process counts a contiguous partition of the rows. With threads, the
+        partitions are counted by threads of this process, on the same array.
+        With a memory limit, progress or cancel, rows are counted in chunks.
+        Packed results count jackpots on their words and unpack chunks of
+        rows for the rest, unless workers or threads are used.
+        """
+        n_faces = len(self.game.faces)
+        chunked = memory_limit is not None or progress is not None or cancel is not None
+        if sum(option is not None for option in (workers, threads)) + chunked > 1:
+            raise ValueError('Use only one of workers, threads and chunked counting.')
+        packed = self.game.packed
+        if packed is not None and workers is None and threads is None:
+            if kind == 'jackpot' and not chunked:
+                return packed.jackpot_count()
+            return self._count_chunks(kind, packed, memory_limit, order, rank, progress, cancel)
+        codes = self._check_results()
+        if chunked:
+            return self._count_chunks(kind, codes, memory_limit, order, rank, progress, cancel)
+        parts = workers if threads is None else threads
+        if parts is None or parts == 1:
+            return parallel.partial_counts(kind, codes, n_faces, order, rank)
+        if not isinstance(parts, int) or parts < 1:
+            raise ValueError('Number of workers and threads must be a positive integer.')
+        if threads is not None:
+            partials = parallel.map_threads(codes, kind, threads, n_faces, order, rank)
+        else:
+            self.game.share()
+            codes = self._check_results()
+            partials = parallel.map_shared(self.game._shared, codes, kind, workers,
+                                           n_faces, order, rank)
+        return parallel.merge_partials(kind, partials, n_faces, codes.shape[1])
+
+    def _count_chunks(self, kind, codes, memory_limit, order, rank, progress=None, cancel=None):
+        """Private method counting a statistic in chunks of rows (plain or packed codes).
+
+        With a memory limit the output (or the running counts, bounded by
+        the distinct rows possible) is set aside first and chunks are sized
+        so their temporaries fit. Each chunk's partial result is folded in
+        before the next. A cancelled count covers the chunks done so far.
+        """
+        n_rolls, n_dice = codes.shape
+        n_faces = len(self.game.faces)
+        rows = _CHUNK_ROWS
+        if memory_limit is not None:
+            out = planner.output_bytes(kind, n_rolls, n_dice, n_faces)
+            if out > memory_limit:
+                raise ValueError(f'The output needs up to {out} bytes, over the memory limit')
+            rows = planner.chunk_rows(kind, memory_limit - out, n_dice, n_faces)
+            if rows == 0:
+                raise ValueError('Not even one roll can be analyzed within the memory limit')
+
+        reporter = _Reporter(n_rolls, 0, progress, cancel)
+        if kind == 'face_counts':
+            result = np.empty((n_rolls, n_faces), dtype=np.int64)
+        else:
+            result = None
+        stop = 0
+        for start in range(0, n_rolls, rows):
+            stop = min(start + rows, n_rolls)
+            part = parallel.partial_counts(kind, codes[start:stop], n_faces, order, rank)
+            if kind == 'face_counts':
+                result[start:stop] = part
+            elif result is None:
+                result = part
+            else:
+                result = parallel.merge_partials(kind, [result, part], n_faces, n_dice)
+            if reporter.report(stop):
+                break
+        if kind == 'face_counts':
+            return result[:stop]
+        if result is None:
+            return parallel.partial_counts(kind, codes[:0], n_faces, order, rank)
+        return result
+
+
+    async def run_async(self, method, *args, **kwargs):
+        """Run an analysis from asyncio without blocking the event loop.
+
+        Input:
+            method (str): Name of an Analyzer method, e.g. 'combo_count'.
+            *args, **kwargs: Passed on to the method.
+
+        Returns:
+            The method's result.
+
+        Raises:
+            ValueError: If the Analyzer has no such method.
+        """
+        function = getattr(self, method, None)
+        if method.startswith('_') or method.endswith('_async') or not callable(function):
+            raise ValueError(f'Analyzer has no method {method!r}')
+        from .aio import get_runner
+        return await get_runner().run(function, *args, **kwargs)
+
+
+    def jackpot(self, workers=None, threads=None, memory_limit=None,
+                   progress=None, cancel=None, output='pandas'):
         """Count the number of jackpot rolls (all faces are identical).
-        
+
+        Input:
+            workers (int): Processes to split the rows across (default = count
+                in this process).
+            threads (int): Threads to split the rows across instead.
+            memory_limit (int): Bytes of temporaries allowed; rows are counted
+                in chunks that fit.
+            progress (callable): Called with a Progress after every chunk.
+            cancel (CancelToken): Checked after every chunk; a cancelled
+                count covers the rows counted so far.
+            output (str): 'pandas', 'numpy' or 'arrow' (needs pyarrow).
+
         Returns:
-            int: Number of jackpot.
-        
+            int: Number of jackpot (numpy.int64 or an Arrow scalar for the
+            'numpy' and 'arrow' outputs).
+
         Raises:
-            ValueError: If no game was play.
+            ValueError: If no game was play or output is invalid.
         """
-        self._check_results()
-        return int((self.results.nunique(axis=1) == 1).sum())
-    
-    
-    def face_counts_per_roll(self):
+        formats.check_output(output)
+        return formats.scalar(self._count('jackpot', workers, threads, memory_limit,
+                                          progress=progress, cancel=cancel), output)
+
+
+    def face_counts_per_roll(self, workers=None, threads=None, memory_limit=None,
+                                progress=None, cancel=None, output='pandas'):
         """Count occurrences of each face in each rolls.
-        
+
+        Input:
+            workers (int): Processes to split the rows across.
+            threads (int): Threads to split the rows across instead.
+            memory_limit (int): Bytes of temporaries allowed.
+            progress (callable), cancel (CancelToken): See `jackpot`.
+            output (str): 'pandas', 'numpy' or 'arrow' (needs pyarrow).
+
         Returns:
-            pd.DataFrame: Wide format with roll numbers, face counts
-            
+            pd.DataFrame: Wide format with roll numbers, face counts. For
+            'numpy' the counts array (rolls x faces) and the faces; for
+            'arrow' a table with a column per face.
+
         Raises:
-            ValueError: If no game was play
+            ValueError: If no game was play or output is invalid.
         """
-        self._check_results()
-        counts_df = self.results.apply(pd.Series.value_counts, axis=1).fillna(0).astype(int)
-        face_order = self.game.dice[0].get_data().index.tolist()
-        return counts_df.reindex(columns = face_order, fill_value = 0)
-        
-        
-    def combo_count(self):
+        formats.check_output(output)
+        counts = self._count('face_counts', workers, threads, memory_limit,
+                             progress=progress, cancel=cancel)
+        if output != 'pandas':
+            return formats.face_count_table(counts, self.game.faces, output)
+        return pd.DataFrame(counts, columns=pd.Index(self.game.faces), copy=False)
+
+
+    def combo_count(self, workers=None, threads=None, memory_limit=None,
+                       progress=None, cancel=None, output='pandas'):
         """Count distinct combination of faces.
-        
+
+        Input:
+            workers (int): Processes to split the rows across.
+            threads (int): Threads to split the rows across instead.
+            memory_limit (int): Bytes of temporaries allowed.
+            progress (callable), cancel (CancelToken): See `jackpot`.
+            output (str): 'pandas', 'numpy' or 'arrow' (needs pyarrow).
+
+        Returns:
+            pd.DataFrame: MultiIndex of combinations with counts. For 'numpy'
+            a structured array of die codes and Counts and the faces; for
+            'arrow' a table of dictionary columns and Counts.
+
+        Raises:
+            ValueError: If no game was play or output is invalid.
+        """
+        formats.check_output(output)
+        order, rank = kernels.face_order(self.game.faces)
+        rows, counts = self._count('combo_count', workers, threads, memory_limit, order, rank,
+                                   progress, cancel)
+        if output != 'pandas':
+            return formats.count_table(rows, counts, self.game.faces, output)
+        return _count_frame(rows, counts, self.game.faces)
+
+
+    def permutation_count(self, workers=None, threads=None, memory_limit=None,
+                             progress=None, cancel=None, output='pandas'):
+        """Count distinct permutations of faces.
+
+        Input:
+            workers (int): Processes to split the rows across.
+            threads (int): Threads to split the rows across instead.
+            memory_limit (int): Bytes of temporaries allowed.
+            progress (callable), cancel (CancelToken): See `jackpot`.
+            output (str): 'pandas', 'numpy' or 'arrow' (needs pyarrow).
+
         Returns:
-            pd.DataFrame: MultiIndex of combinations with counts.
-        
+            pd.DataFrame: MultiIndex of permutations with counts. For 'numpy'
+            a structured array of die codes and Counts and the faces; for
+            'arrow' a table of dictionary columns and Counts.
+
+        Raises:
+            ValueError: If no game was play or output is invalid.
+        """
+        formats.check_output(output)
+        rows, counts = self._count('permutation_count', workers, threads, memory_limit,
+                                   progress=progress, cancel=cancel)
+        if output != 'pandas':
+            return formats.count_table(rows, counts, self.game.faces, output)
+        return _count_frame(rows, counts, self.game.faces)
+
+
+    def mask(self, event):
+        """Mark the rolls where an event happens.
+
+        Input:
+            event (Event): Built from `montecarlo.events`, e.g.
+                `count(6) >= 3` or `die(0) == die(1)`.
+
+        Returns:
+            numpy.ndarray: One boolean per roll.
+
+        Raises:
+            ValueError: If no game was play or event is not an Event.
+        """
+        if not isinstance(event, Event):
+            raise ValueError('Input must be an Event object.')
+        codes = self._check_results()
+        # Face counts built for one event are reused by the next ones
+        if self._context is None or self._context.codes is not codes:
+            self._context = _Context(codes, self.game.faces)
+        return event.evaluate(self._context)
+
+
+    def count_where(self, event):
+        """Count the rolls where an event happens.
+
+        Input:
+            event (Event): See `mask`.
+
+        Returns:
+            int: Number of rolls.
+
+        Raises:
+            ValueError: If no game was play or event is not an Event.
+        """
+        return int(np.count_nonzero(self.mask(event)))
+
+
+    def runs(self, event_or_die, max_lag=10):
+        """Analyze runs over consecutive rolls of an event or of one die.
+
+        Input:
+            event_or_die (Event, int): An event (runs of True and False) or
+                the position of a die (runs of the same face).
+            max_lag (int): Largest lag of the autocorrelation.
+
+        Returns:
+            RunTracker: Fed with the whole sequence; query its `encoding`,
+            `longest`, `gaps` and `autocorrelation`.
+
         Raises:
             ValueError: If no game was play.
+            IndexError: If the die is not in the game.
         """
-        self._check_results()    
-        combos = self.game.results.apply(lambda row: tuple(sorted(row)), axis=1)
-        counts = combos.value_counts().reset_index()
-        counts.columns = ['Combination', 'Counts']
-        counts = counts.set_index('Combination')
-        counts.index = pd.MultiIndex.from_tuples(counts.index, 
-                                                 names=[f'{i}' for i in range(self.game.results.shape[1])]
-                                                )
-        return counts
-    
-    
-    def permutation_count(self):
-        """Count distinct permutations of faces.
-        
+        if isinstance(event_or_die, Event):
+            codes = self.mask(event_or_die)
+            tracker = RunTracker(np.array([False, True]), max_lag)
+        else:
+            codes = self._check_results()
+            if not -codes.shape[1] <= event_or_die < codes.shape[1]:
+                raise IndexError(f'Die {event_or_die} is not in the game')
+            codes = codes[:, event_or_die]
+            tracker = RunTracker(self.game.faces, max_lag)
+        tracker.update(codes)
+        return tracker
+
+
+    def cooccurrence(self, pairs=None):
+        """Count each pair of faces shown together by each pair of dice.
+
+        Each die is combined with all others in one bincount of pair codes.
+
+        Input:
+            pairs (list): (die, die) positions to count (default = all).
+
+        Returns:
+            numpy.ndarray: Counts (dice x dice x faces x faces), or (pairs x
+            faces x faces) for selected pairs, in the order of game.faces.
+            Entry [i, j, a, b] counts rolls where die i shows face a and die
+            j shows face b; the diagonal of [i, i] holds die i's marginal
+            face frequencies.
+
+        Raises:
+            ValueError: If no game was play.
+            IndexError: If a die is not in the game.
+        """
+        codes = self._check_results()
+        n_dice, n_faces = codes.shape[1], len(self.game.faces)
+        if pairs is None:
+            table = np.empty((n_dice, n_dice, n_faces, n_faces), dtype=np.int64)
+            offsets = np.arange(n_dice) * n_faces
+            for i in range(n_dice):
+                keys = (codes + offsets) * n_faces + codes[:, i:i + 1]
+                counts = np.bincount(keys.ravel(), minlength=n_dice * n_faces * n_faces)
+                # Keys put die j's face first, transpose to [j, b, a] -> [a, b]
+                table[i] = counts.reshape(n_dice, n_faces, n_faces).transpose(0, 2, 1)
+            return table
+
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        if ((pairs < -n_dice) | (pairs >= n_dice)).any():
+            raise IndexError('Pairs must be positions of dice in the game')
+        table = np.empty((len(pairs), n_faces, n_faces), dtype=np.int64)
+        for k, (i, j) in enumerate(pairs):
+            keys = codes[:, i].astype(np.int64) * n_faces + codes[:, j]
+            table[k] = np.bincount(keys, minlength=n_faces * n_faces).reshape(n_faces, n_faces)
+        return table
+
+
+    def independence(self, pairs=None):
+        """Chi-square test of independence for pairs of dice.
+
+        The statistics of all pairs are computed at once from their
+        contingency tables. Faces a die never showed are left out of its
+        degrees of freedom.
+
+        Input:
+            pairs (list): (die, die) positions to test (default = every pair
+                of distinct dice).
+
         Returns:
-            pd.DataFrame: MultiIndex of permutations with counts.
-            
+            pd.DataFrame: DieA, DieB, Chi2, DoF and PValue per pair. PValue
+            comes from scipy if installed, else from the incomplete gamma
+            function computed here; it is NaN for zero degrees of freedom.
+
         Raises:
             ValueError: If no game was play.
+            IndexError: If a die is not in the game.
         """
-        self._check_results()
-        perms = self.game.results.apply(lambda row: tuple(row), axis=1)
-        counts = perms.value_counts().rename('Counts').to_frame()
-        counts.index = pd.MultiIndex.from_tuples(
-            counts.index,
-            names=[f'{i}' for i in range(self.game.results.shape[1])])
-        return counts
\ No newline at end of file
+        n_dice = self._check_results().shape[1]
+        if pairs is None:
+            pairs = [(i, j) for i in range(n_dice) for j in range(i + 1, n_dice)]
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        table = self.cooccurrence(pairs).astype(float)
+
+        rows, columns = table.sum(axis=2), table.sum(axis=1)
+        total = rows.sum(axis=1)
+        expected = rows[:, :, None] * columns[:, None, :] / total[:, None, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cells = np.where(expected > 0, (table - expected) ** 2 / expected, 0.0)
+        chi2 = cells.sum(axis=(1, 2))
+        dof = ((rows > 0).sum(axis=1) - 1) * ((columns > 0).sum(axis=1) - 1)
+
+        try:
+            from scipy.stats import chi2 as chi2_distribution
+            p_value = chi2_distribution.sf(chi2, dof)
+        except ImportError:
+            p_value = _chi2_sf(chi2, dof)
+        return pd.DataFrame({'DieA': pairs[:, 0], 'DieB': pairs[:, 1], 'Chi2': chi2,
+                             'DoF': dof, 'PValue': p_value})
@@ -0,0 +1,110 @@
+from contextlib import contextmanager
+import os
+from . import kernels
+import numpy as np
+
+
+class NumpyBackend():
+    """Hot loops of sampling and analysis written as numpy array operations.
+
+    Every backend provides these methods and returns identical results for
+    the same input, so the backend only changes speed and memory use.
+    """
+
+    name = 'numpy'
+
+    def search(self, cdf, u):
+        """Map uniform draws to face codes through one cumulative table."""
+        return np.searchsorted(cdf, u, side='right')
+
+    def search_stacked(self, cdf, u):
+        """Map each row of draws through its own cumulative table (tables x draws)."""
+        return kernels.search_stacked(cdf, u)
+
+    def markov_chains(self, cdf, start, u):
+        """Run Markov chains from their start states (chains x steps)."""
+        return kernels.markov_chains(cdf, start, u)
+
+    def jackpot_count(self, codes):
+        """Count rows where every die shows the same face."""
+        return int(kernels.jackpot_mask(codes).sum())
+
+    def face_counts_per_row(self, codes, n_faces):
+        """Count how often each face appears in each row (rows x faces)."""
+        return kernels.face_counts_per_row(codes, n_faces)
+
+    def sort_rows(self, codes, order, rank):
+        """Sort the codes in each row by face value (combinations)."""
+        return kernels.sort_rows(codes, order, rank)
+
+    def count_rows(self, codes, radix):
+        """Count the distinct rows of a codes matrix."""
+        return kernels.count_rows(codes, radix)
+
+
+def _numba_backend():
+    """Build the numba backend, which is only needed when it is selected."""
+    try:
+        from .numba_backend import NumbaBackend
+    except ImportError:
+        raise ImportError("The numba backend requires numba "
+                          "(pip install 'montecarlo[numba]')")
+    return NumbaBackend()
+
+
+# Backend factories by name; the selected one is built on first use
+_FACTORIES = {'numpy': NumpyBackend, 'numba': _numba_backend}
+_active = None
+
+
+def register_backend(name, factory):
+    """Make a backend available to `set_backend`.
+
+    Input:
+        name (str): Name to select it by.
+        factory (callable): Returns the backend object, with the `name`
+            and methods of NumpyBackend.
+    """
+    _FACTORIES[name] = factory
+
+
+def set_backend(name):
+    """Select the backend used by dice, games and analyzers.
+
+    Input:
+        name (str): 'numpy' (default), 'numba' or a registered name.
+
+    Returns:
+        The selected backend.
+
+    Raises:
+        ValueError: If no backend has that name.
+        ImportError: If the backend's dependency is not installed.
+    """
+    global _active
+    if name not in _FACTORIES:
+        raise ValueError(f'Unknown backend {name!r}, choose from {sorted(_FACTORIES)}')
+    if _active is None or _active.name != name:
+        _active = _FACTORIES[name]()
+    return _active
+
+
+def get_backend():
+    """Return the selected backend.
+
+    The first call selects $MONTECARLO_BACKEND, or 'numpy' if unset.
+    """
+    if _active is None:
+        set_backend(os.environ.get('MONTECARLO_BACKEND', 'numpy'))
+    return _active
+
+
+@contextmanager
+def use_backend(name):
+    """Select a backend for the duration of a with block."""
+    global _active
+    previous = get_backend()
+    try:
+        yield set_backend(name)
+    finally:
+        _active = previous
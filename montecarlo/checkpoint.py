@@ -0,0 +1,105 @@
+import json
+import os
+import time
+import numpy as np
+from .packed import PackedCodes
+from .storage import _tolist, _write_atomic, _write_json
+
+# Checkpoints are spaced so that writing them takes at most this share of
+# the run time
+_MAX_OVERHEAD = 0.02
+
+
+class Checkpoint():
+
+    def __init__(self, path, every, written=0, analyzer_file=None):
+        """Initialize periodic checkpointing of a play to local files.
+
+        Coded results are appended to `path + '.codes'` so each checkpoint
+        only writes the rolls since the last one. Analyzer state goes to a
+        new `path + '.analyzer-DONE.npz'` file each time. The small JSON
+        file at `path` is replaced last and says which data is valid.
+
+        Input:
+            path (str): Checkpoint file.
+            every (float): Seconds between checkpoints.
+            written (int): Rolls already in the codes file.
+            analyzer_file (str): Analyzer state of the previous checkpoint.
+        """
+        self.path = path
+        self.every = every
+        self._written = written
+        self._analyzer_file = analyzer_file
+        self._cost = 0.0
+        self._last = time.monotonic()
+
+    def due(self):
+        """Whether enough time has passed to write the next checkpoint."""
+        wait = max(self.every, self._cost / _MAX_OVERHEAD)
+        return time.monotonic() - self._last >= wait
+
+    def write(self, game, rng, rolls, done, codes=None, analyzer=None):
+        """Write a checkpoint after `done` of `rolls` rolls.
+
+        Input:
+            game (Game): The game being played.
+            rng (numpy.random.Generator, list): Generator about to draw roll
+                `done`, or one generator per thread.
+            rolls (int): Total number of rolls of the play.
+            done (int): Rolls completed.
+            codes (numpy.ndarray, PackedCodes): Coded results (results mode).
+            analyzer (OnlineAnalyzer): Running analyzer (analyzer mode).
+        """
+        start = time.monotonic()
+        if codes is not None:
+            codes_path = self.path + '.codes'
+            with open(codes_path, 'r+b' if os.path.exists(codes_path) else 'wb') as f:
+                # Drop rolls appended after the last complete checkpoint
+                f.truncate(self._written * codes.itemsize * codes.shape[1])
+                f.seek(0, os.SEEK_END)
+                f.write(codes[self._written:done].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._written = done
+        previous = self._analyzer_file
+        if analyzer is not None:
+            self._analyzer_file = f'{self.path}.analyzer-{done}.npz'
+            _write_atomic(self._analyzer_file, analyzer.save)
+
+        _write_json(self.path, {'rolls': rolls, 'done': done,
+                                'mode': ('analyzer' if codes is None else
+                                         'packed' if isinstance(codes, PackedCodes) else 'results'),
+                                'analyzer': self._analyzer_file,
+                                'every': self.every,
+                                'rng': ([r.bit_generator.state for r in rng]
+                                        if isinstance(rng, list) else rng.bit_generator.state),
+                                'chain': game._chain.tolist(),
+                                'block': game._block,
+                                'faces': game.faces.tolist(),
+                                'weights': game._weights().tolist(),
+                                'transitions': _tolist(game._transitions())})
+        if previous is not None and previous != self._analyzer_file:
+            os.remove(previous)
+        self._last = time.monotonic()
+        self._cost = self._last - start
+
+
+def read_checkpoint(path):
+    """Read the state of a checkpoint.
+
+    Returns:
+        dict: Rolls, rolls done, mode, interval, generator state, block
+        size, faces, weights and transitions (None without Markov dice) of
+        the checkpointed play.
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+def restore_rng(state):
+    """Rebuild a generator (or one per thread) from saved bit generator state."""
+    if isinstance(state, list):
+        return [restore_rng(s) for s in state]
+    rng = np.random.Generator(getattr(np.random, state['bit_generator'])())
+    rng.bit_generator.state = state
+    return rng
@@ -1,31 +1,117 @@
 import numpy as np
 import pandas as pd
+from .backends import get_backend
+from .fenwick import FenwickTree
+from .kernels import uniform_codes
+
+# Rolls sampled at once by buffered dice for single rolls and small batches
+_BUFFER_ROLLS = 1 << 10
+
+# Largest batch served from the pre-sampled rolls
+_BUFFER_BATCH = 16
+
+def _face_hashes(faces):
+    """Private function hashing each face to a uint64.
+    
+    Numbers and fixed-width strings are hashed from their raw values in
+    vectorized passes; other faces fall back to pandas hashing. Numbers
+    hash as float64 so 1 and 1.0 count as the same face.
+    """
+    if faces.dtype.kind in 'biuf':
+        keys = (faces.astype(np.float64) + 0.0).view(np.uint64)
+    elif faces.dtype.kind in 'SU':
+        width = 4 if faces.dtype.kind == 'U' else 1
+        chars = np.ascontiguousarray(faces).view(f'u{width}').reshape(len(faces), -1)
+        keys = np.zeros(len(faces), dtype=np.uint64)
+        for column in chars.T:
+            # Padding characters are skipped so the dtype width doesn't matter
+            keys = np.where(column != 0, keys * np.uint64(1099511628211) + column, keys)
+    else:
+        return pd.util.hash_array(faces)
+    
+    # splitmix64 finalizer spreads the raw keys over all 64 bits
+    keys = (keys ^ (keys >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    keys = (keys ^ (keys >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return keys ^ (keys >> np.uint64(31))
+
+
+def _check_total(total):
+    """Private function checking the total weight a die samples from.
+
+    Raises:
+        ValueError: If the total is not positive and finite, i.e. every
+            weight is zero or a weight is NaN or infinite.
+    """
+    if not 0 < total < np.inf:
+        raise ValueError('Weights must be finite with a positive total')
+    return total
+
 
 class Die():
     
-    def __init__(self, faces):
+    def __init__(self, faces, dynamic=False, buffered=False):
         """Initialize the Die class
         
         Input:
             faces (numpy.ndarray): Array of faces with distinct values.
+            dynamic (bool): Keep the weights in a Fenwick tree so that
+                change_weight and roll cost O(log n) instead of O(n).
+                Suited to large dice whose weights change between rolls.
+            buffered (bool): Serve single rolls and small batches from a
+                block of faces drawn ahead from numpy.random (see roll).
+                Suited to calling roll() millions of times.
             
         Raises:
             TypeError: If input is not a Numpy array.
-            ValueError: If values are not distinct.
+            ValueError: If values are not distinct, or the die is both
+                dynamic and buffered.
         """
         # Check if faces is a NumPy array
         if not isinstance(faces, np.ndarray):
             raise TypeError('Must be a NumPy array')
         
-        # Check if all values are distinct
-        if len(np.unique(faces)) != len(faces):
+        # Hash-based face to code lookup, also checks distinct values
+        index = pd.Index(faces)
+        if not index.is_unique:
             raise ValueError('All values in the array must be distinct')
-            
-        # Initializes weights
-        weights = np.ones_like(faces, dtype=float)
         
-        # Create private dataframe
-        self.dataframe = pd.DataFrame({'weights':weights}, index = faces)
+        # Keep the faces as given, the index may convert their dtype
+        self._faces = faces
+        self._index = index
+        
+        # Initializes weights as one contiguous array in face order
+        self._weights = np.ones(len(faces))
+        
+        # Order-independent hash of the face set, compared by Game
+        hashes = _face_hashes(faces)
+        self.fingerprint = (len(faces), int(hashes.sum()), int(np.bitwise_xor.reduce(hashes)))
+        
+        # Dynamic dice sample from a tree of partial sums
+        self.dynamic = dynamic
+        self._tree = FenwickTree(self._weights) if dynamic else None
+
+        # Dynamic dice change weights between rolls, so they can't draw ahead
+        if dynamic and buffered:
+            raise ValueError('A die can\'t be both dynamic and buffered')
+        self.buffered = buffered
+
+        # Pre-sampled faces for small rolls and the next one to serve
+        self._buffer = None
+        self._position = 0
+
+        # Posterior of the weights, for dice made by fit
+        self.estimate = None
+    
+    @property
+    def dataframe(self):
+        """pandas.DataFrame: Faces and weights, a read-only view built on access.
+        
+        Edits to the frame raise ValueError; use change_weight to edit
+        weights, or get_data for a copy to work on.
+        """
+        weights = self._weights.view()
+        weights.flags.writeable = False
+        return pd.DataFrame({'weights': weights}, index=self._index, copy=False)
         
     
     def change_weight(self, face_value, new_weight):
@@ -41,25 +127,40 @@ class Die():
             ValueError: If the new weight is invalid.
         """
         # Check for existing faces
-        if face_value not in self.dataframe.index:
+        try:
+            code = self._index.get_loc(face_value)
+        except (KeyError, TypeError):
             raise IndexError(f'Face value, {face_value}, is not found')
 
         # Handle numeric weights
         if isinstance(new_weight, (int, float)):
-            self.dataframe.loc[face_value, 'weights'] = float(new_weight)
+            weight = float(new_weight)
         # Handle string weights
         elif isinstance(new_weight, str):
             try:
-                self.dataframe.loc[face_value, 'weights'] = float(new_weight)
+                weight = float(new_weight)
             except ValueError:
                 raise TypeError('Weight must be numeric (int or float)')
         else:
             raise TypeError(f'Weights must be numeric (int or float)')
+        if weight < 0:
+            raise ValueError('Weight must not be negative')
+        
+        self._weights[code] = weight
+        self._buffer = None
+        if self.dynamic:
+            self._tree.set(code, weight)
             
     
     def roll(self, dice_rolls=1):
         """Roll the dice one or more times.
         
+        Buffered dice serve single rolls and batches of up to
+        _BUFFER_BATCH rolls from a block of faces drawn ahead, refilled
+        from numpy.random when it runs out and dropped when a weight
+        changes. Drawing ahead moves numpy.random past rolls not yet
+        served, so call reset() after numpy.random.seed.
+        
         Input:
             dice_rolls (int): Number of times to roll the die (default = 1).
             
@@ -76,18 +177,158 @@ class Die():
         if dice_rolls < 1:
             raise ValueError("Number of rolls must be positive.")
         
-        # Get weighted probobality                     
-        weights = self.dataframe['weights'].values
-        normalized_weights = weights / weights.sum()
+        if self.buffered and dice_rolls <= _BUFFER_BATCH:
+            buffer, position = self._buffer, self._position
+            if buffer is None or position + dice_rolls > len(buffer):
+                buffer, position = self._draw(_BUFFER_ROLLS), 0
+                self._buffer = buffer
+            self._position = position + dice_rolls
+            if dice_rolls == 1:
+                return [buffer[position]]
+            return list(buffer[position:position + dice_rolls])
+        return list(self._draw(dice_rolls))
+
+    def reset(self):
+        """Drop the rolls a buffered die drew ahead, e.g. after numpy.random.seed.
+
+        The next roll then draws from numpy.random again.
+        """
+        self._buffer = None
+
+    def _draw(self, dice_rolls):
+        """Private method drawing faces from numpy.random.
+        
+        Returns:
+            numpy.ndarray: The faces of the rolls.
+        """
+        # Dynamic dice search the tree, no renormalization needed
+        if self.dynamic:
+            targets = np.random.random(dice_rolls) * _check_total(self._tree.total())
+            return self._faces[self._tree.sample(targets)]
         
-        # Perform random rolls
-        outcomes = np.random.choice(
-            self.dataframe.index.values,
-            size=dice_rolls,
-            p=normalized_weights
-        )
+        # Fair dice take their codes straight from random bits
+        if self._uniform():
+            return self._faces[uniform_codes(len(self._faces), dice_rolls, np.random)]
+
+        # Same draws as numpy.random.choice with the weights as p
+        codes = get_backend().search(self._cdf(), np.random.random_sample(dice_rolls))
+        return self._faces[codes]
+
+    def _uniform(self):
+        """Private method telling whether every face has the same weight.
+
+        Dynamic dice always sample their tree, so they never count as fair.
+        """
+        weights = self._weights
+        return (not self.dynamic and 0 < weights[0] < np.inf
+                and (weights == weights[0]).all())
+    
+    @classmethod
+    def fit(cls, observations, faces=None, prior=1.0, level=0.95):
+        """Estimate a die's weights from observed rolls.
+
+        Rolls are coded and counted chunk by chunk in a single pass, so
+        memory maps and iterables of chunks larger than memory can be fit.
+        The weights are the posterior means under a symmetric Dirichlet
+        prior.
+
+        Input:
+            observations: Observed faces: a NumPy array, memory map, list
+                or DataFrame, or an iterator of arrays read piece by piece.
+            faces (numpy.ndarray): Faces of the die (default = the faces
+                observed). Passing them is faster for large integer logs.
+            prior (float): Pseudo-count added to every face (1 = uniform
+                prior, 0 = plain frequencies).
+            level (float): Probability covered by the intervals.
+
+        Returns:
+            Die: A die with the estimated weights. Its `estimate` holds the
+            Counts, Weight, Lower and Upper interval bounds of every face.
+
+        Raises:
+            ValueError: If there are no observations, one is not a face, or
+                prior or level is invalid.
+        """
+        from .fitting import check_prior, count_faces, dirichlet_summary
+        check_prior(prior, level)
+        faces, counts = count_faces(observations, faces)
+        return cls._fitted(faces, dirichlet_summary(faces, counts.sum(axis=0), prior, level))
+
+    @classmethod
+    def fit_mixture(cls, sessions, components, faces=None, prior=1.0, level=0.95,
+                    max_iter=500, tol=1e-10, seed=None):
+        """Estimate a mixture of dice from sessions of unlabeled rolls.
+
+        Each session (row) was rolled with one die of the mixture, but which
+        one is unknown. Sessions are reduced in a single pass to a histogram
+        of their face counts, and EM is run on that histogram.
+
+        Input:
+            sessions: Rolls (sessions x rolls per session), as for `fit`.
+            components (int): Number of dice in the mixture.
+            faces (numpy.ndarray): Faces of the dice (default = the faces
+                observed).
+            prior (float), level (float): See `fit`.
+            max_iter (int): Most EM iterations.
+            tol (float): Relative log-likelihood gain to stop at.
+            seed (int): Seed for the starting point of EM.
+
+        Returns:
+            tuple: The fitted dice (list, largest share first), each with an
+            `estimate` from its expected counts, and their mixing shares
+            (numpy.ndarray).
+
+        Raises:
+            ValueError: If components is not a positive integer, or as `fit`.
+        """
+        from .fitting import check_prior, count_sessions, dirichlet_summary, fit_mixture
+        check_prior(prior, level)
+        if not isinstance(components, int) or components < 1:
+            raise ValueError('Number of components must be a positive integer.')
+        faces, rows, counts = count_sessions(sessions, faces)
+        shares, expected, _ = fit_mixture(rows, counts, components, prior, max_iter, tol, seed)
+        dice = [cls._fitted(faces, dirichlet_summary(faces, counts, prior, level))
+                for counts in expected]
+        return dice, shares
+
+    @classmethod
+    def _fitted(cls, faces, estimate):
+        """Private method making a die from a fit's estimate."""
+        die = cls(np.asarray(faces))
+        die._set_weights(estimate['Weight'].to_numpy())
+        die.estimate = estimate
+        return die
+
+    def _cdf(self):
+        """Private method returning the cumulative table of the weights."""
+        weights = self._weights
+        cdf = (weights / _check_total(weights.sum())).cumsum()
+        cdf /= cdf[-1]
+        return cdf
+    
+    def _roll_codes(self, dice_rolls, rng):
+        """Private method to roll the die as integer codes into its faces.
         
-        return list(outcomes)
+        Input:
+            dice_rolls (int): Number of times to roll the die.
+            rng (numpy.random.Generator): Source of randomness.
+            
+        Returns:
+            numpy.ndarray: Position of each outcome in the die's faces.
+        """
+        if self.dynamic:
+            total = _check_total(self._tree.total())
+            return self._tree.sample(rng.random(dice_rolls) * total)
+        if self._uniform():
+            return uniform_codes(len(self._faces), dice_rolls, rng)
+        return get_backend().search(self._cdf(), rng.random(dice_rolls))
+    
+    def _set_weights(self, weights):
+        """Private method to replace every weight at once (in face order)."""
+        self._weights = np.array(weights, dtype=float)
+        self._buffer = None
+        if self.dynamic:
+            self._tree = FenwickTree(self._weights)
     
     def get_data(self):
         """Returns a copy of the die's current dataframe.
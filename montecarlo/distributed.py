@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+from .game import Game
+from .online import OnlineAnalyzer
+from .storage import _make_dice, _write_atomic, _write_json
+
+# Layout of a queue directory on shared storage:
+#   job.npz             faces, weights and transitions of the dice, whether to
+#                       keep results
+#   pending/NAME.json   shards waiting for a worker
+#   claimed/NAME.json   shards a worker is running (mtime = claim time)
+#   done/NAME.npz       coded results of a finished shard (if kept)
+#   done/NAME.state.npz OnlineAnalyzer state, written last: marks the shard done
+_DIRS = ('pending', 'claimed', 'done')
+
+
+def _entries(directory, suffix):
+    """Sorted names of the finished files in a queue directory."""
+    return sorted(name for name in os.listdir(directory)
+                  if name.endswith(suffix) and not name.startswith('.'))
+
+
+def submit(game, rolls, queue, shards, seed=None, keep_results=True):
+    """Split a play job into seeded shards and publish them to a queue.
+
+    Shard seeds are spawned from one SeedSequence, so the combined result
+    only depends on seed and shards, not on which worker ran what.
+    Each shard is its own play, so Markov dice start their chains afresh
+    in every shard.
+
+    Input:
+        game (Game): The game to play.
+        rolls (int): Total number of rolls.
+        queue (str): Queue directory on storage shared by the workers.
+        shards (int): Number of shards to split the rolls into.
+        seed (int): Seed of the job (default = fresh entropy).
+        keep_results (bool): Store coded results, not only analyzer state.
+
+    Raises:
+        TypeError: If rolls or shards is not an integer.
+        ValueError: If they are not positive or the queue already has a job.
+    """
+    if not isinstance(game, Game):
+        raise ValueError('Input must be a Game object.')
+    if not isinstance(rolls, int) or not isinstance(shards, int):
+        raise TypeError('Number of rolls and shards must be integers.')
+    if rolls < 1 or shards < 1 or shards > rolls:
+        raise ValueError('Need at least one roll per shard.')
+    if os.path.exists(os.path.join(queue, 'job.npz')):
+        raise ValueError(f'{queue} already holds a job')
+
+    for name in _DIRS:
+        os.makedirs(os.path.join(queue, name), exist_ok=True)
+
+    # Shards are published after the job so workers never see one without it
+    transitions = game._transitions()
+    extra = {} if transitions is None else {'transitions': transitions}
+    _write_atomic(os.path.join(queue, 'job.npz'), lambda tmp: np.savez(
+        tmp, faces=game.faces, weights=game._weights(), shards=shards,
+        keep_results=keep_results, **extra))
+
+    sizes = np.diff(np.linspace(0, rolls, shards + 1).astype(np.int64))
+    for i, child in enumerate(np.random.SeedSequence(seed).spawn(shards)):
+        shard = {'shard': i, 'rolls': int(sizes[i]),
+                 'entropy': child.entropy, 'spawn_key': list(child.spawn_key)}
+        _write_json(os.path.join(queue, 'pending', f'shard-{i:06d}.json'), shard)
+
+
+def _claim(queue, requeue_after):
+    """Claim one pending shard, requeueing stale claims if none is left.
+
+    A claim is an atomic rename, so only one worker gets each shard.
+    """
+    pending = os.path.join(queue, 'pending')
+    claimed = os.path.join(queue, 'claimed')
+    for attempt in range(2):
+        for name in _entries(pending, '.json'):
+            try:
+                os.rename(os.path.join(pending, name), os.path.join(claimed, name))
+            except FileNotFoundError:
+                continue
+            os.utime(os.path.join(claimed, name))
+            return name
+        if requeue_after is None:
+            return None
+        # Put back shards whose worker seems to have died
+        for name in _entries(claimed, '.json'):
+            path = os.path.join(claimed, name)
+            try:
+                if time.time() - os.path.getmtime(path) >= requeue_after:
+                    os.rename(path, os.path.join(pending, name))
+            except FileNotFoundError:
+                continue
+    return None
+
+
+def work(queue, max_shards=None, requeue_after=None):
+    """Run shards from a queue until none is left.
+
+    Shards already done are skipped, so running a shard twice (after a
+    requeue) leaves the same result.
+
+    Input:
+        queue (str): Queue directory created by `submit`.
+        max_shards (int): Stop after this many shards (default = no limit).
+        requeue_after (float): Seconds after which a claimed shard is
+            considered failed and run again (default = never).
+
+    Returns:
+        int: Number of shards this worker completed.
+    """
+    with np.load(os.path.join(queue, 'job.npz')) as job:
+        faces, weights = job['faces'], job['weights']
+        transitions = job['transitions'] if 'transitions' in job.files else None
+        keep_results = bool(job['keep_results'])
+    game = Game(_make_dice(faces, weights, transitions))
+
+    completed = 0
+    while max_shards is None or completed < max_shards:
+        name = _claim(queue, requeue_after)
+        if name is None:
+            break
+        claim = os.path.join(queue, 'claimed', name)
+        try:
+            with open(claim) as f:
+                shard = json.load(f)
+        except FileNotFoundError:
+            # Requeued and taken by another worker meanwhile
+            continue
+
+        done = os.path.join(queue, 'done', name[:-len('.json')])
+        if not os.path.exists(done + '.state.npz'):
+            seed = np.random.SeedSequence(shard['entropy'], spawn_key=shard['spawn_key'])
+            game.play(shard['rolls'], seed=seed)
+            if keep_results:
+                _write_atomic(done + '.npz', lambda tmp: np.savez(tmp, codes=game.codes))
+            state = OnlineAnalyzer.from_game(game)
+            _write_atomic(done + '.state.npz', state.save)
+            completed += 1
+        try:
+            os.remove(claim)
+        except FileNotFoundError:
+            pass
+    return completed
+
+
+def status(queue):
+    """Count the shards of a queue by state.
+
+    Returns:
+        dict: Number of 'pending', 'claimed' and 'done' shards.
+    """
+    return {name: len(_entries(os.path.join(queue, name), suffix))
+            for name, suffix in zip(_DIRS, ('.json', '.json', '.state.npz'))}
+
+
+def reduce(queue):
+    """Merge the finished shards of a queue.
+
+    Input:
+        queue (str): Queue directory whose shards are all done.
+
+    Returns:
+        tuple: The merged OnlineAnalyzer, and a Game holding the results in
+        shard order (None if the job didn't keep results).
+
+    Raises:
+        ValueError: If some shards are not done yet.
+    """
+    with np.load(os.path.join(queue, 'job.npz')) as job:
+        faces, weights = job['faces'], job['weights']
+        transitions = job['transitions'] if 'transitions' in job.files else None
+        shards = int(job['shards'])
+        keep_results = bool(job['keep_results'])
+
+    done = os.path.join(queue, 'done')
+    names = [entry[:-len('.state.npz')] for entry in _entries(done, '.state.npz')]
+    if len(names) < shards:
+        raise ValueError(f'{shards - len(names)} shards are not done')
+    analyzer = OnlineAnalyzer(faces, len(weights))
+    for name in names:
+        analyzer.merge(OnlineAnalyzer.load(os.path.join(done, name + '.state.npz')))
+
+    game = None
+    if keep_results:
+        game = Game(_make_dice(faces, weights, transitions))
+        codes = []
+        for name in names:
+            with np.load(os.path.join(done, name + '.npz')) as shard:
+                codes.append(shard['codes'])
+        game._set_codes(np.concatenate(codes))
+    return analyzer, game
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run montecarlo shards from a queue directory.')
+    parser.add_argument('queue', help='queue directory created by submit()')
+    parser.add_argument('--max-shards', type=int, default=None)
+    parser.add_argument('--requeue-after', type=float, default=None,
+                        help='seconds before a claimed shard is run again')
+    args = parser.parse_args()
+    print(work(args.queue, args.max_shards, args.requeue_after))
@@ -0,0 +1,193 @@
+import operator
+from .backends import get_backend
+from . import kernels
+import numpy as np
+
+# Above this many faces, count terms look up the dice of each row instead of
+# building the rows x faces count matrix
+_MAX_COUNT_MATRIX_FACES = 64
+
+
+class _Context():
+
+    def __init__(self, codes, faces):
+        """Coded results an event is evaluated on, with cached derived arrays.
+
+        Input:
+            codes (numpy.ndarray): Coded rolls (rolls x dice).
+            faces (numpy.ndarray): Faces the codes point into.
+        """
+        self.codes = codes
+        self.faces = faces
+        self._counts = None
+        self._rank = None
+
+    def face_counts(self):
+        """Count matrix of each face in each roll, built once."""
+        if self._counts is None:
+            self._counts = get_backend().face_counts_per_row(self.codes, len(self.faces))
+        return self._counts
+
+    def rank(self):
+        """Rank of each code in face order, for comparing two dice."""
+        if self._rank is None:
+            self._rank = kernels.face_order(self.faces)[1]
+        return self._rank
+
+    def face_codes(self, values):
+        """Codes of the given faces; faces not on the dice are left out."""
+        return np.flatnonzero(np.isin(self.faces, np.ravel(values)))
+
+    def column(self, die):
+        """Codes shown by one die."""
+        if not -self.codes.shape[1] <= die < self.codes.shape[1]:
+            raise IndexError(f'Die {die} is not in the game')
+        return self.codes[:, die]
+
+
+class Event():
+
+    def __init__(self, evaluate):
+        """Initialize an event from a function of the evaluation context.
+
+        Events are built with `die`, `count`, `jackpot` and `where`, and
+        combined with & (and), | (or), ^ (xor) and ~ (not).
+
+        Input:
+            evaluate (callable): Maps a _Context to a boolean mask of rolls.
+        """
+        self._evaluate = evaluate
+
+    def mask(self, codes, faces):
+        """Mark the rolls where the event happens.
+
+        Input:
+            codes (numpy.ndarray): Coded rolls (rolls x dice).
+            faces (numpy.ndarray): Faces the codes point into.
+
+        Returns:
+            numpy.ndarray: One boolean per roll.
+        """
+        return self.evaluate(_Context(codes, faces))
+
+    def evaluate(self, context):
+        """Mark the rolls of a context where the event happens."""
+        return self._evaluate(context)
+
+    def __and__(self, other):
+        return Event(lambda ctx: self.evaluate(ctx) & other.evaluate(ctx))
+
+    def __or__(self, other):
+        return Event(lambda ctx: self.evaluate(ctx) | other.evaluate(ctx))
+
+    def __xor__(self, other):
+        return Event(lambda ctx: self.evaluate(ctx) ^ other.evaluate(ctx))
+
+    def __invert__(self):
+        return Event(lambda ctx: ~self.evaluate(ctx))
+
+
+class _DieTerm():
+
+    def __init__(self, position):
+        """The face shown by one die, compared to make an Event."""
+        self.position = position
+
+    def _compare(self, op, other):
+        if isinstance(other, _DieTerm):
+            if op in (operator.eq, operator.ne):
+                return Event(lambda ctx: op(ctx.column(self.position),
+                                            ctx.column(other.position)))
+            # Order by face value, through the rank of each code
+            return Event(lambda ctx: op(ctx.rank()[ctx.column(self.position)],
+                                        ctx.rank()[ctx.column(other.position)]))
+        # A table of which faces pass the test, looked up by code
+        return Event(lambda ctx: np.asarray(op(ctx.faces, other))[ctx.column(self.position)])
+
+    def __eq__(self, other):
+        return self._compare(operator.eq, other)
+
+    def __ne__(self, other):
+        return self._compare(operator.ne, other)
+
+    def __lt__(self, other):
+        return self._compare(operator.lt, other)
+
+    def __le__(self, other):
+        return self._compare(operator.le, other)
+
+    def __gt__(self, other):
+        return self._compare(operator.gt, other)
+
+    def __ge__(self, other):
+        return self._compare(operator.ge, other)
+
+    __hash__ = object.__hash__
+
+    def isin(self, faces):
+        """Event that the die shows one of the given faces."""
+        return Event(lambda ctx: np.isin(ctx.faces, faces)[ctx.column(self.position)])
+
+
+class _CountTerm():
+
+    def __init__(self, faces):
+        """Number of dice showing any of the faces, compared to make an Event."""
+        self.faces = faces
+
+    def values(self, ctx):
+        """Count per roll."""
+        codes = ctx.face_codes(self.faces)
+        if len(ctx.faces) <= _MAX_COUNT_MATRIX_FACES:
+            counts = ctx.face_counts()
+            if len(codes) == 1:
+                return counts[:, codes[0]]
+            return counts[:, codes].sum(axis=1)
+        table = np.zeros(len(ctx.faces), dtype=bool)
+        table[codes] = True
+        return table[ctx.codes].sum(axis=1)
+
+    def _compare(self, op, k):
+        return Event(lambda ctx: op(self.values(ctx), k))
+
+    def __eq__(self, k):
+        return self._compare(operator.eq, k)
+
+    def __ne__(self, k):
+        return self._compare(operator.ne, k)
+
+    def __lt__(self, k):
+        return self._compare(operator.lt, k)
+
+    def __le__(self, k):
+        return self._compare(operator.le, k)
+
+    def __gt__(self, k):
+        return self._compare(operator.gt, k)
+
+    def __ge__(self, k):
+        return self._compare(operator.ge, k)
+
+    __hash__ = object.__hash__
+
+
+def die(position):
+    """The face shown by the die at a position, e.g. `die(0) == die(1)`,
+    `die(2) >= 5` or `die(0).isin(['a', 'e'])`."""
+    return _DieTerm(position)
+
+
+def count(faces):
+    """The number of dice showing a face, or any face of a list, e.g.
+    `count(6) >= 3` or `count(['a', 'e', 'i', 'o', 'u']) > 0`."""
+    return _CountTerm(faces)
+
+
+def jackpot():
+    """Event that every die shows the same face."""
+    return Event(lambda ctx: kernels.jackpot_mask(ctx.codes))
+
+
+def where(predicate):
+    """Event from a function of the coded rolls returning a boolean mask."""
+    return Event(lambda ctx: np.asarray(predicate(ctx.codes), dtype=bool))
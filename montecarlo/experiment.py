@@ -0,0 +1,180 @@
+from .backends import get_backend
+from .die import Die
+from .game import Game, _BLOCK_ROLLS, _code_dtype, _global_seed
+from . import kernels
+import pandas as pd
+import numpy as np
+
+_STATISTICS = ('jackpot', 'face_counts', 'combo_count', 'permutation_count')
+
+
+class Experiment():
+
+    def __init__(self, faces, weights, n_dice=1, labels=None):
+        """Initialize an Experiment over a grid of weight settings.
+
+        Every configuration is a game of n_dice dice sharing the same faces.
+
+        Input:
+            faces (numpy.ndarray): Array of faces with distinct values.
+            weights (numpy.ndarray): One weight vector per configuration
+                (configs x faces), or one per die (configs x dice x faces).
+            n_dice (int): Dice per game when weights are per configuration.
+            labels (list): Name of each configuration (default = 0, 1, ...).
+
+        Raises:
+            TypeError: If faces is not a NumPy array.
+            ValueError: If faces are not distinct or weights don't fit them.
+        """
+        # Faces are validated the same way as for a single die
+        Die(faces)
+        weights = np.asarray(weights, dtype=float)
+        if weights.ndim == 2:
+            if not isinstance(n_dice, int) or n_dice < 1:
+                raise ValueError('Number of dice must be a positive integer.')
+            weights = np.repeat(weights[:, None, :], n_dice, axis=1)
+        if weights.ndim != 3 or weights.shape[2] != len(faces) or len(weights) < 1:
+            raise ValueError('Weights must have one column per face')
+        if labels is None:
+            labels = list(range(len(weights)))
+        if len(labels) != len(weights):
+            raise ValueError('Need one label per configuration')
+
+        self.faces = faces
+        self.weights = weights
+        self.labels = list(labels)
+        self._cdf = kernels.cumulative_weights(weights.reshape(-1, len(faces)))
+
+    @classmethod
+    def from_games(cls, games, labels=None):
+        """Build an Experiment from games with the same faces and dice count.
+
+        Input:
+            games (list): Game objects to compare.
+            labels (list): Name of each game (default = 0, 1, ...).
+
+        Returns:
+            Experiment: One configuration per game.
+
+        Raises:
+            ValueError: If the games don't share faces and dice count.
+        """
+        if not isinstance(games, list) or len(games) < 1:
+            raise ValueError('Must be a list of games')
+        first = games[0]
+        weights = []
+        for game in games:
+            if not isinstance(game, Game):
+                raise TypeError('All elements must be a Game object')
+            if len(game.dice) != len(first.dice) or set(game.faces) != set(first.faces):
+                raise ValueError('All games must have the same faces and number of dice')
+            # Reorder weights to the first game's faces
+            order = pd.Index(game.faces).get_indexer(first.faces)
+            weights.append(game._weights()[:, order])
+        return cls(first.faces, np.array(weights), labels=labels)
+
+
+    def run(self, rolls, statistics=('jackpot',), seed=None):
+        """Play every configuration and compute the requested statistics.
+
+        All configurations are sampled together through their stacked
+        cumulative weights, searched by the active backend. Rolls are drawn
+        in blocks, as in Game.play, and each block's counts are folded in
+        before the next, so memory doesn't grow with rolls.
+
+        Input:
+            rolls (int): Number of times to roll each game.
+            statistics (list): Any of 'jackpot', 'face_counts',
+                'combo_count' and 'permutation_count'.
+            seed (int): Seed for the random generator (default = drawn from numpy.random).
+
+        Returns:
+            pandas.DataFrame: Tidy table with columns Config, Statistic,
+            Outcome (face or tuple of faces, None for jackpot) and Counts.
+
+        Raises:
+            TypeError: If rolls is not an integer.
+            ValueError: If rolls is less than 1 or a statistic is unknown.
+        """
+        if not isinstance(rolls, int):
+            raise TypeError('Number of rolls must be an integer.')
+        if rolls < 1:
+            raise ValueError('Number of rolls must be a positive integer.')
+        for statistic in statistics:
+            if statistic not in _STATISTICS:
+                raise ValueError(f'Statistic must be one of {_STATISTICS}')
+
+        n_configs, n_dice, n_faces = self.weights.shape
+        rng = np.random.default_rng(_global_seed(seed))
+        backend = get_backend()
+        totals = {}
+        for start in range(0, rolls, _BLOCK_ROLLS):
+            block = min(_BLOCK_ROLLS, rolls - start)
+            # One row of draws per die
+            codes = backend.search_stacked(self._cdf, rng.random((n_configs * n_dice, block)))
+            codes = codes.T.astype(_code_dtype(n_faces)).reshape(block, n_configs, n_dice)
+            for statistic in dict.fromkeys(statistics):
+                part = getattr(self, '_' + statistic)(codes)
+                totals[statistic] = part if start == 0 else self._merge(totals[statistic], part)
+
+        tables = [self._tables(statistic, totals[statistic]) for statistic in statistics]
+        return pd.concat(tables, ignore_index=True)
+
+    def _table(self, statistic, configs, outcomes, counts):
+        """Private method to build the tidy rows of one statistic."""
+        return pd.DataFrame({'Config': [self.labels[c] for c in configs],
+                             'Statistic': statistic,
+                             'Outcome': outcomes,
+                             'Counts': np.asarray(counts, dtype=np.int64)})
+
+    def _tables(self, statistic, total):
+        """Private method to build the tidy rows of a statistic from its counts."""
+        n_configs = len(self.weights)
+        if statistic == 'jackpot':
+            return self._table(statistic, range(n_configs), [None] * n_configs, total)
+        if statistic == 'face_counts':
+            configs = np.repeat(np.arange(n_configs), len(self.faces))
+            return self._table(statistic, configs, np.tile(self.faces, n_configs).tolist(), total)
+
+        # Most frequent first within each configuration
+        rows, counts = total
+        order = np.lexsort((-counts, rows[:, 0]))
+        rows, counts = rows[order], counts[order]
+        outcomes = [tuple(self.faces[row].tolist()) for row in rows[:, 1:]]
+        return self._table(statistic, rows[:, 0], outcomes, counts)
+
+    def _merge(self, total, part):
+        """Private method adding one block's counts to the running counts."""
+        if isinstance(total, np.ndarray):
+            return total + part
+        n_configs, n_dice, n_faces = self.weights.shape
+        return kernels.merge_row_counts(np.concatenate([total[0], part[0]]),
+                                        np.concatenate([total[1], part[1]]),
+                                        [n_configs] + [n_faces] * n_dice)
+
+    def _jackpot(self, codes):
+        """Private method counting jackpots per configuration."""
+        return kernels.jackpot_mask(codes).sum(axis=0).astype(np.int64)
+
+    def _face_counts(self, codes):
+        """Private method counting each face over all dice per configuration."""
+        n_configs, n_faces = codes.shape[1], len(self.faces)
+        keys = np.arange(n_configs)[:, None] * n_faces + codes
+        return np.bincount(keys.ravel(), minlength=n_configs * n_faces)
+
+    def _combo_count(self, codes):
+        """Private method counting combinations per configuration."""
+        order, rank = kernels.face_order(self.faces)
+        return self._row_counts(kernels.sort_rows(codes, order, rank))
+
+    def _permutation_count(self, codes):
+        """Private method counting permutations per configuration."""
+        return self._row_counts(codes)
+
+    def _row_counts(self, codes):
+        """Private method to count distinct rows per configuration."""
+        rolls, n_configs, n_dice = codes.shape
+        # Prefix every row with its configuration so one pass counts them all
+        configs = np.broadcast_to(np.arange(n_configs)[None, :, None], (rolls, n_configs, 1))
+        rows = np.concatenate([configs, codes], axis=2).reshape(-1, n_dice + 1)
+        return kernels.count_rows(rows, [n_configs] + [len(self.faces)] * n_dice)
@@ -0,0 +1,75 @@
+import numpy as np
+
+
+class FenwickTree():
+
+    def __init__(self, weights):
+        """Initialize a Fenwick (binary indexed) tree over face weights.
+
+        Input:
+            weights (numpy.ndarray): Non-negative weight of each face.
+        """
+        self.weights = np.array(weights, dtype=float)
+        n = len(self.weights)
+
+        # Node i holds the sum of the lowbit(i) weights ending at face i
+        prefix = np.concatenate(([0.0], np.cumsum(self.weights)))
+        nodes = np.arange(1, n + 1)
+        self.tree = np.zeros(n + 1)
+        self.tree[1:] = prefix[nodes] - prefix[nodes - (nodes & -nodes)]
+
+        # Largest power of two not above n, where searches start
+        self._top = 1 << (n.bit_length() - 1) if n else 0
+
+    def __len__(self):
+        return len(self.weights)
+
+    def set(self, index, weight):
+        """Set the weight of one face in O(log n).
+
+        Input:
+            index (int): Position of the face.
+            weight (float): The new weight.
+        """
+        delta = weight - self.weights[index]
+        self.weights[index] = weight
+        n = len(self.weights)
+        i = index + 1
+        while i <= n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def total(self):
+        """Sum of all weights in O(log n)."""
+        total = 0.0
+        i = len(self.weights)
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def sample(self, targets):
+        """Find the face whose cumulative weight range holds each target.
+
+        All targets descend the tree together, one level per step, so a
+        batch costs O(log n) vectorized passes.
+
+        Input:
+            targets (numpy.ndarray): Points in [0, total).
+
+        Returns:
+            numpy.ndarray: Position of the face for each target.
+        """
+        n = len(self.weights)
+        remaining = np.array(targets, dtype=float)
+        position = np.zeros(len(remaining), dtype=np.int64)
+        step = self._top
+        while step:
+            candidate = position + step
+            node = self.tree[np.minimum(candidate, n)]
+            take = (candidate <= n) & (node <= remaining)
+            position[take] = candidate[take]
+            remaining[take] -= node[take]
+            step >>= 1
+        # Rounding can leave a target just past the last face
+        return np.minimum(position, n - 1)
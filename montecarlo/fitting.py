@@ -0,0 +1,314 @@
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from . import kernels
+
+# Observations coded and counted per chunk, bounding the memory of a fit
+_CHUNK_ROLLS = 1 << 22
+
+# Integer faces spanning at most this many values are coded by table lookup
+_TABLE_SPAN = 1 << 20
+
+
+def chunks(observations, chunk_rolls=_CHUNK_ROLLS):
+    """Yield observations as blocks of rows (rows x columns).
+
+    Input:
+        observations: A NumPy array (1-D for one column), memory map, list
+            or DataFrame, or an iterator of those read piece by piece from
+            a log larger than memory.
+        chunk_rolls (int): Rows per block of an array or frame.
+
+    Yields:
+        numpy.ndarray: Blocks of at most chunk_rolls rows.
+    """
+    if isinstance(observations, pd.DataFrame):
+        for start in range(0, len(observations), chunk_rolls):
+            yield observations.iloc[start:start + chunk_rolls].to_numpy()
+    elif isinstance(observations, (list, tuple)):
+        yield from chunks(np.asarray(observations), chunk_rolls)
+    elif isinstance(observations, np.ndarray):
+        rows = observations[:, None] if observations.ndim == 1 else observations
+        for start in range(0, len(rows), chunk_rolls):
+            yield np.asarray(rows[start:start + chunk_rolls])
+    else:
+        for chunk in observations:
+            if not isinstance(chunk, (np.ndarray, pd.DataFrame)):
+                chunk = np.asarray(chunk)
+            yield from chunks(chunk, chunk_rolls)
+
+
+class _Coder():
+
+    def __init__(self, faces):
+        """Private helper turning blocks of faces into codes into `faces`.
+
+        Integer faces in a narrow range are looked up in a table, which
+        runs at memory speed; other faces go through a hash index.
+        """
+        self.faces = faces
+        self._index = pd.Index(faces)
+        if not self._index.is_unique:
+            raise ValueError('All values in the array must be distinct')
+        self._table = None
+        if faces.dtype.kind in 'iu' and len(faces):
+            low, high = int(faces.min()), int(faces.max())
+            if high - low < _TABLE_SPAN:
+                self._low = low
+                self._table = np.full(high - low + 1, -1, dtype=np.int64)
+                self._table[faces.astype(np.int64) - low] = np.arange(len(faces))
+
+    def __call__(self, block):
+        if self._table is not None and block.dtype.kind in 'iu':
+            shifted = block.astype(np.int64) - self._low
+            if shifted.min(initial=0) < 0 or shifted.max(initial=0) >= len(self._table):
+                raise ValueError('Observations contain faces that are not on the die')
+            codes = self._table[shifted]
+        else:
+            codes = self._index.get_indexer(block.ravel()).reshape(block.shape)
+        if (codes < 0).any():
+            raise ValueError('Observations contain faces that are not on the die')
+        return codes
+
+
+def _coded_blocks(observations, faces, chunk_rolls):
+    """Private generator of (faces, codes) per block.
+
+    Without faces each block is coded into its own sorted faces, so the
+    faces are found in the same single pass.
+    """
+    coder = None if faces is None else _Coder(np.asarray(faces))
+    for block in chunks(observations, chunk_rolls):
+        if coder is not None:
+            yield coder.faces, coder(block)
+        else:
+            block_faces, codes = np.unique(block, return_inverse=True)
+            yield block_faces, codes.reshape(block.shape)
+
+
+def _align(parts, faces):
+    """Private function moving per-block counts onto a common set of faces.
+
+    Input:
+        parts (list): (faces, counts) of each block, faces on the last axis.
+        faces (numpy.ndarray): Faces to align on, or None for the sorted
+            union of the blocks' faces.
+
+    Returns:
+        tuple: The faces and the list of aligned counts.
+    """
+    if faces is None:
+        faces = np.unique(np.concatenate([block_faces for block_faces, _ in parts]))
+        aligned = []
+        for block_faces, counts in parts:
+            wide = np.zeros(counts.shape[:-1] + (len(faces),), dtype=np.int64)
+            wide[..., np.searchsorted(faces, block_faces)] = counts
+            aligned.append(wide)
+        return faces, aligned
+    return np.asarray(faces), [counts for _, counts in parts]
+
+
+def _count_columns(codes, n_faces):
+    """Private function counting each code in each column with one bincount."""
+    n_columns = codes.shape[1]
+    keys = codes.astype(np.int64) + np.arange(n_columns) * n_faces
+    counts = np.bincount(keys.ravel(), minlength=n_columns * n_faces)
+    return counts.reshape(n_columns, n_faces)
+
+
+def count_game(game, chunk_rolls=_CHUNK_ROLLS):
+    """Count each face rolled by each die of a played game.
+
+    The game's integer codes (or packed codes) are counted block by block,
+    without building the results frame.
+
+    Returns:
+        numpy.ndarray: The counts (dice x faces), in the order of `faces`.
+
+    Raises:
+        ValueError: If the game has no results.
+    """
+    codes = game.packed if game.packed is not None else game.codes
+    if codes is None:
+        raise ValueError('The game has no results to fit')
+    counts = np.zeros((len(game.dice), len(game.faces)), dtype=np.int64)
+    for start in range(0, len(codes), chunk_rolls):
+        counts += _count_columns(codes[start:start + chunk_rolls], len(game.faces))
+    return counts
+
+
+def count_faces(observations, faces=None, chunk_rolls=_CHUNK_ROLLS):
+    """Count each face in each column of the observations, in one pass.
+
+    Input:
+        observations: See `chunks`.
+        faces (numpy.ndarray): Faces of the dice (default = the faces seen,
+            sorted). Passing them is faster for large integer logs.
+        chunk_rolls (int): Rows coded and counted at once.
+
+    Returns:
+        tuple: The faces and the counts (columns x faces).
+
+    Raises:
+        ValueError: If there are no observations, a face is not in faces or
+            blocks have different numbers of columns.
+    """
+    parts = []
+    total = None
+    for block_faces, codes in _coded_blocks(observations, faces, chunk_rolls):
+        n_columns = codes.shape[1]
+        counts = _count_columns(codes, len(block_faces))
+        if parts and parts[0][1].shape[0] != n_columns:
+            raise ValueError('All blocks of observations must have the same columns')
+        if faces is None:
+            parts.append((block_faces, counts))
+        else:
+            total = counts if total is None else total + counts
+            parts = [(block_faces, total)]
+    if not parts:
+        raise ValueError('There are no observations to fit')
+    faces, aligned = _align(parts, faces)
+    return faces, np.sum(aligned, axis=0)
+
+
+def count_sessions(observations, faces=None, chunk_rolls=_CHUNK_ROLLS):
+    """Histogram the face counts of sessions, in one pass.
+
+    Each row is a session of rolls made with one die. Sessions are reduced
+    to their face counts, and equal count vectors are merged, so the
+    result is bounded by the distinct count vectors, not the sessions.
+
+    Input:
+        observations: Sessions (sessions x rolls), see `chunks`.
+        faces (numpy.ndarray): Faces of the dice (default = the faces seen).
+        chunk_rolls (int): Sessions coded and counted at once.
+
+    Returns:
+        tuple: The faces, the distinct count vectors (rows x faces) and how
+        many sessions had each.
+
+    Raises:
+        ValueError: If there are no observations or a face is not in faces.
+    """
+    histogram = None
+    for block_faces, codes in _coded_blocks(observations, faces, chunk_rolls):
+        n_faces, length = len(block_faces), codes.shape[1]
+        vectors = kernels.face_counts_per_row(codes, n_faces)
+        rows, counts = kernels.count_rows(vectors, [length + 1] * n_faces)
+        if histogram is not None:
+            # Fold the block into the running histogram
+            seen, seen_rows, seen_counts = histogram
+            block_faces, (seen_rows, rows) = _align([(seen, seen_rows), (block_faces, rows)],
+                                                    faces)
+            rows = np.concatenate([seen_rows, rows])
+            counts = np.concatenate([seen_counts, counts])
+            rows, counts = kernels.merge_row_counts(rows, counts,
+                                                    [int(rows.max()) + 1] * len(block_faces))
+        histogram = (np.asarray(block_faces), rows, counts)
+    if histogram is None:
+        raise ValueError('There are no observations to fit')
+    return histogram
+
+
+def dirichlet_summary(faces, counts, prior=1.0, level=0.95):
+    """Posterior of face probabilities under a symmetric Dirichlet prior.
+
+    The posterior is Dirichlet(counts + prior); each face's probability is
+    Beta distributed. Intervals use scipy's Beta quantiles, or a normal
+    approximation without scipy (close for large counts).
+
+    Input:
+        faces (numpy.ndarray): Faces, in the order of counts.
+        counts (numpy.ndarray): Observed (or expected) count of each face.
+        prior (float): Pseudo-count added to every face.
+        level (float): Probability covered by each interval.
+
+    Returns:
+        pd.DataFrame: Counts, Weight (posterior mean), Lower and Upper per
+        face.
+    """
+    alpha = np.asarray(counts, dtype=float) + prior
+    total = alpha.sum()
+    mean = alpha / total
+    tail = (1 - level) / 2
+    try:
+        from scipy.stats import beta
+        lower = beta.ppf(tail, alpha, total - alpha)
+        upper = beta.ppf(1 - tail, alpha, total - alpha)
+    except ImportError:
+        spread = NormalDist().inv_cdf(1 - tail) * np.sqrt(mean * (1 - mean) / (total + 1))
+        lower, upper = np.clip(mean - spread, 0, 1), np.clip(mean + spread, 0, 1)
+    return pd.DataFrame({'Counts': counts, 'Weight': mean, 'Lower': lower, 'Upper': upper},
+                        index=pd.Index(faces))
+
+
+def check_prior(prior, level):
+    """Validate a prior pseudo-count and an interval level.
+
+    Raises:
+        ValueError: If prior is negative or level is not in (0, 1).
+    """
+    if not prior >= 0:
+        raise ValueError('Prior must not be negative')
+    if not 0 < level < 1:
+        raise ValueError('Level must be between 0 and 1')
+
+
+def fit_mixture(rows, counts, components, prior=1.0, max_iter=500, tol=1e-10, seed=None):
+    """Fit a mixture of dice to histogrammed sessions by EM.
+
+    Each session was rolled with one of the dice, which one is unknown.
+    The E step weighs every distinct count vector by its number of
+    sessions, so an iteration costs the same for any number of sessions.
+
+    Input:
+        rows (numpy.ndarray): Distinct face-count vectors (rows x faces).
+        counts (numpy.ndarray): Sessions with each count vector.
+        components (int): Number of dice in the mixture.
+        prior (float): Pseudo-count added to every face of every die.
+        max_iter (int): Most EM iterations.
+        tol (float): Stop when the log-likelihood improves by less than
+            this share.
+        seed (int): Seed for the starting point.
+
+    Returns:
+        tuple: Mixing shares (components), expected face counts per die
+        (components x faces) and the log-likelihood, dice by share,
+        largest first.
+    """
+    x = rows.astype(float)
+    weights = counts.astype(float)
+    rng = np.random.default_rng(seed)
+    overall = weights @ x
+    overall = (overall + 1) / (overall + 1).sum()
+
+    # Start each die from a different session, drawn by frequency
+    picks = rng.choice(len(x), size=min(components, len(x)), replace=False,
+                       p=weights / weights.sum())
+    picks = np.resize(picks, components)
+    theta = x[picks] + overall * max(1.0, x.sum(axis=1).mean())
+    theta /= theta.sum(axis=1, keepdims=True)
+    shares = np.full(components, 1 / components)
+
+    previous = -np.inf
+    for _ in range(max_iter):
+        with np.errstate(divide='ignore'):
+            log_p = x @ np.log(theta).T + np.log(shares)
+        top = log_p.max(axis=1, keepdims=True)
+        p = np.exp(log_p - top)
+        total = p.sum(axis=1, keepdims=True)
+        responsibility = p / total
+        likelihood = float(weights @ (top[:, 0] + np.log(total[:, 0])))
+
+        weighted = responsibility * weights[:, None]
+        expected = weighted.T @ x
+        shares = weighted.sum(axis=0) / weights.sum()
+        # A zero probability would make the log-likelihood undefined
+        theta = np.maximum(expected + prior, np.finfo(float).tiny)
+        theta /= theta.sum(axis=1, keepdims=True)
+        if likelihood - previous <= tol * abs(likelihood):
+            break
+        previous = likelihood
+
+    order = np.argsort(-shares, kind='stable')
+    return shares[order], expected[order], likelihood
@@ -1,79 +1,838 @@
+from .backends import get_backend
 from .die import Die
+from .kernels import jackpot_mask
+from .markov import MarkovDie, run_chains
+from .packed import PackedCodes
 import pandas as pd
 import numpy as np
 
+
+def _code_dtype(n_faces):
+    """Smallest signed integer dtype that can code n_faces faces."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_faces <= np.iinfo(dtype).max + 1:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _column_data(results):
+    """Private function returning the array holding each column of a frame.
+
+    Numpy columns are views of their block; extension columns (e.g.
+    strings) are the array object itself.
+    """
+    data = []
+    for j in range(results.shape[1]):
+        column = results.iloc[:, j]
+        if isinstance(column.dtype, np.dtype):
+            data.append(column.to_numpy())
+        else:
+            data.append(column.array)
+    return data
+
+
+def _global_seed(seed):
+    """Private function drawing a missing seed from numpy.random.
+
+    Plays without a seed then follow numpy.random.seed, like Die.roll.
+    """
+    if seed is None:
+        return int(np.random.randint(2 ** 63, dtype=np.int64))
+    return seed
+
+
+# Rows drawn per block; checkpoints and resumes happen at block boundaries
+_BLOCK_ROLLS = 1 << 16
+
+
 class Game():
-    
+
     def __init__(self, dice):
         """Initialize a Game with a list of dice.
-        
+
         Input:
             dice (list): List of Die objects with identical faces.
-        
+
         Raises:
             TypeError: If any element in dice is not a Die object.
             ValueError: If dice don't have identical faces.
         """
         if not isinstance(dice, list) or len(dice) < 1:
             raise ValueError('Must be a list of dice')
-        
+
         # Check if all elements are Die class
         for die in dice:
             if not isinstance(die, Die):
                 raise TypeError('All elements must be a Die object')
-        
-        # Check identical faces
-        first = set(dice[0].get_data().index)
+
+        # Fingerprints rule out different faces in O(1) per die. Faces of
+        # different kinds (e.g. object and int) hash differently, so they
+        # are compared as sets instead
+        first = dice[0]
         for die in dice[1:]:
-            if set(die.get_data().index) != first:
+            if die.fingerprint == first.fingerprint:
+                continue
+            if (die._faces.dtype.kind == first._faces.dtype.kind
+                    or set(die._index) != set(first._index)):
                 raise ValueError('All dice must have identical faces')
-        
+
         self.dice = dice
-        self.results = None
-        
-    
-    def play(self, rolls):
+
+        # Faces of the first die fix the meaning of the integer codes
+        self.faces = dice[0]._faces
+        self._face_index = dice[0]._index
+
+        # Map each die's own face order onto the game's face order
+        self._face_maps = []
+        for die in dice:
+            if die._faces is self.faces or np.array_equal(die._faces, self.faces):
+                self._face_maps.append(None)
+            else:
+                face_map = self._face_index.get_indexer(die._faces)
+                # Equal fingerprints don't prove equal faces (e.g. str and bytes)
+                if (face_map < 0).any():
+                    raise ValueError('All dice must have identical faces')
+                self._face_maps.append(face_map)
+
+        self._codes = None
+        self._results = None
+        self._snapshot = None
+        self._shallow = None
+        self._shared = None
+        self._packed = None
+
+        # Face each Markov die last showed in the current play (-1 = none)
+        self._chain = np.full(len(dice), -1)
+        # Rolls drawn per block in the current play
+        self._block = _BLOCK_ROLLS
+
+
+    @property
+    def results(self):
+        """pandas.DataFrame: Faces of the most recent game (None before play).
+
+        Built from the coded results on first access. Edits made to this
+        frame are picked up by `codes` and the Analyzer. Packed results are
+        unpacked for the frame, which then replaces them.
+        """
+        if self._results is None and self._packed is not None:
+            self._set_codes(self._packed.unpack())
+        if self._results is None and self._codes is not None:
+            self._watch(pd.DataFrame(self.faces[self._codes], copy=False))
+        return self._results
+
+    @results.setter
+    def results(self, results):
+        self.unshare()
+        self._packed = None
+        self._results = None
+        self._codes = None
+        if results is not None:
+            self._codes = self._encode(results)
+            self._watch(results)
+
+    def _watch(self, results):
+        """Private method keeping a results frame that `codes` must follow.
+
+        Under copy-on-write (always on from pandas 3), a shallow copy makes
+        any edit to the frame copy the data of the edited columns first.
+        Those columns then no longer hold the arrays recorded here, so an
+        unedited frame is recognized in O(columns) and its codes are not
+        encoded again.
+        """
+        self._results = results
+        self._snapshot = _column_data(results)
+        self._shallow = results.copy(deep=False)
+
+    def _edited(self):
+        """Private method telling whether the results frame may have been edited."""
+        current = _column_data(self._results)
+        if len(current) != len(self._snapshot):
+            return True
+        for old, new in zip(self._snapshot, current):
+            if isinstance(old, np.ndarray):
+                if not (isinstance(new, np.ndarray) and np.may_share_memory(old, new)):
+                    return True
+            elif old is not new:
+                return True
+        return False
+
+    @property
+    def codes(self):
+        """numpy.ndarray: Results as integer codes into `faces` (rolls x dice).
+
+        None before the game is played. Packed results are unpacked on
+        every access.
+        """
+        if self._results is not None and self._edited():
+            # The results frame was handed out and edited
+            self._codes = self._encode(self._results)
+            self._watch(self._results)
+        if self._packed is not None:
+            return self._packed.unpack()
+        return self._codes
+
+    @property
+    def packed(self):
+        """PackedCodes: Bit-packed results, if the game keeps them packed."""
+        return self._packed
+
+    def _encode(self, results):
+        """Private method to turn a frame of faces into integer codes."""
+        values = results.to_numpy()
+        codes = self._face_index.get_indexer(values.ravel())
+        if (codes < 0).any():
+            raise ValueError('Results contain faces that are not on the dice')
+        return codes.astype(_code_dtype(len(self.faces))).reshape(values.shape)
+
+    def _set_codes(self, codes):
+        """Private method to store new coded results, plain or packed."""
+        self._codes = None
+        self.unshare()
+        if isinstance(codes, PackedCodes):
+            self._codes, self._packed = None, codes
+        else:
+            self._codes, self._packed = codes, None
+        self._results = self._snapshot = self._shallow = None
+
+    def pack(self):
+        """Keep the results bit-packed, ceil(log2(faces)) bits per code.
+
+        `codes` and `results` unpack them on access; the Analyzer counts
+        jackpots on the packed words and unpacks chunks for the rest.
+
+        Returns:
+            int: Bytes of the packed results.
+
+        Raises:
+            ValueError: If no results available.
+        """
+        codes = self.codes
+        if codes is None:
+            raise ValueError("Play the game first.")
+        if self._packed is None:
+            self._set_codes(PackedCodes.pack(codes, len(self.faces)))
+        return self._packed.nbytes
+
+    def unpack(self):
+        """Keep the results as a plain codes matrix again."""
+        if self._packed is not None:
+            self._set_codes(self._packed.unpack())
+
+    def share(self):
+        """Move the coded results into shared memory.
+
+        Processes can then attach to the same rows without copying or
+        pickling them, e.g. the Analyzer with `workers`. The block is freed
+        by `unshare` or when new results replace it. A results frame taken
+        before sharing is detached: later edits to it are not picked up.
+
+        Returns:
+            str: Name of the shared memory block.
+
+        Raises:
+            ValueError: If no results available.
+        """
+        codes = self.codes
+        if codes is None:
+            raise ValueError("Play the game first.")
+        if self._shared is None:
+            from .parallel import share_array
+            self._shared, self._codes = share_array(codes)
+            self._results = self._snapshot = self._shallow = None
+            self._packed = None
+        return self._shared.name
+
+    def unshare(self):
+        """Copy the results back to private memory and free the shared block."""
+        if self._shared is None:
+            return
+        from .parallel import release
+        block, self._shared = self._shared, None
+        if self._codes is not None:
+            self._codes = np.array(self._codes)
+        release(block)
+
+    def __del__(self):
+        if getattr(self, '_shared', None) is not None:
+            from .parallel import release
+            release(self._shared)
+
+    def _weights(self):
+        """Private method returning die weights in game face order (dice x faces)."""
+        weights = np.empty((len(self.dice), len(self.faces)))
+        for i, die in enumerate(self.dice):
+            die_weights = die._weights
+            if self._face_maps[i] is None:
+                weights[i] = die_weights
+            else:
+                weights[i, self._face_maps[i]] = die_weights
+        return weights
+
+    def _transitions(self):
+        """Private method returning the transition weights of the Markov dice.
+
+        Returns:
+            numpy.ndarray: Weights in game face order (dice x faces x faces),
+            all zero for plain dice, or None if no die is a Markov die.
+        """
+        if not any(isinstance(die, MarkovDie) for die in self.dice):
+            return None
+        n_faces = len(self.faces)
+        transitions = np.zeros((len(self.dice), n_faces, n_faces))
+        for i, die in enumerate(self.dice):
+            if not isinstance(die, MarkovDie):
+                continue
+            face_map = self._face_maps[i]
+            if face_map is None:
+                transitions[i] = die._transitions
+            else:
+                transitions[i][np.ix_(face_map, face_map)] = die._transitions
+        return transitions
+
+
+    def play(self, rolls, seed=None, checkpoint=None, checkpoint_every=60.0, analyzer=None,
+             threads=None, memory_limit=None, progress=None, cancel=None, packed=False):
         """Play the game by rolling the dice.
-        
+
+        Rolls are drawn in fixed blocks, so a play resumed from a checkpoint
+        gives the same results as an uninterrupted one.
+
+        Input:
+            rolls (int): Number of times to roll each die.
+            seed (int, numpy.random.SeedSequence, numpy.random.Generator):
+                Seed for the random generator (default = drawn from numpy.random).
+            checkpoint (str): File to checkpoint progress to (default = none).
+            checkpoint_every (float): Seconds between checkpoints. They are
+                spaced further apart if writing them gets slow.
+            analyzer (OnlineAnalyzer): Feed every block to this analyzer
+                instead of keeping the results.
+            threads (int): Draw each block in this many threads, each with
+                its own generator spawned from seed. Results depend on seed
+                and threads, not on thread scheduling (default = one thread).
+            memory_limit (int): Bytes the play may use. If the results don't
+                fit, the rolls are streamed into a new OnlineAnalyzer, which
+                is returned, and no results are kept.
+            progress (callable): Called with a Progress (rolls done,
+                throughput, ETA) after every block.
+            cancel (CancelToken): Checked after every block. A cancelled play
+                keeps the rolls drawn so far (and checkpoints them).
+            packed (bool): Keep the results bit-packed (see `pack`), packing
+                each block as it is drawn.
+
+        Returns:
+            OnlineAnalyzer: The analyzer, if one was given or streamed into.
+
+        Raises:
+            TypeError: If rolls is not an integer.
+            ValueError: If rolls or threads is less than 1, or the rolls
+                can't be streamed within memory_limit.
+        """
+        rng, codes, analyzer, checkpointer = self._start(rolls, seed, checkpoint, checkpoint_every,
+                                                         analyzer, threads, memory_limit, packed)
+        return self._run(rolls, 0, rng, codes, analyzer, checkpointer, progress, cancel)
+
+    async def play_async(self, rolls, **options):
+        """Play the game from asyncio without blocking the event loop.
+
+        The play runs on the shared AsyncRunner's thread pool, which limits
+        how many calls are in flight. Don't run two plays of the same game
+        at once.
+
         Input:
             rolls (int): Number of times to roll each die.
-        
+            **options: Any other parameter of `play`.
+
+        Returns:
+            OnlineAnalyzer: The analyzer, if one was given or streamed into.
+        """
+        from .aio import get_runner
+        return await get_runner().run(self.play, rolls, **options)
+
+    def play_iter(self, rolls, seed=None, checkpoint=None, checkpoint_every=60.0, analyzer=None,
+                  threads=None, packed=False):
+        """Play the game block by block, yielding progress after each block.
+
+        Stopping the iteration early (break, or closing it) keeps the rolls
+        drawn so far as the results. Parameters are those of `play`.
+
+        Yields:
+            Progress: Rolls done, throughput and ETA.
+        """
+        rng, codes, analyzer, checkpointer = self._start(rolls, seed, checkpoint, checkpoint_every,
+                                                         analyzer, threads, None, packed)
+        from .progress import _Reporter
+        reporter = _Reporter(rolls, 0, None, None)
+        blocks = self._blocks(rolls, 0, rng, codes, analyzer, checkpointer)
+        try:
+            for stop in blocks:
+                yield reporter.snapshot(stop)
+        finally:
+            blocks.close()
+
+    def _start(self, rolls, seed, checkpoint, checkpoint_every, analyzer, threads, memory_limit,
+               packed):
+        """Private method validating a play and setting up its state."""
+        if not isinstance(rolls, int):
+            raise TypeError('Number of rolls must be an integer.')
+        if rolls < 1:
+            raise ValueError('Number of rolls must be a positive integer.')
+
+        if threads is None:
+            rng = np.random.default_rng(_global_seed(seed))
+        elif any(isinstance(die, MarkovDie) for die in self.dice):
+            raise ValueError('Markov dice roll in sequence and can\'t be split across threads.')
+        else:
+            from .parallel import spawn_generators
+            rng = spawn_generators(_global_seed(seed), threads)
+        self._chain = np.full(len(self.dice), -1)
+        self._block = _BLOCK_ROLLS
+        if memory_limit is not None:
+            analyzer = self._fit_memory(rolls, memory_limit, analyzer, packed)
+        checkpointer = None
+        if checkpoint is not None:
+            from .checkpoint import Checkpoint
+            checkpointer = Checkpoint(checkpoint, checkpoint_every)
+        codes = None
+        if analyzer is None and packed:
+            codes = PackedCodes(rolls, len(self.dice), len(self.faces))
+        elif analyzer is None:
+            codes = np.empty((rolls, len(self.dice)), dtype=_code_dtype(len(self.faces)))
+        return rng, codes, analyzer, checkpointer
+
+    def _fit_memory(self, rolls, memory_limit, analyzer, packed=False):
+        """Private method choosing how to play within a memory limit.
+
+        The results are kept if they fit with a block of rolls, else the
+        rolls are streamed into an analyzer. Blocks are made smaller than
+        usual when a full one doesn't fit next to the results or counters.
+
+        Returns:
+            OnlineAnalyzer: The analyzer to stream into, or None to keep
+            the results.
+        """
+        from .planner import fit_rows, kernel_bytes, output_bytes, results_bytes, sample_bytes
+        n_dice, n_faces = len(self.dice), len(self.faces)
+        itemsize = _code_dtype(n_faces).itemsize
+        most = min(rolls, _BLOCK_ROLLS)
+        if analyzer is None:
+            results = results_bytes(rolls, n_dice, n_faces, packed)
+            block = fit_rows(lambda block: results + sample_bytes(block, n_dice, itemsize),
+                             memory_limit, most)
+            if block > 0:
+                self._block = block
+                return None
+        # An analyzer holds its counters and updates them one block at a time
+        counters = (output_bytes('combo_count', rolls, n_dice, n_faces)
+                    + output_bytes('permutation_count', rolls, n_dice, n_faces))
+
+        def stream(block):
+            return (counters + sample_bytes(block, n_dice, itemsize)
+                    + kernel_bytes('combo_count', block, n_dice, n_faces))
+
+        block = fit_rows(stream, memory_limit, most)
+        if block == 0:
+            raise ValueError(f'Streaming the rolls needs about {stream(1)} bytes '
+                             'even one roll at a time, over the memory limit')
+        self._block = block
+        if analyzer is None:
+            from .online import OnlineAnalyzer
+            analyzer = OnlineAnalyzer(self.faces, n_dice)
+        return analyzer
+
+    def plan(self, rolls, analyses=('jackpot',)):
+        """Estimate memory and runtime of a play and analyses, without running them.
+
+        Input:
+            rolls (int): Number of rolls to play.
+            analyses (list): Analyzer methods to plan: 'jackpot',
+                'face_counts_per_roll', 'combo_count', 'permutation_count'.
+
+        Returns:
+            pd.DataFrame: One row per step with PeakBytes, OutputBytes and
+            OutputRows (upper bounds, including the number of distinct
+            combinations or permutations) and Seconds, scaled from timing
+            each step on a small sample.
+
         Raises:
             TypeError: If rolls is not an integer.
-            ValueError: If rolls is less than 1.
+            ValueError: If rolls is less than 1 or an analysis is unknown.
         """
         if not isinstance(rolls, int):
             raise TypeError('Number of rolls must be an integer.')
         if rolls < 1:
             raise ValueError('Number of rolls must be a positive integer.')
-        
-        # Play the game and save as results DataFrame
-        results = {}
+        from .planner import plan
+        return plan(self, rolls, analyses)
+
+    def resume(self, checkpoint, progress=None, cancel=None):
+        """Continue a play from its last checkpoint.
+
+        The game must have the same dice, weights and transitions as the
+        one that wrote the checkpoint. The output is identical to an uninterrupted play.
+
+        Input:
+            checkpoint (str): Checkpoint file given to `play`.
+            progress (callable): Called with a Progress after every block.
+            cancel (CancelToken): Stops the play after a block when set.
+
+        Returns:
+            OnlineAnalyzer: The analyzer, if the play fed one.
+
+        Raises:
+            ValueError: If the checkpoint belongs to a different game.
+        """
+        from .checkpoint import Checkpoint, read_checkpoint, restore_rng
+        state = read_checkpoint(checkpoint)
+        transitions = self._transitions()
+        saved = state.get('transitions')
+        if (state['faces'] != self.faces.tolist()
+                or not np.array_equal(state['weights'], self._weights())
+                or (saved is None) != (transitions is None)
+                or (saved is not None and not np.array_equal(saved, transitions))):
+            raise ValueError('Checkpoint was written by a game with different dice')
+
+        rolls, done = state['rolls'], state['done']
+        codes = analyzer = None
+        if state['mode'] in ('results', 'packed'):
+            dtype = _code_dtype(len(self.faces))
+            if state['mode'] == 'packed':
+                codes = PackedCodes(rolls, len(self.dice), len(self.faces))
+            else:
+                codes = np.empty((rolls, len(self.dice)), dtype=dtype)
+            codes[:done] = np.fromfile(checkpoint + '.codes', dtype=dtype,
+                                       count=done * len(self.dice)).reshape(done, -1)
+        else:
+            from .online import OnlineAnalyzer
+            analyzer = OnlineAnalyzer.load(state['analyzer'])
+        checkpointer = Checkpoint(checkpoint, state['every'], written=done,
+                                  analyzer_file=state['analyzer'])
+        self._chain = np.array(state.get('chain', [-1] * len(self.dice)))
+        self._block = state.get('block', _BLOCK_ROLLS)
+        return self._run(rolls, done, restore_rng(state['rng']), codes, analyzer, checkpointer,
+                         progress, cancel)
+
+    def _run(self, rolls, done, rng, codes, analyzer, checkpointer, progress=None, cancel=None):
+        """Private method drawing the rolls from `done` onwards in blocks.
+
+        Input:
+            rolls (int): Total number of rolls.
+            done (int): Rolls already drawn (a multiple of the block size).
+            rng (numpy.random.Generator, list): Generator positioned at roll
+                done, or one generator per thread.
+            codes (numpy.ndarray): Results to fill, or None with an analyzer.
+            analyzer (OnlineAnalyzer): Analyzer to feed instead.
+            checkpointer (Checkpoint): Writes checkpoints, if any.
+            progress (callable): Called with a Progress after every block.
+            cancel (CancelToken): Stops the play after a block when set.
+        """
+        from .progress import _Reporter
+        reporter = _Reporter(rolls, done, progress, cancel)
+        blocks = self._blocks(rolls, done, rng, codes, analyzer, checkpointer)
+        try:
+            for stop in blocks:
+                if reporter.report(stop) and stop < rolls:
+                    if checkpointer is not None:
+                        checkpointer.write(self, rng, rolls, stop, codes, analyzer)
+                    break
+        finally:
+            blocks.close()
+        return analyzer
+
+    def _blocks(self, rolls, done, rng, codes, analyzer, checkpointer):
+        """Private generator drawing one block per step, yielding rolls done.
+
+        However it ends, the rolls drawn so far become the results.
+        """
+        pool = None
+        if isinstance(rng, list):
+            from concurrent.futures import ThreadPoolExecutor
+            pool = ThreadPoolExecutor(max_workers=len(rng))
+        stop = done
+        try:
+            for start in range(done, rolls, self._block):
+                stop = min(start + self._block, rolls)
+                if pool is None:
+                    block = self._sample(stop - start, rng, self._chain)
+                    if analyzer is None:
+                        codes[start:stop] = block
+                else:
+                    # Threads write straight into their slice of plain results
+                    direct = analyzer is None and not isinstance(codes, PackedCodes)
+                    block = codes[start:stop] if direct else np.empty(
+                        (stop - start, len(self.dice)), dtype=_code_dtype(len(self.faces)))
+                    self._sample_threads(block, rng, pool)
+                    if analyzer is None and not direct:
+                        codes[start:stop] = block
+                if analyzer is not None:
+                    analyzer.update(block)
+                if checkpointer is not None and (stop == rolls or checkpointer.due()):
+                    checkpointer.write(self, rng, rolls, stop, codes, analyzer)
+                yield stop
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if codes is not None and stop < rolls:
+                codes = codes.truncate(stop) if isinstance(codes, PackedCodes) else codes[:stop]
+            self._set_codes(codes)
+
+    def _sample_threads(self, out, rngs, pool):
+        """Private method filling a block with one slice per thread generator."""
+        from .parallel import partitions
+
+        def fill(lo, hi, rng):
+            out[lo:hi] = self._sample(hi - lo, rng)
+
+        futures = [pool.submit(fill, lo, hi, rng)
+                   for (lo, hi), rng in zip(partitions(len(out), len(rngs)), rngs)]
+        for future in futures:
+            future.result()
+
+    def _sample(self, rolls, rng, chain=None):
+        """Private method drawing coded rolls of every die.
+
+        The cumulative tables of all weighted dice are stacked and searched
+        in one call, and all Markov dice are run as chains at once. Fair
+        dice take their codes from random bits and dynamic dice from their
+        trees. Each die draws from the generator in turn, so a seed gives
+        the same rolls as rolling each die in turn.
+
+        Input:
+            chain (numpy.ndarray): Code each die last showed (-1 before its
+                first roll), from which Markov dice continue. Updated in
+                place (default = every chain starts afresh).
+        """
+        codes = np.empty((rolls, len(self.dice)), dtype=_code_dtype(len(self.faces)))
+        markov = [i for i, die in enumerate(self.dice) if isinstance(die, MarkovDie)]
+        tables = [i for i, die in enumerate(self.dice)
+                  if not (isinstance(die, MarkovDie) or die.dynamic or die._uniform())]
+        rows = {i: row for row, i in enumerate(tables + markov)}
+        draws = np.empty((len(rows), rolls))
         for i, die in enumerate(self.dice):
-            results[i] = die.roll(rolls)
+            if i in rows:
+                rng.random(out=draws[rows[i]])
+            else:
+                codes[:, i] = self._map_codes(i, die._roll_codes(rolls, rng))
+        if tables:
+            cdf = np.stack([self.dice[i]._cdf() for i in tables])
+            die_codes = get_backend().search_stacked(cdf, draws[:len(tables)])
+            for row, i in enumerate(tables):
+                die_codes[row] = self._map_codes(i, die_codes[row])
+            codes[:, tables] = die_codes.T
+        if markov and rolls:
+            if chain is None:
+                chain = np.full(len(self.dice), -1)
+            die_codes = run_chains([self.dice[i] for i in markov], chain[markov],
+                                   draws[len(tables):])
+            chain[markov] = die_codes[:, -1]
+            for row, i in enumerate(markov):
+                codes[:, i] = self._map_codes(i, die_codes[row])
+        return codes
+
+    def _map_codes(self, i, die_codes):
+        """Private method turning codes into die i's faces into game codes."""
+        if self._face_maps[i] is None:
+            return die_codes
+        return self._face_maps[i][die_codes]
+
+    def play_until(self, predicate, count, max_rolls, keep=True, seed=None):
+        """Roll until `count` rolls satisfy a predicate.
 
-        self.results = pd.DataFrame(results)
-        
-    def show_results(self, form='wide'):
+        Rolls are drawn in batches sized from the hit rate seen so far, and
+        the play stops at the roll giving the last needed hit.
+
+        Input:
+            predicate (Event, callable, str): An event from
+                `montecarlo.events`, a function taking a block of coded rolls
+                (rolls x dice) and returning a boolean mask of the qualifying
+                rolls, or 'jackpot'.
+            count (int): Number of qualifying rolls to collect.
+            max_rolls (int): Stop after this many rolls even if fewer hits.
+            keep (bool): Keep the qualifying rolls as the game's results.
+                If False only the hits are counted.
+            seed (int, numpy.random.SeedSequence, numpy.random.Generator):
+                Seed for the random generator (default = drawn from numpy.random).
+
+        Returns:
+            pd.Series: Number of hits, rolls used and the mean, std, min and
+            max of the waiting times (rolls from one hit to the next,
+            counting the first from the start).
+
+        Raises:
+            TypeError: If count or max_rolls is not an integer.
+            ValueError: If they are not positive, the predicate is unknown or
+                it doesn't return one boolean per roll.
+        """
+        if not isinstance(count, int) or not isinstance(max_rolls, int):
+            raise TypeError('Count and max_rolls must be integers.')
+        if count < 1 or max_rolls < 1:
+            raise ValueError('Count and max_rolls must be positive integers.')
+        from .events import Event
+        if isinstance(predicate, Event):
+            event = predicate
+            predicate = lambda block: event.mask(block, self.faces)
+        elif predicate == 'jackpot':
+            predicate = jackpot_mask
+        elif not callable(predicate):
+            raise ValueError("Predicate must be callable or 'jackpot'")
+
+        rng = np.random.default_rng(_global_seed(seed))
+        chain = np.full(len(self.dice), -1)
+        hits, kept = [], []
+        found = drawn = 0
+        batch = min(max(count, 1024), _BLOCK_ROLLS)
+        while found < count and drawn < max_rolls:
+            n = min(batch, max_rolls - drawn)
+            block = self._sample(n, rng, chain)
+            mask = np.asarray(predicate(block))
+            if mask.shape != (n,) or mask.dtype != bool:
+                raise ValueError('Predicate must return one boolean per roll')
+            rows = np.flatnonzero(mask)[:count - found]
+            hits.append(rows + drawn)
+            if keep:
+                kept.append(block[rows])
+            found += len(rows)
+            drawn += n if found < count else int(rows[-1]) + 1
+
+            # Size the next batch to the expected rolls still needed
+            if found:
+                batch = int(1.1 * (count - found) * drawn / found) + 1
+            else:
+                batch *= 2
+            batch = min(max(batch, 1024), 16 * _BLOCK_ROLLS)
+
+        if keep:
+            self._set_codes(np.concatenate(kept))
+        waits = np.diff(np.concatenate([[-1]] + hits))
+        return pd.Series({'hits': found, 'rolls': drawn,
+                          'mean_wait': waits.mean() if found else np.nan,
+                          'std_wait': waits.std() if found else np.nan,
+                          'min_wait': waits.min() if found else np.nan,
+                          'max_wait': waits.max() if found else np.nan})
+
+    def show_results(self, form='wide', index=True, output='pandas'):
         """Show the most recent game results.
-        
+
+        Both formats are read-only. Numeric faces are numeric columns;
+        other faces are categorical columns whose codes share memory with
+        `codes`, so nothing is copied.
+
         Input:
             form (str): 'wide' or 'narrow' format.
-            
+            index (bool): Index narrow results by ('Rolls', 'Die'). If False,
+                they are plain columns and no MultiIndex is built.
+            output (str): 'pandas', 'numpy' (codes and faces) or 'arrow'
+                (a table of dictionary columns, needs pyarrow).
+
         Returns:
             pandas.DataFrame: Results in requested format.
-            
+
         Raises:
-            ValueError: If no results available or invalid format.
+            ValueError: If no results available or invalid format or output.
         """
-        if self.results is None:
+        from .output import check_output, results_table
+        check_output(output)
+        codes = self.codes
+        if codes is None:
             raise ValueError("Play the game first.")
-        
+
+        # Read-only view so callers can't change the results through it
+        view = codes.view()
+        view.flags.writeable = False
+
+        if output != 'pandas' and form in ('wide', 'narrow'):
+            return results_table(view, self.faces, form, output)
         if form == 'wide':
-            return self.results.copy()
+            if self.faces.dtype.kind in 'biuf':
+                return pd.DataFrame(self._face_values(view), copy=False)
+            columns = {i: pd.Categorical.from_codes(view[:, i], categories=self.faces)
+                       for i in range(view.shape[1])}
+            return pd.DataFrame(columns, copy=False)
         elif form == 'narrow':
-            narrow_df = self.results.stack().reset_index()
-            narrow_df.columns = ['Rolls', 'Die', 'Face']
-            return narrow_df.set_index(['Rolls', 'Die'])
+            n_rolls, n_dice = view.shape
+            rolls = np.repeat(np.arange(n_rolls), n_dice)
+            die = np.tile(np.arange(n_dice), n_rolls)
+            if self.faces.dtype.kind in 'biuf':
+                faces = self._face_values(view.ravel())
+            else:
+                faces = pd.Categorical.from_codes(view.ravel(), categories=self.faces)
+            if not index:
+                return pd.DataFrame({'Rolls': rolls, 'Die': die, 'Face': faces}, copy=False)
+            multi_index = pd.MultiIndex(levels=[pd.RangeIndex(n_rolls), pd.RangeIndex(n_dice)],
+                                        codes=[rolls, die], names=['Rolls', 'Die'])
+            return pd.DataFrame({'Face': faces}, index=multi_index, copy=False)
         else:
-            raise ValueError('Format must be either \'wide\' or \'narrow\'')
\ No newline at end of file
+            raise ValueError('Format must be either \'wide\' or \'narrow\'')
+
+    def _face_values(self, codes):
+        """Private method looking up numeric faces as a read-only array."""
+        values = self.faces[codes]
+        values.flags.writeable = False
+        return values
+
+    def save(self, path, format=None):
+        """Save the dice and the coded results of the most recent game.
+
+        Input:
+            path (str): File to write.
+            format (str): 'npz', 'parquet' or 'arrow'. Inferred from the
+                file suffix when omitted, falling back to 'npz'.
+
+        Raises:
+            ValueError: If no results available or invalid format.
+            ImportError: If 'parquet' or 'arrow' is requested without pyarrow.
+        """
+        from .storage import save_game
+        save_game(self, path, format)
+
+    @classmethod
+    def fit(cls, results, faces=None, prior=1.0, level=0.95):
+        """Estimate the weights of each die from observed results.
+
+        Each column is one die's rolls, counted chunk by chunk in a single
+        pass (see Die.fit). A played Game is counted on its integer codes.
+
+        Input:
+            results: A played Game, or observed faces (rolls x dice) as a
+                DataFrame, NumPy array, memory map or an iterator of
+                arrays read piece by piece.
+            faces (numpy.ndarray): Faces of the dice (default = the faces
+                observed, or the game's faces).
+            prior (float), level (float): See Die.fit.
+
+        Returns:
+            Game: A game of fitted dice, each with its `estimate`.
+
+        Raises:
+            ValueError: If there are no results, one is not a face, or
+                prior or level is invalid.
+        """
+        from .fitting import check_prior, count_faces, count_game, dirichlet_summary
+        check_prior(prior, level)
+        if isinstance(results, Game):
+            faces, counts = results.faces, count_game(results)
+        else:
+            faces, counts = count_faces(results, faces)
+        return cls([Die._fitted(faces, dirichlet_summary(faces, die_counts, prior, level))
+                    for die_counts in counts])
+
+    @classmethod
+    def load(cls, path, dice=None):
+        """Load a game saved with `save`, including its results.
+
+        Only the integer codes are read; the results frame is built on
+        first access to `results`.
+
+        Input:
+            path (str): File written by `save` (format is detected).
+            dice (list): Positions of the dice to load (default = all).
+
+        Returns:
+            Game: A game with the saved dice, weights and results.
+
+        Raises:
+            ValueError: If the file is not a saved game.
+            ImportError: If the file needs pyarrow and it is not installed.
+        """
+        from .storage import load_game
+        return load_game(path, dice)
@@ -0,0 +1,310 @@
+import numpy as np
+
+# Mixed-radix keys must stay below this bound to fit in an int64
+_KEY_LIMIT = 2 ** 62
+
+# search_stacked compares draws with each entry of tables up to this size,
+# and searches at most this many larger tables at once (uint64 keys)
+_COMPARE_FACES = 64
+_MAX_TABLES = 2 ** 10
+
+# Markov chains of up to this many faces are sampled through per-step maps
+# composed pairwise; chains this short are stepped one draw at a time
+_MAP_FACES = 16
+_CHAIN_STEPS = 256
+
+
+def cumulative_weights(weights):
+    """Stack weight vectors into normalized cumulative tables.
+
+    Input:
+        weights (numpy.ndarray): One weight vector per row (rows x faces).
+
+    Returns:
+        numpy.ndarray: Cumulative probabilities per row, each ending at 1.
+
+    Raises:
+        ValueError: If a weight is negative or not finite, or a row has no
+            positive weight.
+    """
+    weights = np.asarray(weights, dtype=float)
+    if not np.isfinite(weights).all():
+        raise ValueError('Weights must be finite numbers')
+    if (weights < 0).any():
+        raise ValueError('Weights must not be negative')
+    with np.errstate(over='ignore'):
+        totals = weights.sum(axis=1, keepdims=True)
+    if (totals <= 0).any() or not np.isfinite(totals).all():
+        raise ValueError('Every die needs a positive, finite total weight')
+    cdf = np.cumsum(weights / totals, axis=1)
+    # Pin each table to exactly 1 from its last positive face onwards
+    last = weights.shape[1] - 1 - np.argmax(weights[:, ::-1] > 0, axis=1)
+    cdf[np.arange(weights.shape[1]) >= last[:, None]] = 1.0
+    return cdf
+
+
+def search_stacked(cdf, u):
+    """Map uniform draws through a stack of cumulative tables at once.
+
+    Gives the same codes as searchsorted(side='right') on each table. Small
+    tables count the entries at most each draw, one comparison per face for
+    all tables together. Large ones use one search of integer keys, the
+    table number followed by the value in units of 2**-53, so no rounding
+    is involved.
+
+    Input:
+        cdf (numpy.ndarray): Cumulative tables ending at 1 (tables x faces).
+        u (numpy.ndarray): Uniform draws of each table (tables x draws), as
+            made by numpy's generators (multiples of 2**-53 in [0, 1)).
+
+    Returns:
+        numpy.ndarray: Face codes with the shape of u.
+    """
+    n_tables, n_faces = cdf.shape
+    if n_faces <= _COMPARE_FACES:
+        codes = np.zeros(u.shape, dtype=np.int8)
+        above = np.empty(u.shape, dtype=bool)
+        # The last entry is 1, above every draw
+        for j in range(n_faces - 1):
+            np.greater_equal(u, cdf[:, j:j + 1], out=above)
+            codes += above
+        return codes
+    if n_tables > _MAX_TABLES:
+        return np.concatenate([search_stacked(cdf[i:i + _MAX_TABLES], u[i:i + _MAX_TABLES])
+                               for i in range(0, n_tables, _MAX_TABLES)])
+    offsets = np.arange(n_tables, dtype=np.uint64)[:, None] << np.uint64(54)
+    # An entry is at most a draw exactly when its ceiling is, in 2**-53 units
+    table = (np.ceil(cdf * 2.0 ** 53).astype(np.uint64) + offsets).ravel()
+    keys = (u * 2.0 ** 53).astype(np.uint64)
+    keys += offsets
+    codes = np.searchsorted(table, keys, side='right')
+    codes -= np.arange(0, n_tables * n_faces, n_faces)[:, None]
+    return codes
+
+
+def uniform_codes(n_faces, size, rng):
+    """Draw codes of a fair die straight from random bits.
+
+    Power-of-two dice slice random bytes into log2(n_faces)-bit codes, so
+    one 64-bit word gives 64 coin flips. Other sizes use bounded random
+    integers (Lemire's method in numpy's generators).
+
+    Input:
+        n_faces (int): Number of faces.
+        size (int): Number of codes.
+        rng (numpy.random.Generator, numpy.random.RandomState): Source of
+            randomness, or the numpy.random module for its global state.
+
+    Returns:
+        numpy.ndarray: Codes in [0, n_faces), of the smallest unsigned dtype.
+    """
+    bits = n_faces.bit_length() - 1
+    dtype = np.min_scalar_type(n_faces - 1)
+    if n_faces != 1 << bits or bits > 16:
+        draw = rng.integers if hasattr(rng, 'integers') else rng.randint
+        return draw(0, n_faces, size, dtype=dtype)
+    if bits == 0:
+        return np.zeros(size, dtype=np.uint8)
+    if bits in (8, 16):
+        return np.frombuffer(rng.bytes(size * dtype.itemsize), dtype=dtype).copy()
+    if bits in (1, 2, 4):
+        raw, raw_bits = np.frombuffer(rng.bytes(-(-size * bits // 8)), dtype=np.uint8), 8
+    else:
+        raw, raw_bits = np.frombuffer(rng.bytes(8 * -(-size // (64 // bits))), dtype=np.uint64), 64
+    if bits == 1:
+        return np.unpackbits(raw)[:size]
+    per_word = raw_bits // bits
+    codes = np.empty((len(raw), per_word), dtype=dtype)
+    mask = raw.dtype.type(n_faces - 1)
+    for k in range(per_word):
+        codes[:, k] = (raw >> raw.dtype.type(k * bits)) & mask
+    return codes.ravel()[:size]
+
+
+def markov_chains(cdf, start, u):
+    """Run Markov chains, all chains stepped together.
+
+    Each draw maps every state to its next one, so the draws of a block are
+    turned into maps at once and composed in pairs (recursive doubling); a
+    short loop over the composed maps and gathers back down give the same
+    states as stepping the chains one draw at a time. Larger chains are
+    stepped one draw at a time.
+
+    Input:
+        cdf (numpy.ndarray): Cumulative transition tables ending at 1
+            (chains x faces x faces), row s for the step from state s.
+        start (numpy.ndarray): State of each chain before the first draw.
+        u (numpy.ndarray): Uniform draws of each chain (chains x steps).
+
+    Returns:
+        numpy.ndarray: State after each draw (chains x steps).
+    """
+    n_chains, n_faces, _ = cdf.shape
+    if n_faces > _MAP_FACES:
+        codes = np.empty(u.shape, dtype=np.int64)
+        rows, state = np.arange(n_chains), np.asarray(start)
+        for t in range(u.shape[1]):
+            state = (cdf[rows, state, :-1] <= u[:, t:t + 1]).sum(axis=1)
+            codes[:, t] = state
+        return codes
+    maps = np.zeros(u.shape + (n_faces,), dtype=np.int8)
+    for j in range(n_faces - 1):
+        maps += u[:, :, None] >= cdf[:, None, :, j]
+    return _run_maps(maps, np.asarray(start, dtype=np.int8))
+
+
+def _run_maps(maps, start):
+    """Private function applying per-step state maps (chains x steps x faces) in turn."""
+    n_chains, n_steps, n_faces = maps.shape
+    if n_steps <= _CHAIN_STEPS:
+        codes = np.empty((n_chains, n_steps), dtype=maps.dtype)
+        rows, state = np.arange(n_chains), start
+        for t in range(n_steps):
+            state = maps[rows, t, state]
+            codes[:, t] = state
+        return codes
+    even, odd = maps[:, 0::2], maps[:, 1::2]
+    if n_steps % 2:
+        identity = np.broadcast_to(np.arange(n_faces, dtype=maps.dtype), (n_chains, 1, n_faces))
+        odd = np.concatenate([odd, identity], axis=1)
+    # State after each pair of steps, then after the first step of each pair
+    after_pairs = _run_maps(np.take_along_axis(odd, even.astype(np.intp), axis=2), start)
+    before = np.concatenate([start[:, None], after_pairs[:, :-1]], axis=1)
+    codes = np.empty((n_chains, n_steps), dtype=maps.dtype)
+    codes[:, 0::2] = np.take_along_axis(even, before[:, :, None].astype(np.intp), axis=2)[..., 0]
+    codes[:, 1::2] = after_pairs[:, :n_steps // 2]
+    return codes
+
+
+def jackpot_mask(codes):
+    """Mark rows where every die shows the same face."""
+    return (codes == codes[..., :1]).all(axis=-1)
+
+
+def face_counts_per_row(codes, n_faces):
+    """Count how often each face appears in each row (rows x faces)."""
+    n_rows = len(codes)
+    keys = np.arange(n_rows)[:, None] * n_faces + codes
+    return np.bincount(keys.ravel(), minlength=n_rows * n_faces).reshape(n_rows, n_faces)
+
+
+def face_order(faces):
+    """Sort order of the faces and the rank of each code in it.
+
+    Faces that can't be compared keep their own order.
+    """
+    try:
+        order = np.argsort(faces, kind='stable')
+    except TypeError:
+        order = np.arange(len(faces))
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return order, rank
+
+
+def sort_rows(codes, order, rank):
+    """Sort the codes in each row by face value (combinations)."""
+    return order[np.sort(rank[codes], axis=-1)]
+
+
+def encode_rows(codes, radix):
+    """Encode each row of codes as one mixed-radix int64 key.
+
+    Input:
+        codes (numpy.ndarray): Integer codes (rows x columns).
+        radix (list): Number of possible values of each column.
+
+    Returns:
+        numpy.ndarray: One key per row, or None if keys would overflow.
+    """
+    if np.prod(np.asarray(radix, dtype=float)) >= _KEY_LIMIT:
+        return None
+    keys = np.zeros(len(codes), dtype=np.int64)
+    for j, base in enumerate(radix):
+        keys *= base
+        keys += codes[:, j]
+    return keys
+
+
+def decode_keys(keys, radix):
+    """Invert `encode_rows`."""
+    rows = np.empty((len(keys), len(radix)), dtype=np.int64)
+    for j in range(len(radix) - 1, -1, -1):
+        keys, rows[:, j] = np.divmod(keys, radix[j])
+    return rows
+
+
+def count_rows(codes, radix):
+    """Count the distinct rows of a codes matrix.
+
+    Input:
+        codes (numpy.ndarray): Integer codes (rows x columns).
+        radix (list): Number of possible values of each column.
+
+    Returns:
+        tuple: Distinct rows (sorted) and how often each occurs.
+    """
+    keys = encode_rows(codes, radix)
+    if keys is None:
+        return np.unique(codes, axis=0, return_counts=True)
+    size = int(np.prod(radix))
+    if size <= max(4 * len(keys), 2 ** 16):
+        # Dense key space, count by direct addressing
+        counts = np.bincount(keys, minlength=size)
+        keys = np.flatnonzero(counts)
+        counts = counts[keys]
+    else:
+        keys, counts = np.unique(keys, return_counts=True)
+    return decode_keys(keys, radix), counts
+
+
+def merge_key_counts(keys, counts, into=None):
+    """Add up the counts of equal keys.
+
+    Input:
+        keys (numpy.ndarray): Row keys (see `encode_rows`), repeats allowed.
+        counts (numpy.ndarray): Count of each key.
+        into (tuple): Distinct sorted keys and counts to add to; only the
+            new keys are sorted (default = none).
+
+    Returns:
+        tuple: Distinct keys (sorted) and their summed counts.
+    """
+    order = np.argsort(keys)
+    keys, counts = keys[order], counts[order].astype(np.int64)
+    if len(keys):
+        starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+        keys, counts = keys[starts], np.add.reduceat(counts, starts)
+    if into is None:
+        return keys, counts
+
+    # Add the counts of known keys and insert the new ones in order
+    known, totals = into
+    at = np.searchsorted(known, keys)
+    found = at < len(known)
+    found[found] = known[at[found]] == keys[found]
+    totals = totals.astype(np.int64, copy=True)
+    totals[at[found]] += counts[found]
+    new = ~found
+    return np.insert(known, at[new], keys[new]), np.insert(totals, at[new], counts[new])
+
+
+def merge_row_counts(rows, counts, radix):
+    """Add up the counts of equal rows.
+
+    Input:
+        rows (numpy.ndarray): Integer codes (rows x columns), repeats allowed.
+        counts (numpy.ndarray): Count of each row.
+        radix (list): Number of possible values of each column.
+
+    Returns:
+        tuple: Distinct rows (sorted) and their summed counts.
+    """
+    keys = encode_rows(rows, radix)
+    if keys is None:
+        rows, inverse = np.unique(rows, axis=0, return_inverse=True)
+    else:
+        keys, inverse = np.unique(keys, return_inverse=True)
+        rows = decode_keys(keys, radix)
+    totals = np.bincount(inverse.ravel(), weights=counts, minlength=len(rows))
+    return rows, totals.astype(np.int64)
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+from .backends import get_backend
+from .die import Die
+
+
+class MarkovDie(Die):
+
+    def __init__(self, faces, transitions=None):
+        """Initialize a die whose next face depends on the face it last showed.
+
+        Row i of the transition matrix weighs the faces rolled after face i;
+        the die's weights (see change_weight) are those of the first roll.
+        In a Game every Markov die is its own chain over the rolls, so one
+        die object can back several independent chains.
+
+        Input:
+            faces (numpy.ndarray): Array of faces with distinct values.
+            transitions (numpy.ndarray): Transition weights (faces x faces)
+                in face order (default = all equal, independent rolls).
+
+        Raises:
+            TypeError: If faces or transitions are not NumPy arrays.
+            ValueError: If faces are not distinct or transitions don't fit.
+        """
+        super().__init__(faces)
+        n_faces = len(faces)
+        if transitions is None:
+            transitions = np.ones((n_faces, n_faces))
+        if not isinstance(transitions, np.ndarray):
+            raise TypeError('Transitions must be a NumPy array')
+        transitions = transitions.astype(float)
+        if transitions.shape != (n_faces, n_faces):
+            raise ValueError(f'Transitions must be a {n_faces} x {n_faces} matrix')
+        if (not np.isfinite(transitions).all() or (transitions < 0).any()
+                or (transitions.sum(axis=1) <= 0).any()):
+            raise ValueError('Transition weights must be finite and not negative, and '
+                             'every row needs a positive one')
+        self._transitions = transitions
+        self._state = None
+
+    @property
+    def transitions(self):
+        """pandas.DataFrame: Transition weights, previous face by next face."""
+        return pd.DataFrame(self._transitions.copy(), index=self._index,
+                            columns=self._index.copy())
+
+    def change_transition(self, from_face, to_face, new_weight):
+        """Change the weight of rolling one face right after another.
+
+        Input:
+            from_face: Face shown by the previous roll.
+            to_face: Face of the next roll.
+            new_weight (int, float, str): The new weight value.
+
+        Raises:
+            IndexError: If a face is not in the die.
+            TypeError: If the new weight is not numeric.
+            ValueError: If the weight is negative or leaves a row without
+                a positive weight.
+        """
+        try:
+            row, column = self._index.get_loc(from_face), self._index.get_loc(to_face)
+        except (KeyError, TypeError):
+            raise IndexError(f'Faces, {from_face} and {to_face}, are not both found')
+        try:
+            weight = float(new_weight)
+        except (TypeError, ValueError):
+            raise TypeError('Weights must be numeric (int or float)')
+        if not 0 <= weight < np.inf:
+            raise ValueError('Weight must be finite and not negative')
+        if weight == 0 and np.delete(self._transitions[row], column).sum() <= 0:
+            raise ValueError(f'Face {from_face} needs a positive transition weight')
+        self._transitions[row, column] = weight
+
+    def reset(self):
+        """Start the die's own chain over: its next roll uses the first-roll weights."""
+        super().reset()
+        self._state = None
+
+    def roll(self, dice_rolls=1):
+        """Roll the die, continuing from the face of its previous roll.
+
+        Input:
+            dice_rolls (int): Number of times to roll the die (default = 1).
+
+        Returns:
+            list: Outcomes of each roll.
+
+        Raises:
+            TypeError: If times is not an integer.
+            ValueError: If times is less than 1.
+        """
+        if not isinstance(dice_rolls, int):
+            raise TypeError("Number of rolls must be an integer.")
+        if dice_rolls < 1:
+            raise ValueError("Number of rolls must be positive.")
+        start = np.array([-1 if self._state is None else self._state])
+        codes = run_chains([self], start, np.random.random_sample((1, dice_rolls)))[0]
+        self._state = int(codes[-1])
+        return list(self._faces[codes])
+
+    def _uniform(self):
+        """Private method: a Markov die never takes the fair-die fast path."""
+        return False
+
+    def _transition_cdf(self):
+        """Private method returning the cumulative table of each row of transitions."""
+        weights = self._transitions
+        cdf = (weights / weights.sum(axis=1, keepdims=True)).cumsum(axis=1)
+        cdf /= cdf[:, -1:]
+        return cdf
+
+
+def run_chains(dice, start, u):
+    """Roll Markov dice as chains, all chains at once.
+
+    Input:
+        dice (list): The MarkovDie of each chain, with the same number of faces.
+        start (numpy.ndarray): Code each chain last showed, -1 if it hasn't
+            rolled yet (its first roll uses the die's weights).
+        u (numpy.ndarray): Uniform draws of each chain (chains x rolls).
+
+    Returns:
+        numpy.ndarray: Codes into each die's faces (chains x rolls).
+    """
+    codes = np.empty(u.shape, dtype=np.int64)
+    if u.shape[1] == 0:
+        return codes
+    backend = get_backend()
+    start = np.array(start, dtype=np.int64)
+    fresh = start < 0
+    for group, first in ((np.flatnonzero(fresh), 1), (np.flatnonzero(~fresh), 0)):
+        if len(group) == 0:
+            continue
+        if first:
+            initial = np.stack([dice[c]._cdf() for c in group])
+            start[group] = backend.search_stacked(initial, u[group, :1])[:, 0]
+            codes[group, 0] = start[group]
+        cdf = np.stack([dice[c]._transition_cdf() for c in group])
+        codes[group, first:] = backend.markov_chains(cdf, start[group], u[group, first:])
+    return codes
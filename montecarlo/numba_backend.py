@@ -0,0 +1,148 @@
+import numba
+import numpy as np
+from . import kernels
+
+# Compiled kernels run without the GIL, so the thread modes scale with them,
+# and they work row by row without the temporaries of the numpy versions
+
+
+@numba.njit(nogil=True, cache=True)
+def _search(cdf, u, out):
+    for i in range(len(u)):
+        # First table entry above the draw, like searchsorted(side='right')
+        lo, hi = 0, len(cdf)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if cdf[mid] <= u[i]:
+                lo = mid + 1
+            else:
+                hi = mid
+        out[i] = lo
+
+
+@numba.njit(nogil=True, cache=True)
+def _search_stacked(cdf, u, out):
+    n_faces = cdf.shape[1]
+    for t in range(u.shape[0]):
+        if n_faces > kernels._COMPARE_FACES:
+            _search(cdf[t], u[t], out[t])
+            continue
+        # Small tables: count the entries at most each draw, without branches
+        for i in range(u.shape[1]):
+            code = 0
+            for j in range(n_faces - 1):
+                code += cdf[t, j] <= u[t, i]
+            out[t, i] = code
+
+
+@numba.njit(nogil=True, cache=True)
+def _markov_chains(cdf, start, u, out):
+    n_faces = cdf.shape[1]
+    for c in range(u.shape[0]):
+        state = start[c]
+        for t in range(u.shape[1]):
+            code = 0
+            for j in range(n_faces - 1):
+                code += cdf[c, state, j] <= u[c, t]
+            state = code
+            out[c, t] = state
+
+
+@numba.njit(nogil=True, cache=True)
+def _jackpot_count(codes):
+    count = 0
+    for i in range(codes.shape[0]):
+        same = True
+        for j in range(1, codes.shape[1]):
+            if codes[i, j] != codes[i, 0]:
+                same = False
+                break
+        if same:
+            count += 1
+    return count
+
+
+@numba.njit(nogil=True, cache=True)
+def _face_counts_per_row(codes, out):
+    for i in range(codes.shape[0]):
+        for j in range(codes.shape[1]):
+            out[i, codes[i, j]] += 1
+
+
+@numba.njit(nogil=True, cache=True)
+def _sort_rows(codes, order, rank, out):
+    n_dice = codes.shape[1]
+    row = np.empty(n_dice, dtype=np.int64)
+    for i in range(codes.shape[0]):
+        # Insertion sort of the ranks: dice counts are small
+        for j in range(n_dice):
+            value = rank[codes[i, j]]
+            k = j
+            while k > 0 and row[k - 1] > value:
+                row[k] = row[k - 1]
+                k -= 1
+            row[k] = value
+        for j in range(n_dice):
+            out[i, j] = order[row[j]]
+
+
+@numba.njit(nogil=True, cache=True)
+def _count_keys(codes, radix, counts):
+    # Encode and count in one pass, no key array
+    for i in range(codes.shape[0]):
+        key = 0
+        for j in range(codes.shape[1]):
+            key = key * radix[j] + codes[i, j]
+        counts[key] += 1
+
+
+class NumbaBackend():
+    """Hot loops of sampling and analysis compiled with numba."""
+
+    name = 'numba'
+
+    def search(self, cdf, u):
+        """Map uniform draws to face codes through one cumulative table."""
+        out = np.empty(len(u), dtype=np.int64)
+        _search(np.ascontiguousarray(cdf, dtype=np.float64), u, out)
+        return out
+
+    def search_stacked(self, cdf, u):
+        """Map each row of draws through its own cumulative table (tables x draws)."""
+        out = np.empty(u.shape, dtype=np.int64)
+        _search_stacked(np.ascontiguousarray(cdf, dtype=np.float64), u, out)
+        return out
+
+    def markov_chains(self, cdf, start, u):
+        """Run Markov chains from their start states (chains x steps)."""
+        out = np.empty(u.shape, dtype=np.int64)
+        _markov_chains(np.ascontiguousarray(cdf, dtype=np.float64),
+                       np.asarray(start, dtype=np.int64), u, out)
+        return out
+
+    def jackpot_count(self, codes):
+        """Count rows where every die shows the same face."""
+        return int(_jackpot_count(codes))
+
+    def face_counts_per_row(self, codes, n_faces):
+        """Count how often each face appears in each row (rows x faces)."""
+        out = np.zeros((len(codes), n_faces), dtype=np.int64)
+        _face_counts_per_row(codes, out)
+        return out
+
+    def sort_rows(self, codes, order, rank):
+        """Sort the codes in each row by face value (combinations)."""
+        out = np.empty(codes.shape, dtype=order.dtype)
+        _sort_rows(codes, order, rank, out)
+        return out
+
+    def count_rows(self, codes, radix):
+        """Count the distinct rows of a codes matrix."""
+        size = np.prod(np.asarray(radix, dtype=float))
+        if size >= kernels._KEY_LIMIT or size > max(4 * len(codes), 2 ** 16):
+            # Sparse key space, sorting beats a dense table
+            return kernels.count_rows(codes, radix)
+        counts = np.zeros(int(size), dtype=np.int64)
+        _count_keys(codes, np.asarray(radix, dtype=np.int64), counts)
+        keys = np.flatnonzero(counts)
+        return kernels.decode_keys(keys, radix), counts[keys]
@@ -0,0 +1,317 @@
+from .die import Die
+from .game import Game
+from .analyzer import _count_frame
+from .backends import get_backend
+from . import kernels
+import numpy as np
+import pandas as pd
+
+# Row counters an analyzer can keep
+_ROW_COUNTS = ('combo_count', 'permutation_count')
+
+# Pending chunk counts are folded in once they hold this many rows, or as
+# many as the running counts (so each row is folded a few times at most)
+_FOLD_ROWS = 1 << 16
+
+
+class OnlineAnalyzer():
+
+    def __init__(self, faces, n_dice, scores=None, counts=_ROW_COUNTS):
+        """Initialize an empty streaming analyzer.
+
+        It holds running counts instead of results, so chunks can be fed
+        one at a time and analyzers of separate runs can be merged exactly.
+        The rows of each chunk are set aside and folded into the
+        row counters in batches, not on every chunk.
+
+        Input:
+            faces (numpy.ndarray): Faces of the dice, in code order.
+            n_dice (int): Number of dice per roll.
+            scores (numpy.ndarray): Score of each face, summed per roll for
+                the score moments (default = the faces if numeric).
+            counts (list): Row counters to keep, any of 'combo_count' and
+                'permutation_count' (default = both).
+
+        Raises:
+            TypeError: If faces is not a NumPy array.
+            ValueError: If faces are not distinct, n_dice is not positive
+                or a row counter is unknown.
+        """
+        Die(faces)
+        if not isinstance(n_dice, int) or n_dice < 1:
+            raise ValueError('Number of dice must be a positive integer.')
+        for name in counts:
+            if name not in _ROW_COUNTS:
+                raise ValueError(f'Row counters must be among {_ROW_COUNTS}')
+        if scores is None and faces.dtype.kind in 'biuf':
+            scores = faces
+        if scores is not None and len(scores) != len(faces):
+            raise ValueError('Need one score per face')
+
+        self.faces = faces
+        self.n_dice = n_dice
+        self.scores = None if scores is None else np.asarray(scores, dtype=float)
+
+        self.rolls = 0
+        self.jackpots = 0
+        self.face_totals = np.zeros((n_dice, len(faces)), dtype=np.int64)
+        self._radix = [len(faces)] * n_dice
+        # Rows are counted by their keys when they fit in an int64
+        self._keyed = kernels.encode_rows(np.empty((0, n_dice), dtype=np.int64),
+                                          self._radix) is not None
+        empty = np.empty(0 if self._keyed else (0, n_dice), dtype=np.int64)
+        # Running (rows or keys, counts) of each kept counter, and the
+        # chunks not yet folded in
+        self._rows = {name: (empty, np.empty(0, dtype=np.int64))
+                      for name in _ROW_COUNTS if name in counts}
+        self._pending = {name: [] for name in self._rows}
+
+        # Count, mean and sum of squared deviations of the roll scores
+        self._moments = np.zeros(3)
+        self._score_range = np.array([np.inf, -np.inf])
+
+    @classmethod
+    def from_game(cls, game, scores=None, counts=_ROW_COUNTS):
+        """Build an analyzer for a game's dice, fed with its results if played.
+
+        Input:
+            game (Game): The game to analyze.
+            scores (numpy.ndarray): Score of each face (see constructor).
+            counts (list): Row counters to keep (see constructor).
+
+        Returns:
+            OnlineAnalyzer: Analyzer holding the game's results so far.
+        """
+        if not isinstance(game, Game):
+            raise ValueError('Input must be a Game object.')
+        analyzer = cls(game.faces, len(game.dice), scores, counts)
+        if game.codes is not None:
+            analyzer.update(game.codes)
+        return analyzer
+
+
+    def update(self, chunk):
+        """Add a chunk of rolls to the running state.
+
+        Input:
+            chunk (numpy.ndarray, Game): Coded rolls (rolls x dice) or a
+                played game with the same faces.
+
+        Raises:
+            ValueError: If the chunk doesn't match the faces or dice.
+        """
+        if isinstance(chunk, Game):
+            if chunk.codes is None:
+                raise ValueError("No game results available. Play the game first.")
+            if not np.array_equal(chunk.faces, self.faces):
+                raise ValueError('Game faces must match the analyzer faces')
+            chunk = chunk.codes
+        chunk = np.asarray(chunk)
+        if chunk.ndim != 2 or chunk.shape[1] != self.n_dice:
+            raise ValueError(f'Chunk must have {self.n_dice} columns of codes')
+        if len(chunk) == 0:
+            return
+        if chunk.min() < 0 or chunk.max() >= len(self.faces):
+            raise ValueError('Codes must index the faces')
+
+        self.rolls += len(chunk)
+        backend = get_backend()
+        self.jackpots += backend.jackpot_count(chunk)
+        n_faces = len(self.faces)
+        keys = chunk + np.arange(self.n_dice) * n_faces
+        self.face_totals += np.bincount(keys.ravel(), minlength=self.n_dice * n_faces
+                                        ).reshape(self.n_dice, n_faces)
+
+        if 'combo_count' in self._rows:
+            order, rank = kernels.face_order(self.faces)
+            self._add_rows('combo_count', backend.sort_rows(chunk, order, rank))
+        if 'permutation_count' in self._rows:
+            self._add_rows('permutation_count', chunk)
+
+        if self.scores is not None:
+            totals = self.scores[chunk].sum(axis=1)
+            chunk_moments = np.array([len(totals), totals.mean(),
+                                      ((totals - totals.mean()) ** 2).sum()])
+            self._moments = self._merge_moments(self._moments, chunk_moments)
+            self._score_range = np.array([min(self._score_range[0], totals.min()),
+                                          max(self._score_range[1], totals.max())])
+
+    def _add_rows(self, name, rows, counts=None):
+        """Private method setting aside rows for a counter, with counts or once each."""
+        if self._keyed:
+            rows = kernels.encode_rows(rows, self._radix)
+            if counts is None:
+                counts = np.ones(len(rows), dtype=np.int64)
+        elif counts is None:
+            rows, counts = get_backend().count_rows(rows, self._radix)
+        pending = self._pending[name]
+        pending.append((rows, counts))
+        if sum(len(c) for _, c in pending) >= max(_FOLD_ROWS, len(self._rows[name][1])):
+            self._fold(name)
+
+    def _fold(self, name):
+        """Private method folding the pending rows of a counter into its running counts."""
+        pending = self._pending[name]
+        if pending:
+            if self._keyed:
+                self._rows[name] = kernels.merge_key_counts(
+                    np.concatenate([keys for keys, _ in pending]),
+                    np.concatenate([counts for _, counts in pending]), into=self._rows[name])
+            else:
+                parts = [self._rows[name]] + pending
+                self._rows[name] = kernels.merge_row_counts(
+                    np.concatenate([rows for rows, _ in parts]),
+                    np.concatenate([counts for _, counts in parts]), self._radix)
+            pending.clear()
+
+    def _counted(self, name):
+        """Private method returning the distinct rows and counts of a kept counter."""
+        if name not in self._rows:
+            raise ValueError(f'The analyzer does not keep {name}')
+        self._fold(name)
+        rows, counts = self._rows[name]
+        if self._keyed:
+            rows = kernels.decode_keys(rows, self._radix)
+        return rows, counts
+
+    @staticmethod
+    def _merge_moments(a, b):
+        """Private method combining (count, mean, M2) of two samples exactly."""
+        n = a[0] + b[0]
+        if n == 0:
+            return np.zeros(3)
+        delta = b[1] - a[1]
+        mean = a[1] + delta * b[0] / n
+        m2 = a[2] + b[2] + delta ** 2 * a[0] * b[0] / n
+        return np.array([n, mean, m2])
+
+    def merge(self, other):
+        """Add the state of another analyzer over the same faces and dice.
+
+        Input:
+            other (OnlineAnalyzer): Analyzer of a separate chunk of rolls.
+
+        Returns:
+            OnlineAnalyzer: This analyzer, to chain merges.
+
+        Raises:
+            ValueError: If the analyzers don't share faces and dice.
+        """
+        if not isinstance(other, OnlineAnalyzer):
+            raise ValueError('Input must be an OnlineAnalyzer object.')
+        if other.n_dice != self.n_dice or not np.array_equal(other.faces, self.faces):
+            raise ValueError('Analyzers must have the same faces and number of dice')
+        if not set(self._rows) <= set(other._rows):
+            raise ValueError('The other analyzer must keep the row counters of this one')
+
+        self.rolls += other.rolls
+        self.jackpots += other.jackpots
+        self.face_totals += other.face_totals
+        for name in self._rows:
+            self._add_rows(name, *other._counted(name))
+        self._moments = self._merge_moments(self._moments, other._moments)
+        self._score_range = np.array([min(self._score_range[0], other._score_range[0]),
+                                      max(self._score_range[1], other._score_range[1])])
+        return self
+
+
+    def jackpot(self):
+        """Count the number of jackpot rolls seen so far.
+
+        Returns:
+            int: Number of jackpot.
+        """
+        return self.jackpots
+
+    def face_counts(self):
+        """Count each face on each die over all rolls seen so far.
+
+        Returns:
+            pd.DataFrame: One row per die, one column per face.
+        """
+        return pd.DataFrame(self.face_totals, columns=pd.Index(self.faces))
+
+    def combo_count(self):
+        """Count distinct combination of faces seen so far.
+
+        Returns:
+            pd.DataFrame: MultiIndex of combinations with counts.
+
+        Raises:
+            ValueError: If the analyzer doesn't keep combination counts.
+        """
+        return _count_frame(*self._counted('combo_count'), self.faces)
+
+    def permutation_count(self):
+        """Count distinct permutations of faces seen so far.
+
+        Returns:
+            pd.DataFrame: MultiIndex of permutations with counts.
+
+        Raises:
+            ValueError: If the analyzer doesn't keep permutation counts.
+        """
+        return _count_frame(*self._counted('permutation_count'), self.faces)
+
+    def score_moments(self):
+        """Summarize the distribution of roll scores (sum of face scores).
+
+        Returns:
+            pd.Series: count, mean, var (population), std, min and max
+            of the scores.
+
+        Raises:
+            ValueError: If the faces have no scores.
+        """
+        if self.scores is None:
+            raise ValueError('Faces are not numeric, pass scores to track moments')
+        count, mean, m2 = self._moments
+        var = m2 / count if count else np.nan
+        return pd.Series({'count': int(count), 'mean': mean if count else np.nan,
+                          'var': var, 'std': np.sqrt(var),
+                          'min': self._score_range[0], 'max': self._score_range[1]})
+
+
+    def save(self, path):
+        """Write the analyzer state to a compressed npz file.
+
+        Input:
+            path (str): File to write.
+        """
+        rows = {}
+        for name, prefix in (('combo_count', 'combo'), ('permutation_count', 'perm')):
+            if name in self._rows:
+                rows[prefix + '_rows'], rows[prefix + '_counts'] = self._counted(name)
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, faces=self.faces, n_dice=self.n_dice,
+                                scores=np.array([]) if self.scores is None else self.scores,
+                                has_scores=self.scores is not None,
+                                counters=np.array([self.rolls, self.jackpots]),
+                                face_totals=self.face_totals, **rows,
+                                moments=self._moments, score_range=self._score_range)
+
+    @classmethod
+    def load(cls, path):
+        """Read an analyzer state written by `save`.
+
+        Input:
+            path (str): File to read.
+
+        Returns:
+            OnlineAnalyzer: The saved analyzer.
+        """
+        with np.load(path) as data:
+            scores = data['scores'] if data['has_scores'] else None
+            counts = [name for name, prefix in (('combo_count', 'combo'),
+                                                ('permutation_count', 'perm'))
+                      if prefix + '_rows' in data]
+            analyzer = cls(data['faces'], int(data['n_dice']), scores, counts)
+            analyzer.rolls, analyzer.jackpots = (int(x) for x in data['counters'])
+            analyzer.face_totals = data['face_totals']
+            if 'combo_count' in counts:
+                analyzer._add_rows('combo_count', data['combo_rows'], data['combo_counts'])
+            if 'permutation_count' in counts:
+                analyzer._add_rows('permutation_count', data['perm_rows'], data['perm_counts'])
+            analyzer._moments = data['moments']
+            analyzer._score_range = data['score_range']
+        return analyzer
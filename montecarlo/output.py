@@ -0,0 +1,126 @@
+import numpy as np
+
+# Result formats of the Analyzer counts and Game.show_results
+_OUTPUTS = ('pandas', 'numpy', 'arrow')
+
+
+def check_output(output):
+    """Validate an output format.
+
+    Raises:
+        ValueError: If output is not 'pandas', 'numpy' or 'arrow'.
+    """
+    if output not in _OUTPUTS:
+        raise ValueError(f'Output must be one of {list(_OUTPUTS)}')
+
+
+def _dictionary_columns(pa, columns, faces):
+    """Private function wrapping code columns as Arrow dictionary arrays.
+
+    The codes are handed to Arrow as they are; only the faces are
+    converted, once, as the shared dictionary.
+    """
+    from .storage import _face_dictionary
+    dictionary = _face_dictionary(pa, faces)
+    return [pa.DictionaryArray.from_arrays(np.ascontiguousarray(column), dictionary)
+            for column in columns]
+
+
+def scalar(value, output):
+    """Return a count as an int (pandas), numpy.int64 or Arrow int64 scalar."""
+    if output == 'numpy':
+        return np.int64(value)
+    if output == 'arrow':
+        from .storage import _import_pyarrow
+        return _import_pyarrow().scalar(value, type='int64')
+    return int(value)
+
+
+def count_table(rows, counts, faces, output):
+    """Build the result of a combination or permutation count.
+
+    Rows are sorted most frequent first in every format.
+
+    Input:
+        rows (numpy.ndarray): Distinct rows as codes into faces (rows x dice).
+        counts (numpy.ndarray): Count of each row.
+        faces (numpy.ndarray): Faces of the dice.
+        output (str): 'numpy' or 'arrow' ('pandas' is built by the Analyzer).
+
+    Returns:
+        tuple or pyarrow.Table: For 'numpy' a structured array with one
+        code field per die ('0', '1', ...) and 'Counts', and the faces the
+        codes index. For 'arrow' a table with a dictionary column per die
+        and 'Counts'.
+    """
+    from .game import _code_dtype
+    order = np.lexsort((np.arange(len(counts)), -counts))
+    rows, counts = rows[order], np.asarray(counts[order], dtype=np.int64)
+    n_dice = rows.shape[1]
+    names = [f'{i}' for i in range(n_dice)]
+    code_dtype = _code_dtype(len(faces))
+    if output == 'numpy':
+        table = np.empty(len(counts), dtype=[(name, code_dtype) for name in names]
+                         + [('Counts', np.int64)])
+        for i, name in enumerate(names):
+            table[name] = rows[:, i]
+        table['Counts'] = counts
+        return table, faces
+    from .storage import _import_pyarrow
+    pa = _import_pyarrow()
+    columns = _dictionary_columns(pa, [rows[:, i].astype(code_dtype) for i in range(n_dice)],
+                                  faces)
+    return pa.table(columns + [pa.array(counts)], names=names + ['Counts'])
+
+
+def face_count_table(counts, faces, output):
+    """Build the result of face counts per roll.
+
+    Returns:
+        tuple or pyarrow.Table: For 'numpy' the counts (rolls x faces) and
+        the faces of the columns. For 'arrow' a table with one column per
+        face, named by the face.
+    """
+    if output == 'numpy':
+        return counts, faces
+    from .storage import _import_pyarrow
+    pa = _import_pyarrow()
+    return pa.table([pa.array(counts[:, j]) for j in range(counts.shape[1])],
+                    names=[str(face) for face in faces])
+
+
+def results_table(codes, faces, form, output):
+    """Build the results of a game from its codes.
+
+    Input:
+        codes (numpy.ndarray): Read-only codes (rolls x dice).
+        faces (numpy.ndarray): Faces the codes index.
+        form (str): 'wide' or 'narrow'.
+        output (str): 'numpy' or 'arrow'.
+
+    Returns:
+        tuple or pyarrow.Table: For 'numpy' the codes and the faces; wide
+        codes are the game's codes themselves, narrow ones a structured
+        array of Rolls, Die and Face (code). For 'arrow' a table with a
+        dictionary column per die, or Rolls, Die and Face columns.
+    """
+    n_rolls, n_dice = codes.shape
+    if form == 'narrow':
+        rolls = np.repeat(np.arange(n_rolls), n_dice)
+        die = np.tile(np.arange(n_dice), n_rolls)
+        if output == 'numpy':
+            table = np.empty(n_rolls * n_dice, dtype=[('Rolls', np.int64), ('Die', np.int64),
+                                                      ('Face', codes.dtype)])
+            table['Rolls'], table['Die'], table['Face'] = rolls, die, codes.ravel()
+            return table, faces
+        from .storage import _import_pyarrow
+        pa = _import_pyarrow()
+        return pa.table([pa.array(rolls), pa.array(die)]
+                        + _dictionary_columns(pa, [codes.ravel()], faces),
+                        names=['Rolls', 'Die', 'Face'])
+    if output == 'numpy':
+        return codes, faces
+    from .storage import _import_pyarrow
+    pa = _import_pyarrow()
+    return pa.table(_dictionary_columns(pa, [codes[:, i] for i in range(n_dice)], faces),
+                    names=[f'{i}' for i in range(n_dice)])
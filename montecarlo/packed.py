@@ -0,0 +1,141 @@
+import numpy as np
+
+# Bits are stored least significant first in little-endian 64-bit words, so
+# bit k of word w is roll 64 * w + k on any platform
+_WORD = np.dtype('<u8')
+
+
+def _popcount(words):
+    """Private function counting the set bits of an array of words."""
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(words).sum(dtype=np.int64))
+    return int(np.unpackbits(words.view(np.uint8)).sum(dtype=np.int64))
+
+
+class PackedCodes():
+
+    def __init__(self, rolls, n_dice, n_faces):
+        """Initialize zeroed bit-packed storage for coded rolls.
+
+        Each die's codes are kept as ceil(log2(n_faces)) bit planes, one bit
+        per roll, packed 64 rolls to a word. A coin game takes one bit per
+        roll and die, 8 times less than int8 codes.
+
+        Input:
+            rolls (int): Number of rolls.
+            n_dice (int): Number of dice.
+            n_faces (int): Number of faces, fixing the bits per code.
+        """
+        from .game import _code_dtype
+        self.rolls = rolls
+        self.n_dice = n_dice
+        self.n_faces = n_faces
+        self.bits = max(1, (n_faces - 1).bit_length())
+        self.dtype = _code_dtype(n_faces)
+        self.planes = np.zeros((n_dice, self.bits, -(-rolls // 64)), dtype=_WORD)
+
+    @classmethod
+    def pack(cls, codes, n_faces):
+        """Pack a codes matrix (rolls x dice).
+
+        Returns:
+            PackedCodes: The packed codes.
+        """
+        packed = cls(len(codes), codes.shape[1], n_faces)
+        packed[:] = codes
+        return packed
+
+    @property
+    def shape(self):
+        """tuple: Shape of the unpacked codes (rolls x dice)."""
+        return (self.rolls, self.n_dice)
+
+    @property
+    def itemsize(self):
+        """int: Bytes of one unpacked code."""
+        return self.dtype.itemsize
+
+    @property
+    def nbytes(self):
+        """int: Bytes held by the packed words."""
+        return self.planes.nbytes
+
+    def __len__(self):
+        return self.rolls
+
+    def _rows(self, key):
+        """Private method resolving a slice of rolls to (start, stop)."""
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise IndexError('Packed codes are read and written by contiguous slices of rolls')
+        start, stop, _ = key.indices(self.rolls)
+        return start, max(start, stop)
+
+    def __setitem__(self, key, codes):
+        """Pack rolls (rows x dice) into a slice of rolls starting on a word."""
+        start, stop = self._rows(key)
+        if start % 64:
+            raise IndexError('Packed writes must start at a multiple of 64 rolls')
+        codes = np.asarray(codes)
+        if codes.shape != (stop - start, self.n_dice):
+            raise ValueError(f'Expected codes of shape {(stop - start, self.n_dice)}')
+        first, last = start // 64, -(-stop // 64)
+        for i in range(self.n_dice):
+            for b in range(self.bits):
+                bits = ((codes[:, i] >> b) & 1).astype(np.uint8)
+                packed = np.packbits(bits, bitorder='little')
+                words = np.zeros(8 * (last - first), dtype=np.uint8)
+                words[:len(packed)] = packed
+                self.planes[i, b, first:last] = words.view(_WORD)
+
+    def __getitem__(self, key):
+        """Unpack a slice of rolls into codes (rows x dice)."""
+        start, stop = self._rows(key)
+        first, last = start // 64, -(-stop // 64)
+        offset = start - 64 * first
+        codes = np.zeros((stop - start, self.n_dice), dtype=self.dtype)
+        for i in range(self.n_dice):
+            for b in range(self.bits):
+                bits = np.unpackbits(self.planes[i, b, first:last].view(np.uint8),
+                                     bitorder='little')[offset:offset + stop - start]
+                codes[:, i] |= bits.astype(self.dtype) << b
+        return codes
+
+    def unpack(self):
+        """Unpack every roll.
+
+        Returns:
+            numpy.ndarray: Codes (rolls x dice).
+        """
+        return self[:]
+
+    def truncate(self, rolls):
+        """Keep the first rolls, sharing the words.
+
+        Returns:
+            PackedCodes: The shorter codes.
+        """
+        packed = PackedCodes.__new__(PackedCodes)
+        packed.__dict__.update(self.__dict__)
+        packed.rolls = min(rolls, self.rolls)
+        packed.planes = self.planes[:, :, :-(-packed.rolls // 64)]
+        return packed
+
+    def jackpot_count(self):
+        """Count jackpot rolls on the packed words.
+
+        A roll is a jackpot when every bit plane of every die matches the
+        first die, so the XORs with the first die are ORed together and
+        the clear bits counted, 64 rolls per word operation.
+
+        Returns:
+            int: Number of rolls where all dice show the same face.
+        """
+        differ = np.zeros(self.planes.shape[2], dtype=_WORD)
+        for i in range(1, self.n_dice):
+            for b in range(self.bits):
+                differ |= self.planes[i, b] ^ self.planes[0, b]
+        same = ~differ
+        tail = self.rolls % 64
+        if tail:
+            same[-1] &= np.uint64((1 << tail) - 1)
+        return _popcount(same)
@@ -0,0 +1,144 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from .backends import get_backend
+from . import kernels
+import numpy as np
+
+
+def share_array(array):
+    """Copy an array into a new shared memory block.
+
+    Returns:
+        tuple: The SharedMemory block and an array view of it.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    shared[...] = array
+    return block, shared
+
+
+def release(block):
+    """Free a shared memory block created by `share_array`."""
+    try:
+        block.close()
+    except BufferError:
+        # Views of the block are still alive; the mapping goes with them
+        pass
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _attach(name, shape, dtype):
+    """Attach to a shared block from a worker, without owning it."""
+    try:
+        block = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the block again, with the
+        # resource tracker the workers share with the owner: a no-op
+        block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def spawn_generators(seed, n):
+    """Independent generators for n threads, spawned from one seed.
+
+    Input:
+        seed (int, numpy.random.SeedSequence, numpy.random.Generator): Seed.
+        n (int): Number of generators.
+
+    Returns:
+        list: The generators.
+
+    Raises:
+        ValueError: If n is not a positive integer.
+    """
+    if not isinstance(n, int) or n < 1:
+        raise ValueError('Number of threads must be a positive integer.')
+    if isinstance(seed, np.random.Generator):
+        return seed.spawn(n)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [np.random.default_rng(child) for child in seed.spawn(n)]
+
+
+def partitions(n_rows, parts):
+    """Split range(n_rows) into contiguous (start, stop) pairs."""
+    bounds = np.linspace(0, n_rows, min(parts, n_rows) + 1).astype(np.int64)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def partial_counts(kind, codes, n_faces, order=None, rank=None):
+    """Count one statistic on a block of coded rows.
+
+    Input:
+        kind (str): 'jackpot', 'face_counts', 'combo_count' or
+            'permutation_count'.
+        codes (numpy.ndarray): Coded rows (rows x dice).
+        n_faces (int): Number of faces.
+        order, rank (numpy.ndarray): Face order for combinations.
+
+    Returns:
+        int, numpy.ndarray or tuple: Jackpot count, face counts per row, or
+        distinct rows with their counts.
+    """
+    backend = get_backend()
+    if kind == 'jackpot':
+        return backend.jackpot_count(codes)
+    if kind == 'face_counts':
+        return backend.face_counts_per_row(codes, n_faces)
+    if kind == 'combo_count':
+        codes = backend.sort_rows(codes, order, rank)
+    return backend.count_rows(codes, [n_faces] * codes.shape[1])
+
+
+def _partial_task(name, shape, dtype, start, stop, kind, n_faces, order, rank):
+    """Worker side of `map_shared`: count rows start:stop of a shared block."""
+    block, codes = _attach(name, shape, dtype)
+    try:
+        return partial_counts(kind, codes[start:stop], n_faces, order, rank)
+    finally:
+        del codes
+        block.close()
+
+
+def map_shared(block, codes, kind, workers, n_faces, order=None, rank=None):
+    """Count a statistic over row partitions of shared codes in processes.
+
+    Workers attach to the same shared block, so no rows are pickled.
+
+    Returns:
+        list: Partial result of each partition, in row order.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_partial_task, block.name, codes.shape, codes.dtype.str,
+                               start, stop, kind, n_faces, order, rank)
+                   for start, stop in partitions(len(codes), workers)]
+        return [future.result() for future in futures]
+
+
+def map_threads(codes, kind, threads, n_faces, order=None, rank=None):
+    """Count a statistic over row partitions of codes in threads.
+
+    The numpy kernels release the GIL, and the threads read disjoint slices
+    of the same array.
+
+    Returns:
+        list: Partial result of each partition, in row order.
+    """
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(partial_counts, kind, codes[start:stop], n_faces, order, rank)
+                   for start, stop in partitions(len(codes), threads)]
+        return [future.result() for future in futures]
+
+
+def merge_partials(kind, partials, n_faces, n_dice):
+    """Combine the partial results of `partial_counts`."""
+    if kind == 'jackpot':
+        return sum(partials)
+    if kind == 'face_counts':
+        return np.concatenate(partials)
+    rows = np.concatenate([part[0] for part in partials])
+    counts = np.concatenate([part[1] for part in partials])
+    return kernels.merge_row_counts(rows, counts, [n_faces] * n_dice)
@@ -0,0 +1,169 @@
+import math
+import time
+import numpy as np
+import pandas as pd
+
+# Analyses the planner knows, by Analyzer method name and kernel
+ANALYSES = {'jackpot': 'jackpot', 'face_counts_per_roll': 'face_counts',
+            'combo_count': 'combo_count', 'permutation_count': 'permutation_count'}
+
+# Dense count tables hold up to this many int64 entries regardless of rows
+_MIN_DENSE_TABLE = 2 ** 16
+
+# Rows timed per kernel to calibrate the runtime estimates
+_CALIBRATION_ROLLS = 2 ** 15
+
+
+def results_bytes(rolls, n_dice, n_faces, packed=False):
+    """Bytes of the coded results, plain or bit-packed (see PackedCodes)."""
+    if packed:
+        return 8 * n_dice * max(1, (n_faces - 1).bit_length()) * -(-rolls // 64)
+    from .game import _code_dtype
+    return rolls * n_dice * _code_dtype(n_faces).itemsize
+
+
+def sample_bytes(rolls, n_dice, itemsize):
+    """Peak bytes of drawing a block of rolls: codes, draws and search keys."""
+    return rolls * n_dice * (itemsize + 24)
+
+
+def kernel_bytes(kind, rolls, n_dice, n_faces):
+    """Estimated peak bytes of the temporaries of an analysis kernel.
+
+    Input:
+        kind (str): Kernel of the analysis (see ANALYSES).
+        rolls (int): Rows analyzed at once.
+        n_dice (int): Number of dice.
+        n_faces (int): Number of faces.
+
+    Returns:
+        int: Bytes, not counting the coded results themselves.
+    """
+    if kind == 'jackpot':
+        # Comparison matrix, row mask and its sum
+        return rolls * (n_dice + 2)
+    if kind == 'face_counts':
+        # Row offsets, keys and the count matrix
+        return rolls * 8 * (n_faces + 2 * n_dice + 2)
+    # Row keys, then a dense count table or a sort of the keys
+    keys = rolls * 8 * (n_dice + 1)
+    counting = min(8 * n_faces ** n_dice, 8 * _MIN_DENSE_TABLE + 32 * rolls)
+    if kind == 'combo_count':
+        # Ranks, sorted ranks and sorted codes of each row
+        keys += rolls * 24 * n_dice
+    return keys + counting
+
+
+def output_rows(kind, rolls, n_dice, n_faces):
+    """Upper bound on the rows of an analysis' output.
+
+    Combinations are bounded by multisets of n_dice faces, permutations by
+    all face sequences, and both by the number of rolls.
+    """
+    if kind == 'jackpot':
+        return 1
+    if kind == 'face_counts':
+        return rolls
+    if kind == 'combo_count':
+        return min(rolls, math.comb(n_faces + n_dice - 1, n_dice))
+    return min(rolls, n_faces ** n_dice)
+
+
+def output_bytes(kind, rolls, n_dice, n_faces):
+    """Upper bound on the bytes of an analysis' output."""
+    rows = output_rows(kind, rolls, n_dice, n_faces)
+    if kind == 'jackpot':
+        return 8
+    if kind == 'face_counts':
+        return rows * n_faces * 8
+    # Counts plus one code per die in the MultiIndex
+    return rows * 8 * (n_dice + 1)
+
+
+def fit_rows(cost, memory_limit, most):
+    """Most rows, up to `most`, whose cost stays within a memory limit.
+
+    Input:
+        cost (callable): Bytes needed for a number of rows, growing with it.
+        memory_limit (int): Bytes allowed.
+        most (int): Rows wanted.
+
+    Returns:
+        int: Rows that fit, 0 if not even one does.
+    """
+    low, high = 0, most
+    while low < high:
+        middle = (low + high + 1) // 2
+        if cost(middle) <= memory_limit:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def chunk_rows(kind, memory_limit, n_dice, n_faces):
+    """Most rows an analysis kernel can take at once within a memory limit.
+
+    Returns:
+        int: Rows per chunk, 0 if not even one row fits.
+    """
+    # Counting kernels need at most a fixed table plus 32 bytes per row
+    fixed = 0
+    per_row = kernel_bytes(kind, 1, n_dice, n_faces)
+    if kind in ('combo_count', 'permutation_count'):
+        fixed = 8 * _MIN_DENSE_TABLE
+        per_row = 8 * (n_dice + 1) + 32 + (24 * n_dice if kind == 'combo_count' else 0)
+    return max(0, (memory_limit - fixed) // per_row)
+
+
+def plan(game, rolls, analyses):
+    """Estimate the memory and runtime of playing a game and analyzing it.
+
+    Runtimes are scaled from timing each step on a small sample of rolls of
+    the same game.
+
+    Input:
+        game (Game): The game to plan for.
+        rolls (int): Number of rolls to play.
+        analyses (list): Analyzer method names (see ANALYSES).
+
+    Returns:
+        pd.DataFrame: One row per step with PeakBytes (results plus
+        temporaries), OutputBytes and OutputRows (upper bounds) and Seconds.
+
+    Raises:
+        ValueError: If an analysis is unknown.
+    """
+    from .game import _BLOCK_ROLLS, _code_dtype
+    from .parallel import partial_counts
+    from . import kernels
+
+    unknown = set(analyses) - set(ANALYSES)
+    if unknown:
+        raise ValueError(f'Unknown analyses {sorted(unknown)}, choose from {list(ANALYSES)}')
+    n_dice, n_faces = len(game.dice), len(game.faces)
+    itemsize = _code_dtype(n_faces).itemsize
+    results = results_bytes(rolls, n_dice, n_faces)
+    sample = min(rolls, _CALIBRATION_ROLLS)
+
+    rng = np.random.default_rng()
+    start = time.perf_counter()
+    codes = game._sample(sample, rng)
+    seconds = (time.perf_counter() - start) * rolls / sample
+    steps = [{'Step': 'play',
+              'PeakBytes': results + sample_bytes(min(rolls, _BLOCK_ROLLS), n_dice, itemsize),
+              'OutputBytes': results, 'OutputRows': rolls, 'Seconds': seconds}]
+
+    order, rank = kernels.face_order(game.faces)
+    for name in analyses:
+        kind = ANALYSES[name]
+        start = time.perf_counter()
+        partial_counts(kind, codes, n_faces, order, rank)
+        seconds = (time.perf_counter() - start) * rolls / sample
+        out = output_bytes(kind, rolls, n_dice, n_faces)
+        steps.append({'Step': name,
+                      'PeakBytes': results + kernel_bytes(kind, rolls, n_dice, n_faces) + out,
+                      'OutputBytes': out,
+                      'OutputRows': output_rows(kind, rolls, n_dice, n_faces),
+                      'Seconds': seconds})
+    return pd.DataFrame(steps)
@@ -0,0 +1,79 @@
+import threading
+import time
+
+
+class Progress():
+
+    def __init__(self, done, total, elapsed, start=0):
+        """Snapshot of a long run after one batch.
+
+        Input:
+            done (int): Rolls (or rows) completed.
+            total (int): Rolls (or rows) of the whole run.
+            elapsed (float): Seconds since the run started.
+            start (int): Rolls already done when it started (resumed runs).
+        """
+        self.done = done
+        self.total = total
+        self.elapsed = elapsed
+        self.start = start
+
+    @property
+    def fraction(self):
+        """float: Share of the run completed."""
+        return self.done / self.total
+
+    @property
+    def throughput(self):
+        """float: Rolls per second so far."""
+        return (self.done - self.start) / self.elapsed if self.elapsed > 0 else float('inf')
+
+    @property
+    def eta(self):
+        """float: Seconds left at the current throughput."""
+        rate = self.throughput
+        return (self.total - self.done) / rate if rate > 0 else float('inf')
+
+    def __repr__(self):
+        return (f'Progress({self.done}/{self.total}, {self.throughput:.3g}/s, '
+                f'eta {self.eta:.1f}s)')
+
+
+class CancelToken():
+
+    def __init__(self):
+        """Flag to stop a run between batches, settable from any thread.
+
+        A cancelled run keeps the rolls it completed.
+        """
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Ask the runs watching this token to stop after their current batch."""
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        """bool: Whether cancel was called."""
+        return self._event.is_set()
+
+
+class _Reporter():
+
+    def __init__(self, total, done, progress, cancel):
+        """Private helper calling a progress callback and checking a token per batch."""
+        self.total = total
+        self.start = done
+        self.progress = progress
+        self.cancel = cancel
+        self._started = time.monotonic()
+
+    def report(self, done):
+        """Report a finished batch. Returns whether the run should stop."""
+        if self.progress is not None:
+            self.progress(self.snapshot(done))
+        return self.cancel is not None and self.cancel.cancelled
+
+    def snapshot(self, done):
+        """Progress after `done` rolls."""
+        return Progress(done, self.total, time.monotonic() - self._started, self.start)
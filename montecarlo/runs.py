@@ -0,0 +1,215 @@
+import numpy as np
+import pandas as pd
+
+
+class RunTracker():
+
+    def __init__(self, labels, max_lag=10, keep_runs=True):
+        """Initialize run-length tracking of a sequence of rolls.
+
+        The sequence is fed in chunks with `update`; runs, gaps and lag
+        products crossing a chunk boundary are carried over, so any chunking
+        gives the same answers.
+
+        Input:
+            labels (numpy.ndarray): What each code of the sequence stands
+                for, e.g. the faces of a die or [False, True] for an event.
+            max_lag (int): Largest lag of the autocorrelation.
+            keep_runs (bool): Keep every run for `encoding`. Without it
+                memory doesn't grow with the sequence.
+
+        Raises:
+            ValueError: If max_lag is not a positive integer.
+        """
+        if not isinstance(max_lag, int) or max_lag < 1:
+            raise ValueError('Maximum lag must be a positive integer.')
+        self.labels = np.asarray(labels)
+        self.max_lag = max_lag
+        self.keep_runs = keep_runs
+        self.length = 0
+
+        n_values = len(self.labels)
+        # Autocorrelation works on the values if numeric, else on the codes
+        if self.labels.dtype.kind in 'biuf':
+            self._scores = self.labels.astype(float)
+        else:
+            self._scores = np.arange(n_values, dtype=float)
+
+        # Completed runs, and the run still open at the end of the sequence
+        self._runs = []
+        self._open = None
+        self._longest = np.zeros(n_values, dtype=np.int64)
+
+        # Position of the latest occurrence of each code, gap length counts
+        self._last_seen = np.full(n_values, -1, dtype=np.int64)
+        self._gaps = {}
+
+        # Sums for the autocorrelation, with the first and latest values
+        self._sums = np.zeros(2)
+        self._lag_products = np.zeros(max_lag)
+        self._head = np.empty(0)
+        self._tail = np.empty(0)
+
+    def update(self, codes):
+        """Add the next chunk of the sequence.
+
+        Input:
+            codes (numpy.ndarray): Codes into labels, in roll order.
+
+        Raises:
+            ValueError: If codes don't index the labels.
+        """
+        codes = np.asarray(codes).ravel()
+        if len(codes) == 0:
+            return
+        if codes.min() < 0 or codes.max() >= len(self.labels):
+            raise ValueError('Codes must index the labels')
+        codes = codes.astype(np.int64)
+        self._update_runs(codes)
+        self._update_gaps(codes)
+        self._update_lags(self._scores[codes])
+        self.length += len(codes)
+
+    def _update_runs(self, codes):
+        """Private method splitting a chunk into runs, joined to the open run."""
+        n = len(codes)
+        starts = np.concatenate([[0], np.flatnonzero(codes[1:] != codes[:-1]) + 1])
+        lengths = np.diff(np.append(starts, n))
+        values = codes[starts]
+        starts += self.length
+        if self._open is not None:
+            value, start, length = self._open
+            if value == values[0]:
+                starts[0], lengths[0] = start, lengths[0] + length
+            else:
+                self._close(np.array([value]), np.array([start]), np.array([length]))
+        self._close(values[:-1], starts[:-1], lengths[:-1])
+        self._open = (values[-1], starts[-1], lengths[-1])
+
+    def _close(self, values, starts, lengths):
+        """Private method recording completed runs."""
+        np.maximum.at(self._longest, values, lengths)
+        if self.keep_runs and len(values):
+            self._runs.append((values, starts, lengths))
+
+    def _update_gaps(self, codes):
+        """Private method counting the rolls between repeats of each code."""
+        positions = np.arange(self.length, self.length + len(codes))
+        order = np.argsort(codes, kind='stable')
+        values, positions = codes[order], positions[order]
+        previous = np.empty_like(positions)
+        previous[1:] = positions[:-1]
+        first = np.ones(len(values), dtype=bool)
+        first[1:] = values[1:] != values[:-1]
+        # The first occurrence in the chunk continues from the carried one
+        previous[first] = self._last_seen[values[first]]
+        last = np.append(first[1:], True)
+        self._last_seen[values[last]] = positions[last]
+
+        seen = previous >= 0
+        gaps = positions[seen] - previous[seen] - 1
+        values = values[seen]
+        if len(gaps) == 0:
+            return
+        pairs, counts = np.unique(np.stack([values, gaps]), axis=1, return_counts=True)
+        for value in np.unique(pairs[0]):
+            mask = pairs[0] == value
+            histogram = np.bincount(pairs[1, mask], weights=counts[mask]).astype(np.int64)
+            current = self._gaps.get(value, np.zeros(0, dtype=np.int64))
+            if len(current) < len(histogram):
+                current = np.pad(current, (0, len(histogram) - len(current)))
+            current[:len(histogram)] += histogram
+            self._gaps[value] = current
+
+    def _update_lags(self, x):
+        """Private method adding a chunk to the sums of lagged products."""
+        self._sums += [x.sum(), (x * x).sum()]
+        extended = np.concatenate([self._tail, x])
+        carried = len(self._tail)
+        for k in range(1, self.max_lag + 1):
+            lo = max(0, k - carried)
+            if lo < len(x):
+                self._lag_products[k - 1] += np.dot(
+                    x[lo:], extended[carried + lo - k:carried + len(x) - k])
+        if len(self._head) < self.max_lag:
+            self._head = np.concatenate([self._head, x[:self.max_lag - len(self._head)]])
+        self._tail = extended[-self.max_lag:]
+
+
+    def encoding(self):
+        """Run-length encoding of the sequence.
+
+        Returns:
+            pd.DataFrame: One row per run with its Value, Start and Length.
+
+        Raises:
+            ValueError: If runs were not kept.
+        """
+        if not self.keep_runs:
+            raise ValueError('Runs were not kept, create the tracker with keep_runs=True')
+        runs = self._runs + ([tuple(np.array([v]) for v in self._open)] if self._open else [])
+        if not runs:
+            return pd.DataFrame({'Value': self.labels[:0], 'Start': np.empty(0, dtype=np.int64),
+                                 'Length': np.empty(0, dtype=np.int64)})
+        values, starts, lengths = (np.concatenate(parts) for parts in zip(*runs))
+        return pd.DataFrame({'Value': self.labels[values], 'Start': starts, 'Length': lengths})
+
+    def longest(self):
+        """Longest run of each value.
+
+        Returns:
+            pd.Series: Longest run length, indexed by value.
+        """
+        longest = self._longest.copy()
+        if self._open is not None:
+            value, _, length = self._open
+            longest[value] = max(longest[value], length)
+        return pd.Series(longest, index=pd.Index(self.labels), name='Longest')
+
+    def gaps(self, value):
+        """Distribution of the rolls between consecutive occurrences of a value.
+
+        For an event, gaps(True) counts the rolls between two events.
+
+        Input:
+            value: A label, e.g. a face or True.
+
+        Returns:
+            pd.Series: Number of gaps of each length, indexed by length.
+
+        Raises:
+            IndexError: If value is not a label.
+        """
+        matches = np.flatnonzero(self.labels == value)
+        if len(matches) == 0:
+            raise IndexError(f'{value!r} is not a value of the sequence')
+        histogram = self._gaps.get(matches[0], np.zeros(0, dtype=np.int64))
+        lengths = np.flatnonzero(histogram)
+        return pd.Series(histogram[lengths], index=pd.Index(lengths, name='Gap'), name='Counts')
+
+    def autocorrelation(self):
+        """Sample autocorrelation of the sequence at lags 1 to max_lag.
+
+        Events count as 0 and 1, numeric faces by value and other faces by
+        their code.
+
+        Returns:
+            pd.Series: Autocorrelation indexed by lag (NaN if undefined).
+        """
+        n = self.length
+        total, squares = self._sums
+        lags = np.arange(1, self.max_lag + 1)
+        if n == 0:
+            return pd.Series(np.nan, index=pd.Index(lags, name='Lag'), name='Autocorrelation')
+        mean = total / n
+        variance = squares - n * mean * mean
+        head = np.concatenate([[0.0], np.cumsum(self._head)])
+        tail = np.concatenate([[0.0], np.cumsum(self._tail[::-1])])
+        k = np.minimum(lags, n)
+        # Expand sum (x_t - mean)(x_{t-k} - mean) over the pairs t >= k
+        covariance = (self._lag_products - mean * (total - head[np.minimum(k, len(head) - 1)])
+                      - mean * (total - tail[np.minimum(k, len(tail) - 1)])
+                      + (n - k) * mean * mean)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            acf = np.where(lags < n, covariance / variance, np.nan)
+        return pd.Series(acf, index=pd.Index(lags, name='Lag'), name='Autocorrelation')
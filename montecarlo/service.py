@@ -0,0 +1,337 @@
+import argparse
+import asyncio
+import json
+from collections import OrderedDict
+import numpy as np
+from .aio import AsyncRunner
+from .game import Game
+from .online import OnlineAnalyzer
+from .storage import _make_die
+
+# Statistics a request can ask for, answered from an OnlineAnalyzer
+_STATISTICS = ('jackpot', 'face_counts', 'combo_count', 'permutation_count')
+
+# Longest HTTP request body accepted, in bytes
+_MAX_BODY = 1 << 20
+
+# Most dice, and rolls times dice, one draw may hold
+_MAX_DICE = 64
+_MAX_CELLS = 1 << 27
+
+
+def _faces_array(faces):
+    """Private function turning JSON faces of one type into an array.
+
+    Raises:
+        ValueError: If faces mix strings, numbers and booleans or hold
+            other values.
+    """
+    kinds = {type(face) for face in faces}
+    if not (kinds == {str} or kinds == {bool} or kinds <= {int, float}):
+        raise ValueError('faces must all be strings, all numbers or all booleans')
+    return np.array(faces)
+
+
+def _parse(request):
+    """Private function validating a request and giving it canonical keys.
+
+    Returns:
+        dict: faces, weights (dice x faces), rolls, seed and statistics, with
+        'dice' identifying the dice and 'key' the whole request.
+    """
+    if not isinstance(request, dict):
+        raise ValueError('Request must be a JSON object')
+    faces = request.get('faces')
+    weights = request.get('weights')
+    if not isinstance(faces, list) or not faces:
+        raise ValueError('faces must be a non-empty list')
+    face_array = _faces_array(faces)
+    n_dice = request.get('n_dice', 1)
+    if isinstance(n_dice, bool) or not isinstance(n_dice, int) or not 1 <= n_dice <= _MAX_DICE:
+        raise ValueError(f'n_dice must be an integer from 1 to {_MAX_DICE}')
+    if weights is None:
+        weights = [1.0] * len(faces)
+    try:
+        weights = np.asarray(weights, dtype=float)
+    except (TypeError, ValueError):
+        raise ValueError('weights must be numbers')
+    if weights.ndim == 1:
+        weights = np.tile(weights, (n_dice, 1))
+    if weights.ndim != 2 or weights.shape[1] != len(faces):
+        raise ValueError('weights must have one value per face, for each die')
+    if len(weights) > _MAX_DICE:
+        raise ValueError(f'At most {_MAX_DICE} dice can be rolled')
+    if (not np.isfinite(weights).all() or (weights < 0).any()
+            or (weights.sum(axis=1) <= 0).any()):
+        raise ValueError('weights must be finite and not negative, and each die needs a '
+                         'positive one')
+    rolls, seed = request.get('rolls'), request.get('seed')
+    if isinstance(rolls, bool) or not isinstance(rolls, int) or rolls < 1:
+        raise ValueError('rolls must be a positive integer')
+    if rolls * len(weights) > _MAX_CELLS:
+        raise ValueError(f'rolls times dice must be at most {_MAX_CELLS}')
+    if seed is not None and not isinstance(seed, int):
+        raise ValueError('seed must be an integer')
+    statistics = request.get('statistics', ['jackpot'])
+    unknown = set(statistics) - set(_STATISTICS)
+    if unknown:
+        raise ValueError(f'Unknown statistics {sorted(unknown)}, choose from {list(_STATISTICS)}')
+
+    dice = json.dumps([faces, weights.tolist()])
+    return {'faces': face_array, 'weights': weights, 'rolls': rolls, 'seed': seed,
+            'statistics': list(statistics), 'dice': dice,
+            'key': json.dumps([dice, rolls, seed, sorted(statistics)])}
+
+
+def _summarize(analyzer, statistics):
+    """Private function answering the requested statistics as JSON values."""
+    answer = {'rolls': analyzer.rolls}
+    for name in statistics:
+        if name == 'jackpot':
+            answer[name] = analyzer.jackpot()
+        elif name == 'face_counts':
+            answer[name] = analyzer.face_totals.tolist()
+        else:
+            rows, counts = analyzer._counted(name)
+            answer[name] = [{'faces': analyzer.faces[row].tolist(), 'count': int(count)}
+                            for row, count in zip(rows, counts)]
+    return answer
+
+
+def _simulate(faces, weights, jobs, seed):
+    """Private function playing one draw for several jobs on the same dice.
+
+    Input:
+        jobs (list): (rolls, statistics) of each job; each gets its own
+            consecutive slice of the draw.
+
+    Returns:
+        list: The answer of each job.
+    """
+    game = Game([_make_die(faces, w) for w in weights])
+    game.play(sum(rolls for rolls, _ in jobs), seed=seed)
+    answers, start = [], 0
+    for rolls, statistics in jobs:
+        analyzer = OnlineAnalyzer(game.faces, len(weights), counts=[
+            name for name in statistics if name in ('combo_count', 'permutation_count')])
+        analyzer.update(game.codes[start:start + rolls])
+        answers.append(_summarize(analyzer, statistics))
+        start += rolls
+    return answers
+
+
+class SimulationService():
+
+    def __init__(self, cache_size=128, batch_window=0.005, max_workers=None, max_pending=None):
+        """Initialize a local simulation service.
+
+        Requests name the faces, per-die weights, rolls, optional seed and
+        statistics. Unseeded requests for the same dice that arrive within
+        `batch_window` seconds share one batched draw, each getting its own
+        slice of it. Identical seeded requests share one computation while
+        it runs, and repeats are served from an LRU cache.
+
+        Input:
+            cache_size (int): Seeded answers kept for repeats.
+            batch_window (float): Seconds to gather compatible requests.
+            max_workers (int), max_pending (int): See AsyncRunner.
+        """
+        self.cache_size = cache_size
+        self.batch_window = batch_window
+        self.counters = {'requests': 0, 'draws': 0, 'cache_hits': 0, 'coalesced': 0}
+        self._runner = AsyncRunner(max_workers, max_pending)
+        self._cache = OrderedDict()
+        self._running = {}
+        self._batches = {}
+
+    async def handle(self, request):
+        """Answer one request.
+
+        Input:
+            request (dict): 'faces' (list), 'weights' (per face, or per die
+                and face), 'n_dice' (with per-face weights, default 1),
+                'rolls', 'seed' (optional) and 'statistics' (default
+                ['jackpot']).
+
+        Returns:
+            dict: 'rolls' and the value of each statistic.
+
+        Raises:
+            ValueError: If the request is invalid.
+        """
+        job = _parse(request)
+        self.counters['requests'] += 1
+        if job['seed'] is None:
+            return await self._join_batch(job)
+
+        key = job['key']
+        if key in self._cache:
+            self.counters['cache_hits'] += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if key in self._running:
+            self.counters['coalesced'] += 1
+            return (await asyncio.shield(self._running[key]))[0]
+
+        task = asyncio.ensure_future(self._draw(job['faces'], job['weights'],
+                                                [(job['rolls'], job['statistics'])], job['seed']))
+        self._running[key] = task
+        try:
+            answer = (await task)[0]
+        finally:
+            del self._running[key]
+        self._cache[key] = answer
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return answer
+
+    async def _join_batch(self, job):
+        """Private method adding an unseeded job to the open batch of its dice."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = job['dice']
+        batch = self._batches.get(key)
+        if batch is not None and (sum(queued['rolls'] for queued, _ in batch)
+                                  + job['rolls']) * len(job['weights']) > _MAX_CELLS:
+            # The batch is full: draw it now and open a new one
+            self._flush(key, batch)
+            batch = None
+        if batch is None:
+            batch = self._batches[key] = []
+            loop.call_later(self.batch_window, self._flush, key, batch)
+        else:
+            self.counters['coalesced'] += 1
+        batch.append((job, future))
+        return await future
+
+    def _flush(self, key, batch):
+        """Private method closing a batch and starting its draw, unless already done."""
+        if self._batches.get(key) is batch:
+            del self._batches[key]
+            asyncio.ensure_future(self._draw_batch(batch))
+
+    async def _draw_batch(self, batch):
+        """Private method playing one draw for a whole batch."""
+        job = batch[0][0]
+        try:
+            answers = await self._draw(job['faces'], job['weights'],
+                                       [(job['rolls'], job['statistics']) for job, _ in batch],
+                                       None)
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+        else:
+            for (_, future), answer in zip(batch, answers):
+                future.set_result(answer)
+
+    async def _draw(self, faces, weights, jobs, seed):
+        """Private method running one draw on the runner's threads."""
+        self.counters['draws'] += 1
+        return await self._runner.run(_simulate, faces, weights, jobs, seed)
+
+
+    async def serve(self, host='127.0.0.1', port=0, path=None):
+        """Serve requests over HTTP on a local TCP port or Unix socket.
+
+        POST /simulate takes a JSON request (see `handle`) and returns its
+        answer; GET /stats returns the service counters.
+
+        Input:
+            host (str): Interface to listen on.
+            port (int): TCP port (default = any free port).
+            path (str): Unix socket path, used instead of host and port.
+
+        Returns:
+            asyncio.Server: The running server.
+        """
+        if path is not None:
+            return await asyncio.start_unix_server(self._serve_client, path=path)
+        return await asyncio.start_server(self._serve_client, host, port)
+
+    async def _serve_client(self, reader, writer):
+        """Private method answering one HTTP request."""
+        try:
+            method, target, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1')
+                if line in ('\r\n', '\n', ''):
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            if length > _MAX_BODY:
+                raise ValueError('Request body is too large')
+            body = await reader.readexactly(length)
+
+            if method == 'GET' and target == '/stats':
+                status, answer = 200, self.counters
+            elif method == 'POST' and target == '/simulate':
+                status, answer = 200, await self.handle(json.loads(body))
+            else:
+                status, answer = 404, {'error': f'No route for {method} {target}'}
+        except (ValueError, TypeError, KeyError, asyncio.IncompleteReadError) as error:
+            status, answer = 400, {'error': str(error)}
+        except Exception as error:
+            status, answer = 500, {'error': f'{type(error).__name__}: {error}'}
+
+        payload = json.dumps(answer).encode()
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+                  500: 'Internal Server Error'}[status]
+        writer.write(f'HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n'
+                     f'Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n'.encode()
+                     + payload)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+async def request(payload, host='127.0.0.1', port=None, path=None, route='/simulate'):
+    """Send one request to a running service.
+
+    Input:
+        payload (dict): The request, or None for a GET.
+        host (str), port (int): TCP address of the service.
+        path (str): Unix socket path, used instead of host and port.
+        route (str): '/simulate' or '/stats'.
+
+    Returns:
+        dict: The answer.
+
+    Raises:
+        ValueError: If the service rejected the request.
+    """
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    body = b'' if payload is None else json.dumps(payload).encode()
+    method = 'GET' if payload is None else 'POST'
+    writer.write(f'{method} {route} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b'\r\n\r\n')
+    answer = json.loads(content)
+    if not head.startswith(b'HTTP/1.1 200'):
+        raise ValueError(answer.get('error', head.decode('latin-1')))
+    return answer
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve montecarlo simulations on localhost.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None, help='Unix socket path instead of TCP')
+    parser.add_argument('--cache-size', type=int, default=128)
+    args = parser.parse_args()
+
+    async def main():
+        server = await SimulationService(cache_size=args.cache_size).serve(args.host, args.port,
+                                                                            args.unix)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
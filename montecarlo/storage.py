@@ -0,0 +1,232 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from .die import Die
+from .game import Game, _code_dtype
+from .markov import MarkovDie
+
+# Leading bytes of each supported file format
+_MAGIC = {b'PK': 'npz', b'PAR1': 'parquet', b'ARROW1': 'arrow'}
+_SUFFIXES = {'.npz': 'npz', '.parquet': 'parquet', '.pq': 'parquet',
+             '.arrow': 'arrow', '.feather': 'arrow'}
+# Version 2 stores the npz codes one array per die
+_FORMAT_VERSION = 2
+
+
+def _import_pyarrow():
+    """Import pyarrow, which is only needed for Parquet and Arrow files."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet and Arrow formats require pyarrow "
+                          "(pip install 'montecarlo[arrow]')")
+    return pyarrow
+
+
+def _tolist(array):
+    """Convert an optional array to nested lists for JSON (None stays None)."""
+    return None if array is None else array.tolist()
+
+
+def _write_atomic(path, write):
+    """Write a file under a temporary name, then rename it into place.
+
+    The temporary name keeps the suffix so numpy doesn't append one.
+    """
+    head, tail = os.path.split(path)
+    tmp = os.path.join(head, f'.tmp-{os.getpid()}-{tail}')
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _write_json(path, data):
+    """Write a small JSON file atomically."""
+    def write(tmp):
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+    _write_atomic(path, write)
+
+
+def _detect_format(path):
+    """Detect the format of a saved game from its leading bytes."""
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    for magic, form in _MAGIC.items():
+        if head.startswith(magic):
+            return form
+    raise ValueError(f'{path} is not a saved game')
+
+
+def save_game(game, path, format=None):
+    """Save a played game to npz, Parquet or Arrow.
+
+    Input:
+        game (Game): A played game.
+        path (str): File to write.
+        format (str): 'npz', 'parquet' or 'arrow' (default = from suffix).
+
+    Raises:
+        ValueError: If the game was not played or the format is invalid.
+        TypeError: If the faces can't be stored in the format.
+    """
+    codes = game.codes
+    if codes is None:
+        raise ValueError("Play the game first.")
+    if format is None:
+        format = _SUFFIXES.get(os.path.splitext(str(path))[1].lower(), 'npz')
+
+    if format == 'npz':
+        if game.faces.dtype == object:
+            raise TypeError("Faces of object dtype can't be stored in npz, "
+                            "use 'parquet' or 'arrow'")
+        # One array per die, so a subset of dice is read without the rest
+        extra = {f'codes_{i}': codes[:, i] for i in range(codes.shape[1])}
+        transitions = game._transitions()
+        if transitions is not None:
+            extra['transitions'] = transitions
+        # Write through a file object so numpy keeps the given name
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, rolls=len(codes), faces=game.faces,
+                                weights=game._weights(),
+                                version=_FORMAT_VERSION, **extra)
+    elif format in ('parquet', 'arrow'):
+        if format == 'arrow' and game.faces.dtype == object:
+            kinds = {type(face) for face in game.faces}
+            if len(kinds) > 1 and not kinds <= {int, float}:
+                raise TypeError("Faces of mixed types can't be stored as an Arrow "
+                                "dictionary, use 'parquet'")
+        pa = _import_pyarrow()
+        # Arrow keeps faces as dictionaries; Parquet stores the codes and
+        # dictionary-encodes its pages itself, so numeric faces read back fast
+        table = _to_table(pa, game, codes, dictionary=format == 'arrow')
+        if format == 'parquet':
+            pa.parquet.write_table(table, path)
+        else:
+            with pa.OSFile(str(path), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+    else:
+        raise ValueError('Format must be \'npz\', \'parquet\' or \'arrow\'')
+
+
+def _face_dictionary(pa, faces):
+    """Convert faces to the Arrow array used as the dictionary of code columns."""
+    return pa.array(faces.tolist() if faces.dtype == object else faces)
+
+
+def _to_table(pa, game, codes, dictionary):
+    """Build a table with one column of codes per die."""
+    columns = [np.ascontiguousarray(codes[:, i]) for i in range(codes.shape[1])]
+    if dictionary:
+        faces = _face_dictionary(pa, game.faces)
+        columns = [pa.DictionaryArray.from_arrays(column, faces) for column in columns]
+    metadata = {'faces': game.faces.tolist(),
+                'faces_dtype': game.faces.dtype.str,
+                'weights': game._weights().tolist(),
+                'transitions': _tolist(game._transitions()),
+                'version': _FORMAT_VERSION}
+    return pa.table(columns, names=[str(i) for i in range(codes.shape[1])],
+                    metadata={'montecarlo': json.dumps(metadata)})
+
+
+def load_game(path, dice=None):
+    """Load a game written by `save_game`.
+
+    Input:
+        path (str): File to read (format is detected).
+        dice (list): Positions of the dice to load (default = all).
+
+    Returns:
+        Game: The saved game with its coded results.
+    """
+    format = _detect_format(path)
+    if format == 'npz':
+        with np.load(path) as data:
+            faces = data['faces']
+            weights = data['weights']
+            transitions = data['transitions'] if 'transitions' in data.files else None
+            positions = np.arange(len(weights))
+            if dice is not None:
+                positions = positions[dice]
+                weights = weights[dice]
+            if 'codes' in data.files:
+                # Version 1 files hold one codes matrix
+                codes = data['codes'][:, positions]
+            else:
+                # Only the arrays of the requested dice are decompressed
+                codes = np.empty((int(data['rolls']), len(positions)),
+                                 dtype=_code_dtype(len(faces)))
+                for j, i in enumerate(positions):
+                    codes[:, j] = data[f'codes_{i}']
+    else:
+        pa = _import_pyarrow()
+        columns = None if dice is None else [str(i) for i in dice]
+        if format == 'parquet':
+            table = pa.parquet.read_table(path, columns=columns)
+            metadata = table.schema.metadata
+        else:
+            # Memory-map the file so only the selected columns are read;
+            # their codes are still copied into one matrix below
+            reader = pa.ipc.open_file(pa.memory_map(str(path)))
+            table = reader.read_all()
+            metadata = table.schema.metadata
+            if columns is not None:
+                table = table.select(columns)
+        metadata = json.loads(metadata[b'montecarlo'])
+        faces = np.array(metadata['faces'], dtype=np.dtype(metadata['faces_dtype']))
+        weights = np.array(metadata['weights'])
+        transitions = metadata.get('transitions')
+        if transitions is not None:
+            transitions = np.array(transitions, dtype=float)
+        if dice is not None:
+            weights = weights[dice]
+        codes = _from_table(table, faces)
+
+    if transitions is not None and dice is not None:
+        transitions = transitions[dice]
+    game = Game(_make_dice(faces, weights, transitions))
+    game._set_codes(codes.astype(_code_dtype(len(faces)), copy=False))
+    return game
+
+
+def _from_table(table, faces):
+    """Decode the dictionary-encoded columns of a table into a codes matrix."""
+    face_index = pd.Index(faces)
+    codes = np.empty((table.num_rows, table.num_columns), dtype=_code_dtype(len(faces)))
+    for i, column in enumerate(table.columns):
+        start = 0
+        for chunk in column.chunks:
+            if hasattr(chunk, 'indices'):
+                values = chunk.indices.to_numpy()
+                # Map the dictionary back onto the faces unless it already matches
+                lookup = face_index.get_indexer(chunk.dictionary.to_numpy(zero_copy_only=False))
+                if not np.array_equal(lookup, np.arange(len(faces))):
+                    values = lookup[values]
+            else:
+                values = chunk.to_numpy()
+            codes[start:start + len(chunk), i] = values
+            start += len(chunk)
+    return codes
+
+
+def _make_die(faces, weights, transitions=None):
+    """Build a die with the given faces and weights.
+
+    Nonzero transitions (faces x faces) make it a MarkovDie.
+    """
+    if transitions is not None and transitions.any():
+        die = MarkovDie(faces, transitions)
+    else:
+        die = Die(faces)
+    die._set_weights(weights)
+    return die
+
+
+def _make_dice(faces, weights, transitions=None):
+    """Build the dice of a game from its weights and optional transitions."""
+    if transitions is None:
+        return [_make_die(faces, w) for w in weights]
+    return [_make_die(faces, w, t) for w, t in zip(weights, transitions)]
@@ -1,9 +1,28 @@
 import unittest
+import asyncio
+import importlib.util
+import math
+import multiprocessing
+import os
+import tempfile
+from unittest import mock
 import numpy as np
 import pandas as pd
 from montecarlo.die import Die
+from montecarlo.markov import MarkovDie
+from montecarlo.fenwick import FenwickTree
 from montecarlo.game import Game
 from montecarlo.analyzer import Analyzer
+from montecarlo.experiment import Experiment
+from montecarlo.online import OnlineAnalyzer
+from montecarlo.runs import RunTracker
+from montecarlo.progress import CancelToken
+from montecarlo.service import SimulationService, request
+from montecarlo.aio import AsyncRunner
+from montecarlo import analyzer as analyzer_module
+from montecarlo import experiment as experiment_module
+from montecarlo import backends, distributed, service as service_module
+from montecarlo.events import count, die, jackpot
 
 
 class DieTestSuite(unittest.TestCase):
@@ -106,8 +125,239 @@ class DieTestSuite(unittest.TestCase):
         self.assertEqual(df.shape, (3, 1))
         self.assertTrue(np.array_equal(df.index.values, faces))
         self.assertTrue(np.array_equal(df['weights'].values, [0.4, 1.0, 1.0]))
+
+
+    def test_11_dynamic_roll(self):
+        """Test a dynamic die follows weight changes between rolls."""
+        die = Die(np.arange(1000), dynamic=True)
+        for face in range(999):
+            die.change_weight(face, 0)
+        self.assertEqual(set(die.roll(50)), {999})
+
+        die.change_weight(999, 0)
+        die.change_weight(10, "2")
+        self.assertEqual(set(die.roll(50)), {10})
+        self.assertEqual(die.get_data().loc[10, 'weights'], 2.0)
+
+
+    def test_12_fenwick_sample(self):
+        """Test the Fenwick tree matches a search of the cumulative weights."""
+        weights = np.random.rand(100)
+        weights[::7] = 0
+        tree = FenwickTree(weights)
+        tree.set(3, 5.0)
+        weights[3] = 5.0
+
+        targets = np.random.rand(1000) * tree.total()
+        expected = np.searchsorted(np.cumsum(weights), targets, side='right')
+        self.assertAlmostEqual(tree.total(), weights.sum())
+        self.assertTrue(np.array_equal(tree.sample(targets), expected))
+
+
+    def test_13_change_weight_negative(self):
+        """Test changing weight to a negative value."""
+        die = Die(np.array([1, 2, 3]))
+        with self.assertRaises(ValueError):
+            die.change_weight(1, -1)
+
+
+    def test_14_fingerprint(self):
+        """Test the face-set fingerprint ignores order and string width."""
+        die1 = Die(np.array(['a', 'b', 'c']))
+        die2 = Die(np.array(['c', 'a', 'b'], dtype='<U8'))
+        die3 = Die(np.array(['a', 'b', 'd']))
+
+        self.assertEqual(die1.fingerprint, die2.fingerprint)
+        self.assertNotEqual(die1.fingerprint, die3.fingerprint)
+        self.assertEqual(Die(np.array([1, 2, 3])).fingerprint,
+                         Die(np.array([3.0, 2.0, 1.0])).fingerprint)
+
+    def test_15_fair_dice_from_random_bits(self):
+        """Test fair dice draw codes from random bits until a weight changes."""
+        for n_faces in (2, 6, 8, 16):
+            die1 = Die(np.arange(n_faces))
+            self.assertTrue(die1._uniform())
+            codes = die1._roll_codes(100000, np.random.default_rng(1))
+            frequencies = np.bincount(codes, minlength=n_faces) / 100000
+            self.assertTrue(np.allclose(frequencies, 1 / n_faces, atol=0.01))
+            self.assertTrue(set(die1.roll(50)) <= set(range(n_faces)))
+
+        coin = Die(np.array(['H', 'T']))
+        coin.change_weight('T', 3)
+        self.assertFalse(coin._uniform())
+        self.assertFalse(Die(np.array([1, 2]), dynamic=True)._uniform())
+        self.assertGreater(coin.roll(10000).count('T'), 7000)
+
+    def test_16_buffered_rolls(self):
+        """Test buffered dice serve small rolls drawn ahead, dropped on a weight change."""
+        die0 = Die(np.array([1, 2, 3, 4, 5, 6]))
+        np.random.seed(0)
+        first = die0.roll()
+        np.random.seed(0)
+        self.assertEqual(die0.roll(), first)
+        with self.assertRaises(ValueError):
+            Die(np.array([1, 2]), dynamic=True, buffered=True)
+
+        die1 = Die(np.array([1, 2, 3]), buffered=True)
+        die1.change_weight(3, 2)
+        np.random.seed(5)
+        rolls = [die1.roll()[0] for _ in range(1500)] + die1.roll(4)
+        np.random.seed(5)
+        die1.reset()
+        self.assertEqual([die1.roll()[0] for _ in range(1500)] + die1.roll(4), rolls)
+        np.random.seed(5)
+        self.assertEqual(die1.roll(1000), rolls[:1000])
+        self.assertAlmostEqual(rolls.count(3) / len(rolls), 0.5, delta=0.05)
+
+        self.assertIsNotNone(die1._buffer)
+        die1.change_weight(1, 0)
+        die1.change_weight(2, 0)
+        self.assertEqual(set(die1.roll(10)), {3})
+
+    def test_17_invalid_weights_raise(self):
+        """Test dice with all-zero, NaN or infinite weights refuse to roll."""
+        for weights in ([0, 0, 0], [np.nan, 1, 1], [np.inf, 1, 1], [np.inf] * 3):
+            for dynamic in (False, True):
+                die1 = Die(np.array([1, 2, 3]), dynamic=dynamic)
+                with np.errstate(invalid='ignore'):
+                    die1._set_weights(weights)
+                with self.assertRaises(ValueError):
+                    die1.roll()
+                with self.assertRaises(ValueError):
+                    Game([die1, Die(np.array([1, 2, 3]))]).play(10)
+        with self.assertRaises(ValueError):
+            MarkovDie(np.array([1, 2]), np.array([[1, np.nan], [1, 1]]))
+
+    def test_18_dataframe_read_only(self):
+        """Test edits to the dataframe property fail loudly instead of being lost."""
+        die1 = Die(np.array([1, 2, 3]))
+        frame = die1.dataframe
+        with self.assertRaises(ValueError):
+            frame.loc[2, 'weights'] = 5
+        die1.change_weight(2, 5)
+        self.assertEqual(die1.dataframe.loc[2, 'weights'], 5)
+        data = die1.get_data()
+        data.loc[2, 'weights'] = 1
+        self.assertEqual(die1.dataframe.loc[2, 'weights'], 5)
         
         
+class MarkovDieTestSuite(unittest.TestCase):
+
+    def test_01_init_invalid(self):
+        """Test transitions must be a square matrix with a positive weight per row."""
+        faces = np.array([1, 2, 3])
+        with self.assertRaises(TypeError):
+            MarkovDie(faces, [[1, 0, 0]] * 3)
+        with self.assertRaises(ValueError):
+            MarkovDie(faces, np.ones((2, 3)))
+        with self.assertRaises(ValueError):
+            MarkovDie(faces, np.array([[1, 1, 1], [0, 0, 0], [1, 1, 1]]))
+        die1 = MarkovDie(faces, np.eye(3))
+        with self.assertRaises(ValueError):
+            die1.change_transition(1, 1, 0)
+        with self.assertRaises(IndexError):
+            die1.change_transition(1, 4, 1)
+
+    def test_02_chains_continue_across_blocks(self):
+        """Test each Markov die in a game is one chain over all rolls."""
+        cycle = MarkovDie(np.array([1, 2, 3]), np.array([[0, 1, 0], [0, 0, 1], [1, 0, 0]]))
+        game1 = Game([cycle, cycle])
+        game1.play(150000, seed=4)
+        steps = np.diff(game1.codes.astype(int), axis=0) % 3
+        self.assertTrue((steps == 1).all())
+
+        sticky = MarkovDie(np.array(['H', 'T']), np.array([[9, 1], [1, 9]]))
+        game2 = Game([sticky, Die(np.array(['H', 'T']))])
+        game2.play(100000, seed=5)
+        stays = (game2.codes[1:] == game2.codes[:-1]).mean(axis=0)
+        self.assertAlmostEqual(stays[0], 0.9, delta=0.01)
+        self.assertAlmostEqual(stays[1], 0.5, delta=0.01)
+        self.assertEqual(Analyzer(game2).combo_count()['Counts'].sum(), 100000)
+
+        with self.assertRaises(ValueError):
+            game2.play(10, threads=2)
+
+    def test_03_roll_continues_chain(self):
+        """Test rolling the die on its own continues from its last face."""
+        cycle = MarkovDie(np.array(['a', 'b']), np.array([[0, 1], [1, 0]]))
+        first = cycle.roll(3)
+        self.assertEqual(cycle.roll(2), first[1:])
+        cycle.reset()
+        self.assertEqual(len(cycle.roll(5)), 5)
+
+    def test_04_persisted_as_markov_dice(self):
+        """Test saving, checkpoints and sharded runs keep the transitions."""
+        cycle = MarkovDie(np.array([1, 2, 3]), np.array([[0, 1, 0], [0, 0, 1], [1, 0, 0]]))
+        game1 = Game([cycle, Die(np.array([3, 2, 1]))])
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ('game.npz', 'game.arrow'):
+                path = os.path.join(tmp, name)
+                game1.play(100, seed=1)
+                game1.save(path)
+                game2 = Game.load(path)
+                self.assertIsInstance(game2.dice[0], MarkovDie)
+                self.assertNotIsInstance(game2.dice[1], MarkovDie)
+                self.assertTrue(np.array_equal(game2.dice[0]._transitions, cycle._transitions))
+
+            checkpoint = os.path.join(tmp, 'play.json')
+            game1.play(100, seed=1, checkpoint=checkpoint)
+            other = MarkovDie(np.array([1, 2, 3]), np.array([[0, 0, 1], [1, 0, 0], [0, 1, 0]]))
+            with self.assertRaises(ValueError):
+                Game([other, Die(np.array([1, 2, 3]))]).resume(checkpoint)
+
+            queue = os.path.join(tmp, 'queue')
+            distributed.submit(game1, 300, queue, shards=3, seed=2)
+            distributed.work(queue)
+            _, played = distributed.reduce(queue)
+        self.assertIsInstance(played.dice[0], MarkovDie)
+        steps = np.diff(played.codes[:100, 0].astype(int)) % 3
+        self.assertTrue((steps == 1).all())
+
+
+class FitTestSuite(unittest.TestCase):
+
+    def test_01_fit_die_in_chunks(self):
+        """Test Die.fit estimates weights the same from an array or its chunks."""
+        rng = np.random.default_rng(6)
+        rolls = rng.choice(np.array([1, 2, 3, 4]), size=200000, p=[0.1, 0.2, 0.3, 0.4])
+        die1 = Die.fit(rolls)
+        die2 = Die.fit(iter(np.array_split(rolls, 7)), faces=np.array([1, 2, 3, 4]))
+        self.assertTrue(die1.estimate.equals(die2.estimate))
+        self.assertTrue(np.allclose(die1.estimate['Weight'], [0.1, 0.2, 0.3, 0.4], atol=0.005))
+        self.assertTrue((die1.estimate['Lower'] < die1.estimate['Weight']).all())
+        self.assertTrue((die1.estimate['Upper'] > die1.estimate['Weight']).all())
+        self.assertEqual(Die.fit(['a', 'b', 'b', 'c'], prior=0).estimate['Weight']['b'], 0.5)
+        with self.assertRaises(ValueError):
+            Die.fit(rolls, faces=np.array([1, 2, 3]))
+        with self.assertRaises(ValueError):
+            Die.fit(rolls, prior=-1)
+
+    def test_02_fit_game(self):
+        """Test Game.fit gives a fitted die per column, also from packed results."""
+        die1 = Die(np.array(['H', 'T']))
+        die1.change_weight('T', 3)
+        game = Game([die1, Die(np.array(['H', 'T']))])
+        game.play(100000, seed=7, packed=True)
+        fitted = Game.fit(game)
+        self.assertAlmostEqual(fitted.dice[0].estimate['Weight']['T'], 0.75, delta=0.01)
+        self.assertAlmostEqual(fitted.dice[1].estimate['Weight']['T'], 0.5, delta=0.01)
+        from_frame = Game.fit(game.show_results())
+        self.assertTrue(from_frame.dice[1].estimate.equals(fitted.dice[1].estimate))
+
+    def test_03_fit_mixture(self):
+        """Test EM recovers two dice from sessions of unlabeled rolls."""
+        rng = np.random.default_rng(8)
+        loaded = rng.random(100000) < 0.3
+        sessions = np.where(loaded[:, None], rng.choice(4, (100000, 5), p=[0.7, 0.1, 0.1, 0.1]),
+                            rng.choice(4, (100000, 5), p=[0.1, 0.1, 0.1, 0.7]))
+        dice, shares = Die.fit_mixture(sessions, 2, seed=1)
+        self.assertTrue(np.allclose(shares, [0.7, 0.3], atol=0.01))
+        self.assertTrue(np.allclose(dice[0].estimate['Weight'], [0.1, 0.1, 0.1, 0.7], atol=0.01))
+        self.assertTrue(np.allclose(dice[1].estimate['Weight'], [0.7, 0.1, 0.1, 0.1], atol=0.01))
+        with self.assertRaises(ValueError):
+            Die.fit_mixture(sessions, 0)
+
+
 class GameTestSuite(unittest.TestCase):
     
     def test_01_init(self):
@@ -126,6 +376,10 @@ class GameTestSuite(unittest.TestCase):
         
         with self.assertRaises(ValueError):
             Game([die1, die2])
+        
+        # Same face count but different faces
+        with self.assertRaises(ValueError):
+            Game([die1, Die(np.array([1, 2, 4]))])
     
     
     def test_03_invalid_die_type(self):
@@ -250,7 +504,367 @@ class GameTestSuite(unittest.TestCase):
         for die in results.columns:
             self.assertTrue(all(face in vaild_faces for face in results[die]))
 
-            
+
+
+    def test_12_save_load_npz(self):
+        """Test save() and load() round trip through npz."""
+        die1 = Die(np.array([1, 2, 3, 4, 5, 6]))
+        die1.change_weight(6, 5)
+        die2 = Die(np.array([6, 5, 4, 3, 2, 1]))
+        game1 = Game([die1, die2])
+        game1.play(50)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'game.npz')
+            game1.save(path)
+            game2 = Game.load(path)
+            single = Game.load(path, dice=[-1])
+            with np.load(path) as data:
+                members = sorted(name for name in data.files if name.startswith('codes'))
+
+            # Files of version 1 held one codes matrix
+            old_path = os.path.join(tmp, 'old.npz')
+            np.savez_compressed(old_path, codes=game1.codes, faces=game1.faces,
+                                weights=game1._weights(), version=1)
+            old = Game.load(old_path, dice=[1])
+
+        # Verify results and weights survive
+        self.assertTrue(game2.results.equals(game1.results))
+        self.assertEqual(game2.dice[0].get_data().loc[6, 'weights'], 5.0)
+        self.assertListEqual(members, ['codes_0', 'codes_1'])
+        self.assertTrue(np.array_equal(single.codes[:, 0], game1.codes[:, 1]))
+        self.assertTrue(np.array_equal(old.codes, single.codes))
+
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow not installed')
+    def test_13_save_load_parquet_arrow(self):
+        """Test save() and load() round trip through Parquet and Arrow."""
+        die1 = Die(np.array(['a', 'b', 'c']))
+        game1 = Game([die1, die1, die1])
+        game1.play(50)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ('game.parquet', 'game.arrow'):
+                path = os.path.join(tmp, name)
+                game1.save(path)
+                game2 = Game.load(path)
+                self.assertTrue(np.array_equal(game2.codes, game1.codes))
+                self.assertTrue(np.array_equal(game2.faces, game1.faces))
+
+            # Mixed faces fit Parquet, but not an Arrow dictionary
+            mixed = Game([Die(np.array([1, 'a'], dtype=object))])
+            mixed.play(10)
+            mixed.save(os.path.join(tmp, 'mixed.parquet'))
+            loaded = Game.load(os.path.join(tmp, 'mixed.parquet'))
+            self.assertListEqual(loaded.results[0].tolist(), mixed.results[0].tolist())
+            with self.assertRaises(TypeError):
+                mixed.save(os.path.join(tmp, 'mixed.arrow'))
+
+
+    def test_14_save_invalid(self):
+        """Test save() with no game played or an invalid format."""
+        die1 = Die(np.array([1, 2, 3]))
+        game1 = Game([die1])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'game.npz')
+            with self.assertRaises(ValueError):
+                game1.save(path)
+
+            game1.play(3)
+            with self.assertRaises(ValueError):
+                game1.save(path, format='csv')
+
+
+    def test_17_large_permuted_faces(self):
+        """Test a game of large dice listing their faces in different orders."""
+        faces = np.arange(100000)
+        die1 = Die(faces)
+        die2 = Die(faces[::-1].copy())
+        die2.change_weight(0, 0)
+        game1 = Game([die1, die2])
+        game1.play(1000)
+
+        # Codes refer to the first die's faces
+        self.assertTrue(np.array_equal(game1.faces[game1.codes], game1.results.to_numpy()))
+        self.assertNotIn(0, game1.results[1].values)
+
+
+    def test_18_checkpoint_resume(self):
+        """Test a play interrupted after a checkpoint resumes bit-identically."""
+        die1 = Die(np.array([1, 2, 3, 4, 5, 6]))
+        die1.change_weight(3, 4)
+        reference = Game([die1, die1])
+        reference.play(200000, seed=4)
+
+        # Preempt the play while it draws its third block
+        sample = Game._sample
+        calls = []
+        def preempted(game, rolls, rng, *chain):
+            calls.append(rolls)
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            return sample(game, rolls, rng, *chain)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'play.ckpt')
+            with mock.patch.object(Game, '_sample', preempted):
+                with self.assertRaises(KeyboardInterrupt):
+                    Game([die1, die1]).play(200000, seed=4, checkpoint=path, checkpoint_every=0)
+
+            resumed = Game([die1, die1])
+            resumed.resume(path)
+            self.assertTrue(np.array_equal(resumed.codes, reference.codes))
+
+            # A game with other weights can't resume it
+            with self.assertRaises(ValueError):
+                Game([Die(np.array([1, 2, 3, 4, 5, 6]))] * 2).resume(path)
+
+
+    def test_19_play_into_analyzer(self):
+        """Test play() can feed an OnlineAnalyzer instead of keeping results."""
+        faces = np.array([1, 2, 3])
+        game1 = Game([Die(faces), Die(faces)])
+        game2 = Game([Die(faces), Die(faces)])
+        online = game1.play(1000, seed=2, analyzer=OnlineAnalyzer(faces, 2))
+        game2.play(1000, seed=2)
+
+        self.assertIsNone(game1.results)
+        self.assertEqual(online.rolls, 1000)
+        self.assertEqual(online.jackpot(), Analyzer(game2).jackpot())
+
+
+    def test_20_threaded_play(self):
+        """Test threaded play is deterministic for a seed and thread count."""
+        die1 = Die(np.array([1, 2, 3, 4, 5, 6]))
+        game1 = Game([die1, die1, die1])
+        game2 = Game([die1, die1, die1])
+        game1.play(100000, seed=7, threads=3)
+        game2.play(100000, seed=7, threads=3)
+        self.assertTrue(np.array_equal(game1.codes, game2.codes))
+
+        online = game2.play(100000, seed=7, threads=3, analyzer=OnlineAnalyzer(die1._faces, 3))
+        self.assertEqual(online.jackpot(), Analyzer(game1).jackpot())
+        with self.assertRaises(ValueError):
+            game1.play(10, threads=0)
+
+
+    def test_21_play_until(self):
+        """Test play_until() stops at the last needed hit and keeps the hits."""
+        die1 = Die(np.array([1, 2, 3, 4, 5, 6]))
+        game1 = Game([die1, die1, die1])
+        stats = game1.play_until('jackpot', 50, 10 ** 6, seed=3)
+
+        self.assertEqual(stats['hits'], 50)
+        self.assertEqual(len(game1.codes), 50)
+        self.assertEqual(Analyzer(game1).jackpot(), 50)
+        self.assertAlmostEqual(stats['mean_wait'] * 50, stats['rolls'])
+
+        # Not enough rolls for the hits: report what was found
+        sixes = lambda codes: (codes == 5).all(axis=1)
+        stats = game1.play_until(sixes, 10, 20, keep=False, seed=3)
+        self.assertLess(stats['hits'], 10)
+        self.assertEqual(stats['rolls'], 20)
+        with self.assertRaises(ValueError):
+            game1.play_until(lambda codes: codes, 1, 10)
+
+
+    def test_22_plan_and_memory_limit(self):
+        """Test plan() bounds outputs and play() streams when results don't fit."""
+        die1 = Die(np.array([1, 2, 3, 4, 5, 6]))
+        game1 = Game([die1, die1, die1])
+        plan = game1.plan(10 ** 6, ['jackpot', 'combo_count', 'permutation_count'])
+        self.assertEqual(plan['Step'].tolist(), ['play', 'jackpot', 'combo_count', 'permutation_count'])
+        self.assertEqual(plan['OutputRows'].tolist(), [10 ** 6, 1, 56, 216])
+        self.assertTrue((plan['PeakBytes'] >= 3 * 10 ** 6).all())
+        with self.assertRaises(ValueError):
+            game1.plan(10, ['median'])
+
+        # 12 MB of results don't fit, streaming them does
+        online = game1.play(4 * 10 ** 6, seed=1, memory_limit=12 * 10 ** 6)
+        self.assertIsInstance(online, OnlineAnalyzer)
+        self.assertEqual(online.rolls, 4 * 10 ** 6)
+        self.assertIsNone(game1.codes)
+        self.assertIsNone(game1.play(1000, seed=1, memory_limit=12 * 10 ** 6))
+        self.assertEqual(len(game1.codes), 1000)
+        with self.assertRaises(ValueError):
+            game1.play(10 ** 6, memory_limit=5000)
+
+        # Many dice shrink the blocks instead of failing
+        game2 = Game([die1] * 500)
+        progress = []
+        self.assertIsNone(game2.play(1000, seed=1, memory_limit=10 ** 6, progress=progress.append))
+        self.assertEqual(game2.codes.shape, (1000, 500))
+        self.assertGreater(len(progress), 1)
+
+        # A resumed play keeps the smaller blocks
+        token = CancelToken()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'play.json')
+            game3 = Game([die1] * 500)
+            game3.play(1000, seed=1, memory_limit=10 ** 6, checkpoint=path,
+                       progress=lambda p: token.cancel(), cancel=token)
+            self.assertLess(len(game3.codes), 1000)
+            game3.resume(path)
+        self.assertTrue(np.array_equal(game3.codes, game2.codes))
+        online = game1.play(10 ** 5, seed=1, memory_limit=10 ** 5)
+        self.assertEqual(online.rolls, 10 ** 5)
+        self.assertLess(game1._block, 1000)
+
+
+    def test_23_progress_and_cancel(self):
+        """Test progress is reported per block and a cancelled play keeps its rolls."""
+        die1 = Die(np.array([1, 2, 3, 4, 5, 6]))
+        reference = Game([die1, die1])
+        reference.play(300000, seed=5)
+
+        game1 = Game([die1, die1])
+        token = CancelToken()
+        reports = []
+        def progress(report):
+            reports.append(report)
+            if report.done >= 100000:
+                token.cancel()
+        game1.play(300000, seed=5, progress=progress, cancel=token)
+        self.assertEqual([report.done for report in reports], [65536, 131072])
+        self.assertTrue(np.array_equal(game1.codes, reference.codes[:131072]))
+
+        # Leaving the iterator early keeps the blocks drawn so far
+        for report in game1.play_iter(300000, seed=5):
+            if report.done >= 65536:
+                break
+        self.assertEqual(len(game1.codes), 65536)
+        self.assertGreater(report.throughput, 0)
+
+
+    def test_24_stacked_sampling_matches_each_die(self):
+        """Test one search over all dice gives the rolls of rolling each die in turn."""
+        fair = Die(np.array([1, 2, 3, 4, 5, 6]))
+        loaded = Die(np.array([1, 2, 3, 4, 5, 6]))
+        loaded.change_weight(6, 5.0)
+        loaded.change_weight(2, 0.0)
+        reordered = Die(np.array([6, 5, 4, 3, 2, 1]))
+        reordered.change_weight(4, 3.0)
+        game1 = Game([fair, loaded, reordered, loaded])
+        game1.play(5000, seed=9)
+
+        rng = np.random.default_rng(9)
+        for i, die1 in enumerate(game1.dice):
+            faces = die1._faces[die1._roll_codes(5000, rng)]
+            self.assertTrue(np.array_equal(game1.faces[game1.codes[:, i]], faces))
+
+
+    def test_25_packed_results(self):
+        """Test packed results unpack to the plain ones and analyze the same."""
+        coin = Die(np.array(['H', 'T']))
+        plain = Game([coin, coin, coin])
+        plain.play(100003, seed=2)
+        game1 = Game([coin, coin, coin])
+        game1.play(100003, seed=2, packed=True)
+
+        self.assertEqual(game1.packed.nbytes * 8, -(-100003 // 64) * 64 * 3)
+        self.assertTrue(np.array_equal(game1.codes, plain.codes))
+        self.assertEqual(Analyzer(game1).jackpot(), Analyzer(plain).jackpot())
+        pd.testing.assert_frame_equal(Analyzer(game1).combo_count(),
+                                      Analyzer(plain).combo_count())
+
+        # Packing is undone by unpack or by taking the results frame
+        game1.unpack()
+        self.assertIsNone(game1.packed)
+        game1.pack()
+        game1.results
+        self.assertIsNone(game1.packed)
+        with self.assertRaises(ValueError):
+            Game([coin]).pack()
+
+
+    def test_26_faces_compared_exactly(self):
+        """Test dice whose faces only hash alike are rejected, equal ones of any dtype accepted."""
+        with self.assertRaises(ValueError):
+            Game([Die(np.array(['a', 'b', 'c'])), Die(np.array([b'a', b'b', b'c']))])
+        with self.assertRaises(ValueError):
+            Game([Die(np.array([2 ** 53, 5])), Die(np.array([2 ** 53 + 1, 5]))])
+        game1 = Game([Die(np.array([1, 2, 3])), Die(np.array([3, 2, 1], dtype=object))])
+        game1.play(100, seed=1)
+        self.assertTrue(set(game1.results[1]) <= {1, 2, 3})
+
+
+    def test_27_unseeded_play_follows_numpy_seed(self):
+        """Test plays without a seed repeat after numpy.random.seed."""
+        die1 = Die(np.array([1, 2, 3, 4, 5, 6]))
+        die1.change_weight(6, 3)
+        game1 = Game([die1, die1])
+        runs = []
+        for _ in range(2):
+            np.random.seed(11)
+            game1.play(1000)
+            plain = game1.codes.copy()
+            game1.play(1000, threads=2)
+            runs.append((plain, game1.codes.copy(), game1.play_until('jackpot', 5, 10 ** 5)))
+        self.assertTrue(np.array_equal(runs[0][0], runs[1][0]))
+        self.assertTrue(np.array_equal(runs[0][1], runs[1][1]))
+        pd.testing.assert_series_equal(runs[0][2], runs[1][2])
+
+
+    def test_28_codes_cached_until_results_edited(self):
+        """Test reading results doesn't re-encode the codes until the frame is edited."""
+        die1 = Die(np.array(['a', 'b', 'c']))
+        game1 = Game([die1, die1])
+        game1.play(100, seed=1)
+        game1.results
+        codes = game1.codes
+        self.assertIs(game1.codes, codes)
+        self.assertTrue(np.shares_memory(game1.show_results()[0].array.codes, codes))
+
+        game1.results.iloc[0] = ['c', 'c']
+        self.assertEqual(list(game1.codes[0]), [2, 2])
+        game1.results = pd.DataFrame({0: ['a', 'b'], 1: ['b', 'b']})
+        self.assertEqual(game1.codes.tolist(), [[0, 1], [1, 1]])
+
+
+    def test_15_show_results_read_only_view(self):
+        """Test show_results() keeps numeric faces numeric and can't modify the results."""
+        die1 = Die(np.array([1, 2, 3, 4, 5, 6]))
+        game1 = Game([die1, die1])
+        game1.play(10)
+
+        wide = game1.show_results('wide')
+        self.assertTrue((wide.dtypes == np.int64).all())
+        self.assertEqual(game1.show_results('narrow')['Face'].dtype, np.int64)
+        self.assertEqual(int(wide.sum().sum()), int(game1.results.to_numpy().sum()))
+        with self.assertRaises(ValueError):
+            wide.iloc[0, 0] = 1
+
+        # Faces match the results frame
+        self.assertTrue(np.array_equal(wide.to_numpy(), game1.results.to_numpy()))
+
+        # String faces are categoricals over the codes
+        die2 = Die(np.array(['a', 'b', 'c']))
+        game2 = Game([die2, die2])
+        game2.play(10)
+        wide = game2.show_results('wide')
+        self.assertIsInstance(wide[0].dtype, pd.CategoricalDtype)
+        self.assertTrue(np.shares_memory(wide[0].array.codes, game2.codes))
+        with self.assertRaises(ValueError):
+            wide.iloc[0, 0] = 'a'
+
+
+    def test_16_show_results_narrow_without_index(self):
+        """Test show_results() narrow format with and without the MultiIndex."""
+        die1 = Die(np.array(['a', 'b', 'c']))
+        game1 = Game([die1, die1, die1])
+        game1.play(4)
+
+        narrow = game1.show_results('narrow')
+        self.assertEqual(narrow.index.names, ['Rolls', 'Die'])
+        self.assertEqual(narrow.loc[(2, 1), 'Face'], game1.results.loc[2, 1])
+
+        flat = game1.show_results('narrow', index=False)
+        self.assertListEqual(list(flat.columns), ['Rolls', 'Die', 'Face'])
+        self.assertListEqual(list(flat['Rolls']), [0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3])
+        self.assertListEqual(list(flat['Face']), list(narrow['Face']))
+
+
 class AnalyzerTestSuite(unittest.TestCase):
     
     def test_01_int_valid(self):
@@ -441,6 +1055,586 @@ class AnalyzerTestSuite(unittest.TestCase):
         self.assertEqual(len(perms), 1)
         self.assertEqual(perms.iloc[0]['Counts'], 100)
 
-        
+
+
+    def test_12_workers_match_single_process(self):
+        """Test counts over shared memory partitions match a single process."""
+        die = Die(np.array([1, 2, 3, 4, 5, 6]))
+        game = Game([die, die, die])
+        game.play(1000, seed=4)
+        analyzer = Analyzer(game)
+
+        expected = [analyzer.face_counts_per_roll(), analyzer.combo_count(),
+                    analyzer.permutation_count()]
+        self.assertEqual(analyzer.jackpot(workers=3), analyzer.jackpot())
+        actual = [analyzer.face_counts_per_roll(workers=3), analyzer.combo_count(workers=3),
+                  analyzer.permutation_count(workers=3)]
+        for left, right in zip(expected, actual):
+            pd.testing.assert_frame_equal(left, right)
+        self.assertIsNotNone(game._shared)
+
+        # New results replace the shared block
+        game.play(10)
+        self.assertIsNone(game._shared)
+        with self.assertRaises(ValueError):
+            analyzer.jackpot(workers=0)
+
+
+    def test_13_threads_match_single_thread(self):
+        """Test counts over thread partitions match a single thread."""
+        die = Die(np.array([1, 2, 3, 4, 5, 6]))
+        game = Game([die, die, die])
+        game.play(1000, seed=4)
+        analyzer = Analyzer(game)
+
+        self.assertEqual(analyzer.jackpot(threads=4), analyzer.jackpot())
+        pd.testing.assert_frame_equal(analyzer.combo_count(threads=4), analyzer.combo_count())
+        pd.testing.assert_frame_equal(analyzer.face_counts_per_roll(threads=4),
+                                      analyzer.face_counts_per_roll())
+        with self.assertRaises(ValueError):
+            analyzer.jackpot(workers=2, threads=2)
+
+
+    def test_14_count_where(self):
+        """Test event counts match the same conditions on the results frame."""
+        die1 = Die(np.array([1, 2, 3, 4, 5, 6]))
+        game1 = Game([die1, die1, die1, die1])
+        game1.play(2000, seed=5)
+        analyzer1 = Analyzer(game1)
+        results = game1.results
+
+        self.assertEqual(analyzer1.count_where(count(6) >= 3),
+                         ((results == 6).sum(axis=1) >= 3).sum())
+        self.assertEqual(analyzer1.count_where(die(0) == die(1)), (results[0] == results[1]).sum())
+        self.assertEqual(analyzer1.count_where(jackpot()), analyzer1.jackpot())
+        event = (die(2) > 4) & ~(count([1, 2]) == 0)
+        expected = (results[2] > 4) & ((results <= 2).sum(axis=1) > 0)
+        self.assertTrue(np.array_equal(analyzer1.mask(event), expected.to_numpy()))
+        with self.assertRaises(ValueError):
+            analyzer1.count_where(lambda codes: codes[:, 0] == 0)
+
+
+    def test_15_runs(self):
+        """Test run lengths, gaps and autocorrelation, whole and chunk-wise."""
+        tracker = RunTracker(np.array([False, True]), max_lag=2)
+        tracker.update(np.array([0, 1, 1, 0, 0, 0, 1, 1, 1, 0, 1]))
+        self.assertEqual(tracker.encoding()['Length'].tolist(), [1, 2, 3, 3, 1, 1])
+        self.assertEqual(tracker.longest()[True], 3)
+        self.assertEqual(tracker.gaps(True).to_dict(), {0: 3, 1: 1, 3: 1})
+
+        die1 = Die(np.array([1, 2, 3]))
+        game1 = Game([die1, die1])
+        game1.play(3000, seed=6)
+        whole = Analyzer(game1).runs(jackpot(), max_lag=3)
+        x = Analyzer(game1).mask(jackpot()).astype(float)
+        x -= x.mean()
+        expected = [(x[k:] * x[:-k]).sum() / (x * x).sum() for k in (1, 2, 3)]
+        self.assertTrue(np.allclose(whole.autocorrelation(), expected))
+
+        chunked = RunTracker(np.array([False, True]), max_lag=3)
+        for chunk in np.array_split(Analyzer(game1).mask(jackpot()), 7):
+            chunked.update(chunk)
+        pd.testing.assert_frame_equal(chunked.encoding(), whole.encoding())
+        pd.testing.assert_series_equal(chunked.gaps(True), whole.gaps(True))
+        self.assertTrue(np.allclose(chunked.autocorrelation(), whole.autocorrelation()))
+        with self.assertRaises(IndexError):
+            Analyzer(game1).runs(2)
+
+
+    def test_16_cooccurrence(self):
+        """Test pair tables match crosstabs and independence has one row per pair."""
+        die1 = Die(np.array([1, 2, 3, 4]))
+        die2 = Die(np.array([4, 3, 2, 1]))
+        game1 = Game([die1, die2, die1])
+        game1.play(2000, seed=9)
+        analyzer1 = Analyzer(game1)
+        results = game1.results
+
+        table = analyzer1.cooccurrence()
+        self.assertEqual(table.shape, (3, 3, 4, 4))
+        self.assertTrue(np.array_equal(table[0, 2], pd.crosstab(results[0], results[2]).to_numpy()))
+        self.assertTrue(np.array_equal(table[1, 1].diagonal(), (results[1].value_counts().sort_index())))
+        selected = analyzer1.cooccurrence([(2, 1)])
+        self.assertTrue(np.array_equal(selected[0], table[2, 1]))
+
+        tests = analyzer1.independence()
+        self.assertEqual(len(tests), 3)
+        self.assertTrue((tests['DoF'] == 9).all())
+        self.assertTrue(tests['PValue'].between(0, 1).all())
+
+        # Tail probabilities without scipy match closed forms for 1, 2 and 4 dof
+        chi2 = np.array([3.84, 9.21, 5.0, 0.0])
+        expected = [math.erfc(math.sqrt(1.92)), math.exp(-4.605), math.exp(-2.5) * 3.5, 1.0]
+        np.testing.assert_allclose(analyzer_module._chi2_sf(chi2, [1, 2, 4, 3]), expected,
+                                   rtol=1e-12)
+        self.assertTrue(np.isnan(analyzer_module._chi2_sf([1.0], [0])[0]))
+        with self.assertRaises(IndexError):
+            analyzer1.cooccurrence([(0, 3)])
+
+
+    def test_17_memory_limit_chunks(self):
+        """Test counting in chunks under a memory limit gives the same results."""
+        die1 = Die(np.array([1, 2, 3, 4, 5, 6]))
+        game1 = Game([die1, die1, die1])
+        game1.play(50000, seed=2)
+        analyzer1 = Analyzer(game1)
+
+        self.assertEqual(analyzer1.jackpot(memory_limit=20000), analyzer1.jackpot())
+        pd.testing.assert_frame_equal(analyzer1.combo_count(memory_limit=10 ** 6),
+                                      analyzer1.combo_count())
+        pd.testing.assert_frame_equal(analyzer1.face_counts_per_roll(memory_limit=5 * 10 ** 6),
+                                      analyzer1.face_counts_per_roll())
+        with self.assertRaises(ValueError):
+            analyzer1.face_counts_per_roll(memory_limit=10 ** 5)
+
+
+    def test_18_cancel_count(self):
+        """Test a cancelled count covers the chunks counted before cancelling."""
+        die1 = Die(np.array([1, 2, 3]))
+        game1 = Game([die1, die1])
+        game1.play(1000, seed=3)
+        analyzer1 = Analyzer(game1)
+
+        token = CancelToken()
+        reports = []
+        def progress(report):
+            reports.append(report.done)
+            token.cancel()
+        def progress_done(report):
+            reports.append(report.done)
+        with mock.patch.object(analyzer_module, '_CHUNK_ROWS', 300):
+            counts = analyzer1.permutation_count(progress=progress, cancel=token)
+            self.assertEqual(analyzer1.jackpot(progress=progress_done), analyzer1.jackpot())
+        self.assertEqual(counts['Counts'].sum(), 300)
+        self.assertEqual(reports, [300, 300, 600, 900, 1000])
+
+
+    def test_19_numpy_output(self):
+        """Test numpy outputs hold the same counts as the frames, as codes."""
+        die1 = Die(np.array(['a', 'b', 'c']))
+        game1 = Game([die1, die1])
+        game1.play(5000, seed=4)
+        analyzer1 = Analyzer(game1)
+
+        frame = analyzer1.combo_count()
+        table, faces = analyzer1.combo_count(output='numpy')
+        self.assertEqual(table.dtype.names, ('0', '1', 'Counts'))
+        self.assertEqual(list(zip(faces[table['0']], faces[table['1']])), list(frame.index))
+        self.assertTrue((table['Counts'] == frame['Counts'].to_numpy()).all())
+        counts, faces = analyzer1.face_counts_per_roll(output='numpy')
+        self.assertTrue((counts == analyzer1.face_counts_per_roll().to_numpy()).all())
+        self.assertEqual(analyzer1.jackpot(output='numpy'), analyzer1.jackpot())
+        codes, faces = game1.show_results(output='numpy')
+        self.assertTrue(np.shares_memory(codes, game1.codes))
+        with self.assertRaises(ValueError):
+            analyzer1.permutation_count(output='list')
+
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow not installed')
+    def test_20_arrow_output(self):
+        """Test arrow outputs are tables of dictionary-encoded faces."""
+        die1 = Die(np.array(['a', 'b', 'c']))
+        game1 = Game([die1, die1])
+        game1.play(5000, seed=4)
+        analyzer1 = Analyzer(game1)
+
+        table = analyzer1.permutation_count(output='arrow')
+        frame = analyzer1.permutation_count().reset_index()
+        self.assertEqual(table.column_names, ['0', '1', 'Counts'])
+        self.assertEqual(table.column('0').to_pylist(), frame['0'].tolist())
+        self.assertEqual(table.column('Counts').to_pylist(), frame['Counts'].tolist())
+        self.assertEqual(analyzer1.jackpot(output='arrow').as_py(), analyzer1.jackpot())
+        narrow = game1.show_results('narrow', output='arrow')
+        self.assertEqual(narrow.column('Face').to_pylist(),
+                         game1.show_results('narrow', index=False)['Face'].tolist())
+
+
+    def test_21_results_frame(self):
+        """Test results is the game's faces frame once a count has run."""
+        die1 = Die(np.array(['a', 'b', 'c']))
+        game1 = Game([die1, die1])
+        game1.play(50, seed=2)
+        analyzer1 = Analyzer(game1)
+        self.assertIsNone(analyzer1.results)
+
+        analyzer1.combo_count()
+        self.assertIsInstance(analyzer1.results, pd.DataFrame)
+        pd.testing.assert_frame_equal(analyzer1.results, game1.show_results())
+
+
+class OnlineAnalyzerTestSuite(unittest.TestCase):
+
+    def test_01_init_invalid(self):
+        """Test initialization with invalid dice count or scores."""
+        faces = np.array([1, 2, 3])
+        with self.assertRaises(ValueError):
+            OnlineAnalyzer(faces, 0)
+        with self.assertRaises(ValueError):
+            OnlineAnalyzer(faces, 2, scores=[1, 2])
+
+
+    def test_02_merged_chunks_match_analyzer(self):
+        """Test merging analyzers of separate chunks gives the full counts."""
+        faces = np.array([1, 2, 3, 4, 5, 6])
+        game = Game([Die(faces), Die(faces), Die(faces)])
+        game.play(300)
+        analyzer = Analyzer(game)
+
+        first = OnlineAnalyzer(faces, 3)
+        second = OnlineAnalyzer(faces, 3)
+        first.update(game.codes[:100])
+        first.update(game.codes[100:120])
+        second.update(game.codes[120:])
+        first.merge(second)
+
+        self.assertEqual(first.rolls, 300)
+        self.assertEqual(first.jackpot(), analyzer.jackpot())
+        self.assertTrue(first.combo_count().equals(analyzer.combo_count()))
+        self.assertTrue(first.permutation_count().equals(analyzer.permutation_count()))
+
+        # Score moments of the face sums
+        sums = game.results.sum(axis=1)
+        moments = first.score_moments()
+        self.assertAlmostEqual(moments['mean'], sums.mean())
+        self.assertAlmostEqual(moments['var'], sums.var(ddof=0))
+
+
+    def test_03_save_load(self):
+        """Test the state survives a save and load."""
+        faces = np.array(['H', 'T'])
+        game = Game([Die(faces), Die(faces)])
+        game.play(50)
+        online = OnlineAnalyzer.from_game(game)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'shard.npz')
+            online.save(path)
+            loaded = OnlineAnalyzer.load(path)
+
+        self.assertEqual(loaded.jackpot(), online.jackpot())
+        self.assertTrue(loaded.face_counts().equals(online.face_counts()))
+        self.assertTrue(loaded.permutation_count().equals(online.permutation_count()))
+        with self.assertRaises(ValueError):
+            loaded.score_moments()
+
+
+    def test_04_folded_counters(self):
+        """Test counts folded over many chunks, and counters kept on request."""
+        for faces, n_dice in ((np.array([1, 2, 3, 4]), 3), (np.arange(1000), 7)):
+            game = Game([Die(faces) for _ in range(n_dice)])
+            game.play(500, seed=5)
+            analyzer = Analyzer(game)
+            online = OnlineAnalyzer(faces, n_dice)
+            with mock.patch('montecarlo.online._FOLD_ROWS', 16):
+                for start in range(0, 500, 7):
+                    online.update(game.codes[start:start + 7])
+            self.assertTrue(online.combo_count().equals(analyzer.combo_count()))
+            self.assertTrue(online.permutation_count().equals(analyzer.permutation_count()))
+
+        faces = np.array(['H', 'T'])
+        combos = OnlineAnalyzer(faces, 2, counts=['combo_count'])
+        combos.update(np.array([[0, 1], [1, 0], [1, 1]]))
+        self.assertListEqual(combos.combo_count()['Counts'].tolist(), [2, 1])
+        with self.assertRaises(ValueError):
+            combos.permutation_count()
+        with self.assertRaises(ValueError):
+            combos.merge(OnlineAnalyzer(faces, 2, counts=[]))
+        with self.assertRaises(ValueError):
+            OnlineAnalyzer(faces, 2, counts=['jackpot'])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'combos.npz')
+            combos.save(path)
+            loaded = OnlineAnalyzer.load(path)
+        self.assertTrue(loaded.combo_count().equals(combos.combo_count()))
+        with self.assertRaises(ValueError):
+            loaded.permutation_count()
+
+
+class DistributedTestSuite(unittest.TestCase):
+
+    def test_01_local_workers(self):
+        """Test several worker processes share a queue and reduce exactly."""
+        faces = np.array([1, 2, 3, 4, 5, 6])
+        game = Game([Die(faces), Die(faces), Die(faces)])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            distributed.submit(game, 3000, tmp, shards=6, seed=11)
+            workers = [multiprocessing.Process(target=distributed.work, args=(tmp,))
+                       for _ in range(3)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+            self.assertEqual(distributed.status(tmp), {'pending': 0, 'claimed': 0, 'done': 6})
+            online, played = distributed.reduce(tmp)
+
+        # Merged state matches an analysis of the combined results
+        analyzer = Analyzer(played)
+        self.assertEqual(played.codes.shape, (3000, 3))
+        self.assertEqual(online.jackpot(), analyzer.jackpot())
+        self.assertTrue(online.permutation_count().equals(analyzer.permutation_count()))
+
+
+    def test_02_requeue_failed_shard(self):
+        """Test a shard left claimed by a dead worker is run again."""
+        faces = np.array(['H', 'T'])
+        game = Game([Die(faces), Die(faces)])
+
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            distributed.submit(game, 100, first, shards=4, seed=3)
+            distributed.submit(game, 100, second, shards=4, seed=3)
+            with self.assertRaises(ValueError):
+                distributed.submit(game, 100, first, shards=4)
+
+            # A worker claimed shard 2 and died
+            os.rename(os.path.join(first, 'pending', 'shard-000002.json'),
+                      os.path.join(first, 'claimed', 'shard-000002.json'))
+            self.assertEqual(distributed.work(first), 3)
+            with self.assertRaises(ValueError):
+                distributed.reduce(first)
+
+            self.assertEqual(distributed.work(first, requeue_after=0), 1)
+            distributed.work(second)
+            _, recovered = distributed.reduce(first)
+            _, clean = distributed.reduce(second)
+
+        # Same seed and shards give the same results
+        self.assertTrue(np.array_equal(recovered.codes, clean.codes))
+
+
+class ExperimentTestSuite(unittest.TestCase):
+
+    def test_01_init_invalid(self):
+        """Test initialization with weights that don't fit the faces."""
+        faces = np.array([1, 2, 3])
+        with self.assertRaises(ValueError):
+            Experiment(faces, np.ones((2, 4)))
+        with self.assertRaises(ValueError):
+            Experiment(faces, np.ones((2, 3)), labels=['only one'])
+        with self.assertRaises(TypeError):
+            Experiment([1, 2, 3], np.ones((2, 3)))
+        for bad in (np.nan, np.inf, 1e308):
+            with self.assertRaises(ValueError):
+                Experiment(faces, [[1, 1, 1], [bad, 1e308, 1]])
+
+
+    def test_02_run_tidy_table(self):
+        """Test run() returns one tidy table for every configuration."""
+        faces = np.array([1, 2, 3, 4, 5, 6])
+        weights = np.array([[1, 1, 1, 1, 1, 1],
+                            [0, 0, 0, 0, 0, 1]])
+        experiment = Experiment(faces, weights, n_dice=3, labels=['fair', 'loaded'])
+        table = experiment.run(200, statistics=('jackpot', 'face_counts', 'combo_count'), seed=1)
+
+        # Verify the structure
+        self.assertListEqual(list(table.columns), ['Config', 'Statistic', 'Outcome', 'Counts'])
+        totals = table.groupby(['Config', 'Statistic'])['Counts'].sum()
+        self.assertEqual(totals[('fair', 'face_counts')], 600)
+        self.assertEqual(totals[('fair', 'combo_count')], 200)
+
+        # The loaded die only shows 6
+        self.assertEqual(totals[('loaded', 'jackpot')], 200)
+        loaded = table[(table['Config'] == 'loaded') & (table['Statistic'] == 'combo_count')]
+        self.assertListEqual(list(loaded['Outcome']), [(6, 6, 6)])
+
+
+    def test_03_from_games(self):
+        """Test from_games() matches the game weights and seeds reproduce."""
+        fair = Die(np.array(['H', 'T']))
+        unfair = Die(np.array(['T', 'H']))
+        unfair.change_weight('H', 3)
+        experiment = Experiment.from_games([Game([fair, fair]), Game([unfair, unfair])])
+
+        self.assertTrue(np.array_equal(experiment.weights[1, 0], [3.0, 1.0]))
+        first = experiment.run(100, statistics=('permutation_count',), seed=7)
+        second = experiment.run(100, statistics=('permutation_count',), seed=7)
+        self.assertTrue(first.equals(second))
+
+
+    def test_04_run_in_blocks(self):
+        """Test counts folded over blocks add up and agree across backends."""
+        faces = np.array([1, 2, 3, 4])
+        weights = np.array([[1, 1, 1, 1], [5, 1, 0, 2]])
+        experiment = Experiment(faces, weights, n_dice=3, labels=['fair', 'loaded'])
+        statistics = ('jackpot', 'face_counts', 'combo_count', 'permutation_count')
+
+        names = ['numpy'] + (['numba'] if importlib.util.find_spec('numba') else [])
+        tables = []
+        for name in names:
+            with backends.use_backend(name), \
+                    mock.patch.object(experiment_module, '_BLOCK_ROLLS', 64):
+                tables.append(experiment.run(250, statistics=statistics, seed=3))
+        for table in tables[1:]:
+            pd.testing.assert_frame_equal(table, tables[0])
+
+        table = tables[0]
+        totals = table.groupby(['Config', 'Statistic'])['Counts'].sum()
+        self.assertEqual(totals[('loaded', 'face_counts')], 750)
+        self.assertEqual(totals[('loaded', 'permutation_count')], 250)
+        for config in ('fair', 'loaded'):
+            rows = table[table['Config'] == config]
+            combos = rows[rows['Statistic'] == 'combo_count']
+            perms = rows[rows['Statistic'] == 'permutation_count']
+            self.assertTrue(combos['Counts'].is_monotonic_decreasing)
+            folded = perms.groupby(perms['Outcome'].map(lambda row: tuple(sorted(row))))['Counts'].sum()
+            self.assertDictEqual(folded.to_dict(), dict(zip(combos['Outcome'], combos['Counts'])))
+        loaded = table[(table['Config'] == 'loaded') & (table['Statistic'] == 'face_counts')]
+        self.assertEqual(loaded.loc[loaded['Outcome'] == 3, 'Counts'].item(), 0)
+
+
+class BackendTestSuite(unittest.TestCase):
+
+    def test_01_select_backend(self):
+        """Test backends are selected by name and restored after a block."""
+        self.assertEqual(backends.get_backend().name, 'numpy')
+        with self.assertRaises(ValueError):
+            backends.set_backend('fortran')
+        with backends.use_backend('numpy') as backend:
+            self.assertIs(backends.get_backend(), backend)
+        self.assertEqual(backends.get_backend().name, 'numpy')
+
+
+    @unittest.skipUnless(importlib.util.find_spec('numba'), 'numba not installed')
+    def test_02_numba_matches_numpy(self):
+        """Test the numba backend gives the same rolls and counts as numpy.
+
+        Covers weighted dice searched by comparison, dice of more than 64
+        faces searched by key, and Markov dice run as chains.
+        """
+        die1 = Die(np.array([1, 2, 3, 4, 5, 6]))
+        die1.change_weight(6, 0)
+        die1.change_weight(2, 3)
+        transitions = np.arange(1, 37, dtype=float).reshape(6, 6)
+        transitions[:, 0] = 0
+        die2 = MarkovDie(np.array([1, 2, 3, 4, 5, 6]), transitions)
+        die3 = Die(np.arange(100))
+        for face in range(0, 100, 3):
+            die3.change_weight(face, face / 7)
+        die3.change_weight(99, 0)
+        die4 = Die(np.arange(100))
+        die4.change_weight(5, 40)
+
+        def run():
+            np.random.seed(8)
+            rolls = die1.roll(50) + die2.roll(50) + die3.roll(50)
+            game = Game([die1, die1, die2, die1])
+            game.play(5000, seed=8)
+            wide = Game([die3, die4, die3])
+            wide.play(5000, seed=8)
+            analyzer = Analyzer(game)
+            online = OnlineAnalyzer.from_game(game)
+            return (rolls, game.codes, wide.codes, analyzer.jackpot(),
+                    analyzer.face_counts_per_roll(), analyzer.combo_count(threads=2),
+                    analyzer.permutation_count(), online.combo_count(),
+                    Analyzer(wide).combo_count())
+
+        expected = run()
+        with backends.use_backend('numba'):
+            actual = run()
+        self.assertEqual(actual[0], expected[0])
+        self.assertTrue(np.array_equal(actual[1], expected[1]))
+        self.assertTrue(np.array_equal(actual[2], expected[2]))
+        self.assertEqual(actual[3], expected[3])
+        for left, right in zip(expected[4:], actual[4:]):
+            pd.testing.assert_frame_equal(left, right)
+
+        # Zero weights are never drawn, nor zero transitions after the first roll
+        self.assertFalse((expected[2][:, [0, 2]] == 99).any())
+        self.assertFalse((expected[1][1:, 2] == 0).any())
+
+
+class ServiceTestSuite(unittest.TestCase):
+
+    def test_01_play_and_analyze_async(self):
+        """Test that async play and analysis match their blocking versions."""
+        die1 = Die(np.array([1, 2, 3]))
+
+        async def run():
+            game = Game([die1, die1])
+            await game.play_async(2000, seed=4)
+            return game, await Analyzer(game).run_async('combo_count')
+
+        game, combos = asyncio.run(run())
+        expected = Game([die1, die1])
+        expected.play(2000, seed=4)
+        self.assertTrue(np.array_equal(game.codes, expected.codes))
+        pd.testing.assert_frame_equal(combos, Analyzer(expected).combo_count())
+        with self.assertRaises(ValueError):
+            asyncio.run(Analyzer(expected).run_async('_count'))
+
+    def test_02_coalesce_and_cache(self):
+        """Test request batching, seeded caching and rejected requests over HTTP."""
+        body = {'faces': [1, 2, 3, 4], 'n_dice': 2, 'rolls': 500,
+                'statistics': ['jackpot', 'face_counts']}
+
+        async def run():
+            service = SimulationService(batch_window=0.05)
+            server = await service.serve()
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                unseeded = await asyncio.gather(*[request(body, port=port) for _ in range(4)])
+                seeded = [await request(dict(body, seed=3), port=port) for _ in range(2)]
+                with self.assertRaises(ValueError):
+                    await request(dict(body, rolls=-1), port=port)
+                stats = await request(None, port=port, route='/stats')
+            return unseeded, seeded, stats
+
+        unseeded, seeded, stats = asyncio.run(run())
+        for answer in unseeded:
+            self.assertEqual(answer['rolls'], 500)
+            self.assertEqual(np.sum(answer['face_counts']), 1000)
+        self.assertEqual(seeded[0], seeded[1])
+        self.assertEqual(stats['draws'], 2)
+        self.assertEqual(stats['coalesced'], 3)
+        self.assertEqual(stats['cache_hits'], 1)
+
+    def test_03_bounds_and_errors(self):
+        """Test oversized or mixed requests are rejected and failures still get a response."""
+        body = {'faces': [1, 2, 3], 'rolls': 100}
+        service = SimulationService(batch_window=0.01)
+        for bad in ({'faces': [1, 'a']}, {'n_dice': 0}, {'n_dice': 2.5}, {'n_dice': 10 ** 6},
+                    {'rolls': 10 ** 12}):
+            with self.assertRaises(ValueError):
+                asyncio.run(service.handle(dict(body, **bad)))
+
+        async def run():
+            server = await service.serve()
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(b'POST /simulate HTTP/1.1\r\nContent-Length: 50\r\n\r\n{}')
+                writer.write_eof()
+                truncated = await reader.read()
+                writer.close()
+                with mock.patch.object(service_module, '_simulate', side_effect=RuntimeError('x')):
+                    with self.assertRaises(ValueError):
+                        await request(dict(body, seed=1), port=port)
+                with mock.patch.object(service_module, '_MAX_CELLS', 250):
+                    answers = await asyncio.gather(*[service.handle(body) for _ in range(3)])
+            return truncated, answers
+
+        truncated, answers = asyncio.run(run())
+        self.assertTrue(truncated.startswith(b'HTTP/1.1 400'))
+        self.assertEqual([answer['rolls'] for answer in answers], [100, 100, 100])
+        self.assertEqual(service.counters['draws'], 3)
+
+    def test_04_runner_across_event_loops(self):
+        """Test a runner queues calls from one event loop after another."""
+        runner = AsyncRunner(max_workers=2, max_pending=1)
+        die1 = Die(np.array([1, 2, 3]))
+
+        async def run():
+            return await asyncio.gather(*[runner.run(die1.roll, 5) for _ in range(4)])
+
+        try:
+            for _ in range(2):
+                rolls = asyncio.run(run())
+                self.assertEqual([len(roll) for roll in rolls], [5] * 4)
+        finally:
+            runner.shutdown()
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=3)
\ No newline at end of file
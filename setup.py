@@ -12,7 +12,12 @@ setup(
     packages=find_packages(),
     install_requires = [
         'numpy',
-        'pandas',
+        'pandas>=3',
         'pytest'
-    ]
+    ],
+    extras_require = {
+        'arrow': ['pyarrow'],
+        'numba': ['numba'],
+        'scipy': ['scipy']
+    }
 )
\ No newline at end of file